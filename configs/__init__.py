@@ -46,9 +46,9 @@ from . import miscllaneous
 
 
 def get_configs(settings, work_dir):
-    # load the datasets - it is done only once and re-used for all configs
+    # the configs refer to the datasets by category - PipelineRunner loads only the ones used by the selected models
     if settings.dataset_cache is None:
-        settings.dataset_cache = datasets.get_datasets(settings)
+        datasets.initialize_datasets(settings)
     #
 
     pipeline_configs = {}
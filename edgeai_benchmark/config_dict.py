@@ -53,10 +53,76 @@ class ConfigDict(utils.AttrDict):
         self.pipeline_type = 'accuracy'
         # number of frames for inference
         self.num_frames = 1000 #10000 #50000
+        # number of frames to be read and preprocessed in advance during inference - 0 or None disables it
+        # the preprocessing of these frames overlaps with the inference of the current frame
+        self.prefetch_frames = 4
+        # number of worker threads used to read and preprocess the prefetched frames
+        self.prefetch_workers = 2
+        # folder where the preprocessed inference inputs are cached - pipelines with the same dataset and preprocess
+        # read the inputs from this cache instead of reading & preprocessing them again. None disables it
+        # it is opt-in (eg. './work_dirs/cache/inputs'), as every preprocessed frame is written to disk
+        # the original images are not cached - so it is not used if save_output is set
+        self.input_cache_path = None
+        # max size of the input cache in GB - the least recently used preprocess signatures are removed beyond this
+        self.input_cache_size_gb = 32
+        # number of frames that are stacked and run in one call to the runtime - only for models running on cpu
+        # (tidl_offload is False) with a dynamic batch dimension. 1 runs one frame at a time.
+        # this is a throughput mode - the reported infer_time_batch_ms is the latency of a batch
+        self.infer_batch_size = 1
+        # throughput mode (onnxrt and tflitert): after the accuracy run, the preprocessed inputs (up to throughput_frames)
+        # are run from throughput_threads threads, each with an interpreter of its own. the aggregate fps,
+        # scaling efficiency and latency percentiles under load are reported. None disables it
+        self.throughput_threads = None
+        self.throughput_frames = 100
+        # number of frames at the start of inference that are excluded from the latency percentiles (p50/p90/p99/max/std)
+        # the per frame timings of all the frames are written to infer_frame_times.npy in the run_dir (if enable_logging is set)
+        self.infer_warmup_frames = 1
+        # write the accumulated metric state and the stats of inference to the run_dir every infer_checkpoint_interval frames
+        # an incomplete inference (eg. killed or crashed) then resumes from the last checkpoint. None or 0 disables it
+        # only the metrics that are accumulated incrementally during inference (see DatasetBase.update) are checkpointed
+        self.infer_checkpoint_interval = None
+        # run the canonical preprocess chain (read, resize, center crop, to tensor) as one fused transform
+        # it is bit exact with the unfused chain (scripts/check_preprocess_parity.py) - so the accuracy does not change
+        self.preprocess_fused = True
+        # decode jpeg images at a reduced scale (1/2, 1/4, 1/8) that is still at or above the size of the resize
+        # that follows - this is faster but changes the input of the resize, so the accuracy may change slightly.
+        # it can also be enabled for a pipeline with the pipeline_config entry decode_reduce
+        self.preprocess_decode_reduce = False
+        # library that decodes the images: None decodes with the library of the preprocess backend (pil or cv2),
+        # 'auto' selects the fastest installed decoder for each image format on this host (eg. turbojpeg, simplejpeg)
+        # with a short benchmark - or the name of a decoder. see preprocess.image_decoders and scripts/check_image_decoder_parity.py
+        # it can also be set for a pipeline with the pipeline_config entry image_decoder
+        self.image_decoder = None
+        # folder where the decoder selected by image_decoder 'auto' is cached - for each host and set of installed decoders
+        self.image_decoder_cache_path = './work_dirs/cache/image_decoders'
+        # write the per frame outputs of the preprocess (fused read/resize/crop, normalization) and of the input
+        # normalization in the session into preallocated buffers that are reused, instead of new arrays for each frame
+        self.preprocess_buffer_arena = True
+        # read the images of imagenet and coco from a packed shard file (<image folder>.shard) if it exists, instead of
+        # the individual files. create it with scripts/pack_dataset_shard.py
+        self.dataset_shards = False
+        # folder where the compact index of the coco format annotation files (images, boxes, categories) is cached
+        # it is loaded much faster than parsing the json files of the annotations. None disables it
+        self.annotation_index_path = './work_dirs/cache/annotations'
+        # folder of the decoded images (uint8, at the input resolution of the model) written by scripts/pack_decoded_store.py
+        # these are used instead of decoding the images, if there is a store for the dataset and the exact preprocess
+        self.decoded_store_path = None
+        # trace the stages of the pipeline (dataset read, each transform, invoke, metric, import steps)
+        # written to the run_dir as trace.json (chrome trace event format) and trace.csv (aggregated)
+        self.enable_trace = False
+        # collect the per frame benchmark data (core time, ddr transfer) only every infer_stats_interval frames
+        # the reported times are the average over the sampled frames. 1 collects it for every frame
+        self.infer_stats_interval = 1
         # number of frames to be used for post training quantization / calibration
         self.calibration_frames = 25 #50
         # number of iterations to be used for post training quantization / calibration
         self.calibration_iterations = 25 #50
+        # folder where the preprocessed calibration tensors are cached - shared by all the models, work_dirs and devices
+        # models that use the same calibration dataset and preprocess, need not read & preprocess it again. None disables it
+        # it is opt-in (eg. './work_dirs/cache/calibration'), as the calibration tensors are written to disk
+        self.calibration_cache_path = None
+        # max size of the calibration cache in GB - the least recently used entries are removed beyond this
+        self.calibration_cache_size_gb = 8
         # folder where benchmark configs are defined. this should be python importable
         self.configs_path = './configs'
         # folder where models are available
@@ -88,6 +154,23 @@ class ConfigDict(utils.AttrDict):
         # for example 1 will mean one model will run (but in a separae processs from that of the main process)
         # None will mean one process will run, in the same process as the main
         self.parallel_processes = None
+        # if either of these are set, import and inference of a model are run as separate tasks in parallel execution,
+        # with these as the limits for the number of import and inference processes running at the same time
+        # if only one of them is set, the other stage gets the rest of parallel_processes - which then limits the two stages together
+        # import needs more cpu and memory than inference - this allows inference of a model to run while other models are being imported
+        self.parallel_processes_import = None
+        self.parallel_processes_infer = None
+        # in parallel execution, new models are started only if the available memory (in GB) stays above this watermark,
+        # considering the peak memory of the models observed in the previous runs. at least one model always runs. None disables it
+        self.parallel_memory_watermark_gb = 2
+        # in parallel execution, run the models in a pool of long lived worker processes (started with forkserver), instead of
+        # forking a new process for each model. the heavy modules are imported only once and the workers do not share
+        # the memory pages of the main process. a worker that crashes is replaced by a new one
+        self.parallel_worker_pool = False
+        # order in which the models are run in parallel execution
+        # 'longest_first' runs the models with the highest estimated run time first (estimated from the previous runs if available)
+        # None runs them in the order in which they are queued
+        self.parallel_schedule = 'longest_first'
         # quantization bit precision
         self.tensor_bits = 8 #8 #16 #32
         # runtime_options can be specified as a dict. eg {'accuracy_level': 0}
@@ -150,6 +233,8 @@ class ConfigDict(utils.AttrDict):
         # for selective loading, provide a list of dataset names such as
         # ['imagenet', 'coco', 'cocoseg21', 'ade20k', 'cocokpts', 'kitti_lidar_det', 'ti-robokit_semseg_zed1hd', 'ycbv']
         self.dataset_loading = True
+        # number of threads used to create the datasets - the datasets of different folders are created concurrently
+        self.dataset_loading_workers = 4
         # which configs to run from the default list. example [0,10] [10,null] etc.
         self.config_range = None
         # logging of the import, infer and the accuracy. set to False to disable it.
@@ -168,10 +253,15 @@ class ConfigDict(utils.AttrDict):
         self.with_udp = True
         # it will add horizontally flipped images in info_dict and run inference over the flipped image also
         self.flip_test = False
+        # with flip_test, run the image and its flipped copy as a batch of 2 in one call to the interpreter
+        # used if the model has a dynamic batch dimension (cpu execution) or has been compiled with a batch size of 2
+        self.flip_test_batch = True
         # the transformations that needs to be applied to the model itself. Note: this is different from pre-processing transforms
         self.model_transformation_dict = None
         # include perfsim stats in the report or not
         self.report_perfsim = False
+        # latency percentiles to be included in the report - any of 50, 90, 99 - for example [50, 99]
+        self.report_latency_percentiles = None
         # use TIDL offload to speedup inference
         self.tidl_offload = True
         # input optimization to improve FPS: False or None
@@ -26,8 +26,15 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
+import time
 import warnings
+import functools
+import concurrent.futures
 
+from .dataset_shard import *
+from .decoded_store import *
+from .coco_index import *
 from .image_cls import *
 from .image_seg import *
 from .image_det import *
@@ -152,10 +159,23 @@ def _initialize_datasets(settings):
     return dataset_cache
 
 
+def _get_shard_cfg(settings, image_dir):
+    # the packed shard of the images of a split is image_dir + '.shard' (see scripts/pack_dataset_shard.py)
+    shard_file = image_dir + '.shard'
+    return dict(shard_file=shard_file) if (settings.dataset_shards and os.path.exists(shard_file)) else dict()
+
+
+def _get_annotation_index_cfg(settings):
+    # the compact index of a coco format annotation file is cached in this folder (see COCOAnnotationIndex)
+    return dict(annotation_index_path=settings.annotation_index_path) if settings.annotation_index_path else dict()
+
+
 def get_datasets(settings, download=False, dataset_list=None):
     dataset_cache = _initialize_datasets(settings)
     dset_info_dict = get_dataset_info_dict(settings)
-    dataset_list = dataset_list or get_dataset_categories(settings)
+    dataset_list = dataset_list if dataset_list is not None else get_dataset_categories(settings)
+    # the datasets are not created here - a loader is registered for each category and these are run by _load_datasets()
+    dataset_loaders = {}
 
     if check_dataset_load(settings, DATASET_CATEGORY_IMAGENET) and (DATASET_CATEGORY_IMAGENET in dataset_list):
         dataset_variant = settings.dataset_type_dict[DATASET_CATEGORY_IMAGENET] if \
@@ -172,18 +192,21 @@ def get_datasets(settings, download=False, dataset_list=None):
             split=f'{settings.datasets_path}/{dataset_variant}/{imagenet_split}.txt',
             shuffle=True,
             num_frames=settings.calibration_frames,
-            name=dataset_variant)
+            name=dataset_variant,
+            **_get_shard_cfg(settings, f'{settings.datasets_path}/{dataset_variant}/{imagenet_split}'))
         imagenet_cls_val_cfg = dict(
             path=f'{settings.datasets_path}/{dataset_variant}/{imagenet_split}',
             split=f'{settings.datasets_path}/{dataset_variant}/{imagenet_split}.txt',
             shuffle=True,
             num_frames=min(settings.num_frames,num_imgs),
-            name=dataset_variant)
+            name=dataset_variant,
+            **_get_shard_cfg(settings, f'{settings.datasets_path}/{dataset_variant}/{imagenet_split}'))
         # what is provided is mechanism to select one of the imagenet variants
         # but only one is selected and assigned to the key imagenet
         # all the imagenet models will use this variant.
-        dataset_cache[DATASET_CATEGORY_IMAGENET]['calibration_dataset'] = ImageNetDataSetType(**imagenet_cls_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_IMAGENET]['input_dataset'] = ImageNetDataSetType(**imagenet_cls_val_cfg, download=False)
+        dataset_loaders[DATASET_CATEGORY_IMAGENET] = dict(
+            calibration_dataset=functools.partial(ImageNetDataSetType, **imagenet_cls_calib_cfg, download=download),
+            input_dataset=functools.partial(ImageNetDataSetType, **imagenet_cls_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_COCOKPTS) and (DATASET_CATEGORY_COCOKPTS in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_COCOKPTS} variant:{DATASET_CATEGORY_COCOKPTS}"))
@@ -194,17 +217,20 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=settings.calibration_frames,
             name=DATASET_CATEGORY_COCOKPTS,
-            filter_imgs=filter_imgs)
+            filter_imgs=filter_imgs,
+            **_get_annotation_index_cfg(settings))
         coco_kpts_val_cfg = dict(
             path=f'{settings.datasets_path}/coco',
             split='val2017',
             shuffle=False, #TODO: need to make COCODetection.evaluate() work with shuffle
             num_frames=min(settings.num_frames,5000),
             name=DATASET_CATEGORY_COCOKPTS,
-            filter_imgs=filter_imgs)
+            filter_imgs=filter_imgs,
+            **_get_annotation_index_cfg(settings))
 
-        dataset_cache[DATASET_CATEGORY_COCOKPTS]['calibration_dataset'] = COCOKeypoints(**coco_kpts_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCOKPTS]['input_dataset'] = COCOKeypoints(**coco_kpts_val_cfg, download=False)
+        dataset_loaders[DATASET_CATEGORY_COCOKPTS] = dict(
+            calibration_dataset=functools.partial(COCOKeypoints, **coco_kpts_calib_cfg, download=download),
+            input_dataset=functools.partial(COCOKeypoints, **coco_kpts_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_YCBV) and (DATASET_CATEGORY_YCBV in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_YCBV} variant:{DATASET_CATEGORY_YCBV}"))
@@ -215,17 +241,20 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=settings.calibration_frames,
             name=DATASET_CATEGORY_YCBV,
-            filter_imgs=filter_imgs)
+            filter_imgs=filter_imgs,
+            **_get_annotation_index_cfg(settings))
         ycbv_val_cfg = dict(
             path=f'{settings.datasets_path}/ycbv',
             split='test',
             shuffle=False,
             num_frames=min(settings.num_frames,900),
             name=DATASET_CATEGORY_YCBV,
-            filter_imgs=filter_imgs)
+            filter_imgs=filter_imgs,
+            **_get_annotation_index_cfg(settings))
 
-        dataset_cache[DATASET_CATEGORY_YCBV]['calibration_dataset'] = YCBV(**ycbv_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_YCBV]['input_dataset'] = YCBV(**ycbv_val_cfg, download=False)
+        dataset_loaders[DATASET_CATEGORY_YCBV] = dict(
+            calibration_dataset=functools.partial(YCBV, **ycbv_calib_cfg, download=download),
+            input_dataset=functools.partial(YCBV, **ycbv_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_COCO) and (DATASET_CATEGORY_COCO in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_COCO} variant:{DATASET_CATEGORY_COCO}"))
@@ -234,15 +263,20 @@ def get_datasets(settings, download=False, dataset_list=None):
             split='val2017',
             shuffle=True,
             num_frames=settings.calibration_frames,
-            name=DATASET_CATEGORY_COCO)
+            name=DATASET_CATEGORY_COCO,
+            **_get_shard_cfg(settings, f'{settings.datasets_path}/coco/val2017'),
+            **_get_annotation_index_cfg(settings))
         coco_det_val_cfg = dict(
             path=f'{settings.datasets_path}/coco',
             split='val2017',
             shuffle=False, # can be set to True as well, if needed
             num_frames=min(settings.num_frames,5000),
-            name=DATASET_CATEGORY_COCO)
-        dataset_cache[DATASET_CATEGORY_COCO]['calibration_dataset'] = COCODetection(**coco_det_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCO]['input_dataset'] = COCODetection(**coco_det_val_cfg, download=False)
+            name=DATASET_CATEGORY_COCO,
+            **_get_shard_cfg(settings, f'{settings.datasets_path}/coco/val2017'),
+            **_get_annotation_index_cfg(settings))
+        dataset_loaders[DATASET_CATEGORY_COCO] = dict(
+            calibration_dataset=functools.partial(COCODetection, **coco_det_calib_cfg, download=download),
+            input_dataset=functools.partial(COCODetection, **coco_det_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_WIDERFACE) and (DATASET_CATEGORY_WIDERFACE in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_WIDERFACE} variant:{DATASET_CATEGORY_WIDERFACE}"))
@@ -251,15 +285,18 @@ def get_datasets(settings, download=False, dataset_list=None):
             split='val',
             shuffle=True,
             num_frames=settings.calibration_frames,
-            name=DATASET_CATEGORY_WIDERFACE)
+            name=DATASET_CATEGORY_WIDERFACE,
+            **_get_annotation_index_cfg(settings))
         widerface_det_val_cfg = dict(
             path=f'{settings.datasets_path}/widerface',
             split='val',
             shuffle=False, # can be set to True as well, if needed
             num_frames=min(settings.num_frames,3226),
-            name=DATASET_CATEGORY_WIDERFACE)
-        dataset_cache[DATASET_CATEGORY_WIDERFACE]['calibration_dataset'] = WiderFaceDetection(**widerface_det_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_WIDERFACE]['input_dataset'] = WiderFaceDetection(**widerface_det_val_cfg, download=False)
+            name=DATASET_CATEGORY_WIDERFACE,
+            **_get_annotation_index_cfg(settings))
+        dataset_loaders[DATASET_CATEGORY_WIDERFACE] = dict(
+            calibration_dataset=functools.partial(WiderFaceDetection, **widerface_det_calib_cfg, download=download),
+            input_dataset=functools.partial(WiderFaceDetection, **widerface_det_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_COCOSEG21) and (DATASET_CATEGORY_COCOSEG21 in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_COCOSEG21} variant:{DATASET_CATEGORY_COCOSEG21}"))
@@ -268,15 +305,18 @@ def get_datasets(settings, download=False, dataset_list=None):
             split='val2017',
             shuffle=True,
             num_frames=settings.calibration_frames,
-            name=DATASET_CATEGORY_COCOSEG21)
+            name=DATASET_CATEGORY_COCOSEG21,
+            **_get_annotation_index_cfg(settings))
         cocoseg21_val_cfg = dict(
             path=f'{settings.datasets_path}/coco',
             split='val2017',
             shuffle=True,
             num_frames=min(settings.num_frames,5000),
-            name=DATASET_CATEGORY_COCOSEG21)
-        dataset_cache[DATASET_CATEGORY_COCOSEG21]['calibration_dataset'] = COCOSegmentation(**cocoseg21_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_COCOSEG21]['input_dataset'] = COCOSegmentation(**cocoseg21_val_cfg, download=False)
+            name=DATASET_CATEGORY_COCOSEG21,
+            **_get_annotation_index_cfg(settings))
+        dataset_loaders[DATASET_CATEGORY_COCOSEG21] = dict(
+            calibration_dataset=functools.partial(COCOSegmentation, **cocoseg21_calib_cfg, download=download),
+            input_dataset=functools.partial(COCOSegmentation, **cocoseg21_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_ADE20K) and (DATASET_CATEGORY_ADE20K in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_ADE20K} variant:{DATASET_CATEGORY_ADE20K}"))
@@ -292,8 +332,9 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames, 2000),
             name=DATASET_CATEGORY_ADE20K)
-        dataset_cache[DATASET_CATEGORY_ADE20K]['calibration_dataset'] = ADE20KSegmentation(**ade20k_seg_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_ADE20K]['input_dataset'] = ADE20KSegmentation(**ade20k_seg_val_cfg, download=False)
+        dataset_loaders[DATASET_CATEGORY_ADE20K] = dict(
+            calibration_dataset=functools.partial(ADE20KSegmentation, **ade20k_seg_calib_cfg, download=download),
+            input_dataset=functools.partial(ADE20KSegmentation, **ade20k_seg_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_ADE20K32) and (DATASET_CATEGORY_ADE20K32 in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_ADE20K32} variant:{DATASET_CATEGORY_ADE20K32}"))
@@ -309,8 +350,9 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames, 2000),
             name=DATASET_CATEGORY_ADE20K32)
-        dataset_cache[DATASET_CATEGORY_ADE20K32]['calibration_dataset'] = ADE20KSegmentation(**ade20k_seg_calib_cfg, num_classes=32, download=download)
-        dataset_cache[DATASET_CATEGORY_ADE20K32]['input_dataset'] = ADE20KSegmentation(**ade20k_seg_val_cfg, num_classes=32, download=False)
+        dataset_loaders[DATASET_CATEGORY_ADE20K32] = dict(
+            calibration_dataset=functools.partial(ADE20KSegmentation, **ade20k_seg_calib_cfg, num_classes=32, download=download),
+            input_dataset=functools.partial(ADE20KSegmentation, **ade20k_seg_val_cfg, num_classes=32, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_VOC2012) and (DATASET_CATEGORY_VOC2012 in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_VOC2012} variant:{DATASET_CATEGORY_VOC2012}"))
@@ -326,8 +368,9 @@ def get_datasets(settings, download=False, dataset_list=None):
             shuffle=True,
             num_frames=min(settings.num_frames, 1449),
             name=DATASET_CATEGORY_VOC2012)
-        dataset_cache[DATASET_CATEGORY_VOC2012]['calibration_dataset'] = VOC2012Segmentation(**voc_seg_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_VOC2012]['input_dataset'] = VOC2012Segmentation(**voc_seg_val_cfg, download=False)
+        dataset_loaders[DATASET_CATEGORY_VOC2012] = dict(
+            calibration_dataset=functools.partial(VOC2012Segmentation, **voc_seg_calib_cfg, download=download),
+            input_dataset=functools.partial(VOC2012Segmentation, **voc_seg_val_cfg, download=False))
     #
     if check_dataset_load(settings, DATASET_CATEGORY_NYUDEPTHV2) and (DATASET_CATEGORY_NYUDEPTHV2 in dataset_list):
         print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_NYUDEPTHV2} variant:{DATASET_CATEGORY_NYUDEPTHV2}"))
@@ -345,8 +388,9 @@ def get_datasets(settings, download=False, dataset_list=None):
             num_frames=min(settings.num_frames, 654),
             name=DATASET_CATEGORY_NYUDEPTHV2)
 
-        dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['calibration_dataset'] = NYUDepthV2(**nyudepthv2_calib_cfg, download=download)
-        dataset_cache[DATASET_CATEGORY_NYUDEPTHV2]['input_dataset'] = NYUDepthV2(**nyudepthv2_val_cfg, download=False)
+        dataset_loaders[DATASET_CATEGORY_NYUDEPTHV2] = dict(
+            calibration_dataset=functools.partial(NYUDepthV2, **nyudepthv2_calib_cfg, download=download),
+            input_dataset=functools.partial(NYUDepthV2, **nyudepthv2_val_cfg, download=False))
     #
 
     if check_dataset_load(settings, DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD) and (DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD in dataset_list):
@@ -370,8 +414,9 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD
         )
 
-        dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['calibration_dataset'] = RobokitSegmentation(**dataset_calib_cfg, download=True)
-        dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD]['input_dataset'] = RobokitSegmentation(**dataset_val_cfg, download=True)
+        dataset_loaders[DATASET_CATEGORY_TI_ROBOKIT_SEMSEG_ZED1HD] = dict(
+            calibration_dataset=functools.partial(RobokitSegmentation, **dataset_calib_cfg, download=True),
+            input_dataset=functools.partial(RobokitSegmentation, **dataset_val_cfg, download=True))
     #
 
     if check_dataset_load(settings, DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD) and (DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD in dataset_list):
@@ -395,8 +440,9 @@ def get_datasets(settings, download=False, dataset_list=None):
             name=DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD
         )
 
-        dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['calibration_dataset'] = RobokitVisualLocalization(**dataset_calib_cfg, download=True)
-        dataset_cache[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD]['input_dataset'] = RobokitVisualLocalization(**dataset_val_cfg, download=True)
+        dataset_loaders[DATASET_CATEGORY_TI_ROBOKIT_VISLOC_ZED1HD] = dict(
+            calibration_dataset=functools.partial(RobokitVisualLocalization, **dataset_calib_cfg, download=True),
+            input_dataset=functools.partial(RobokitVisualLocalization, **dataset_val_cfg, download=True))
     #
 
     # the following are datasets cannot be downloaded automatically
@@ -416,10 +462,11 @@ def get_datasets(settings, download=False, dataset_list=None):
                 shuffle=True,
                 num_frames=min(settings.num_frames,500),
                 name=DATASET_CATEGORY_CITYSCAPES)
-            dataset_cache[DATASET_CATEGORY_CITYSCAPES]['calibration_dataset'] = CityscapesSegmentation(**cityscapes_seg_calib_cfg, download=False)
-            dataset_cache[DATASET_CATEGORY_CITYSCAPES]['input_dataset'] = CityscapesSegmentation(**cityscapes_seg_val_cfg, download=False)
+            dataset_loaders[DATASET_CATEGORY_CITYSCAPES] = dict(
+                calibration_dataset=functools.partial(CityscapesSegmentation, **cityscapes_seg_calib_cfg, download=False),
+                input_dataset=functools.partial(CityscapesSegmentation, **cityscapes_seg_val_cfg, download=False))
         #
-        if check_dataset_load(settings, DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS) and (DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS in dataset_list):
+        if KittiLidar3D is not None and check_dataset_load(settings, DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS) and (DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS in dataset_list):
             print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS} variant:{DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS}"))
             dataset_calib_cfg = dict(
                 path=f'{settings.datasets_path}/kitti_3dod/',
@@ -439,14 +486,11 @@ def get_datasets(settings, download=False, dataset_list=None):
                 shuffle=False,
                 num_frames=min(settings.num_frames, 3769),
                 name=DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS)
-            try:
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['calibration_dataset'] = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS]['input_dataset'] = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
-            except Exception as message:
-                print(f'KittiLidar3D dataset loader could not be created: {message}')
-            #
+            dataset_loaders[DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS] = dict(
+                calibration_dataset=functools.partial(KittiLidar3D, **dataset_calib_cfg, download=False, read_anno=False),
+                input_dataset=functools.partial(KittiLidar3D, **dataset_val_cfg, download=False, read_anno=True))
         #
-        if check_dataset_load(settings, DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS) and (DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS in dataset_list):
+        if KittiLidar3D is not None and check_dataset_load(settings, DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS) and (DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS in dataset_list):
             print(utils.log_color("\nINFO", f"lodaing dataset", f"category:{DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS} variant:{DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS}"))
             dataset_calib_cfg = dict(
                 path=f'{settings.datasets_path}/kitti_3dod/',
@@ -466,12 +510,9 @@ def get_datasets(settings, download=False, dataset_list=None):
                 shuffle=False,
                 num_frames=min(settings.num_frames, 3769),
                 name=DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS)
-            try:
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['calibration_dataset'] = KittiLidar3D(**dataset_calib_cfg, download=False, read_anno=False)
-                dataset_cache[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS]['input_dataset'] = KittiLidar3D(**dataset_val_cfg, download=False, read_anno=True)
-            except Exception as message:
-                print(f'KittiLidar3D dataset loader could not be created: {message}')
-            #
+            dataset_loaders[DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS] = dict(
+                calibration_dataset=functools.partial(KittiLidar3D, **dataset_calib_cfg, download=False, read_anno=False),
+                input_dataset=functools.partial(KittiLidar3D, **dataset_val_cfg, download=False, read_anno=True))
         #
 
         if check_dataset_load(settings, DATASET_CATEGORY_KITTI_2015) and (DATASET_CATEGORY_KITTI_2015 in dataset_list):
@@ -490,14 +531,69 @@ def get_datasets(settings, download=False, dataset_list=None):
                 shuffle=False,
                 max_disp=192,
                 num_frames=min(settings.num_frames, 50))
-            try:
-                dataset_cache['kitti_2015']['calibration_dataset'] = Kitti2015(**dataset_calib_cfg, download=False)
-                dataset_cache['kitti_2015']['input_dataset'] = Kitti2015(**dataset_val_cfg, download=False)
-            except Exception as message:
-                print(f'Kitti 2015 dataset loader could not be created: {message}')
-            #         
+            dataset_loaders['kitti_2015'] = dict(
+                calibration_dataset=functools.partial(Kitti2015, **dataset_calib_cfg, download=False),
+                input_dataset=functools.partial(Kitti2015, **dataset_val_cfg, download=False))
         #
     #
+    # if one of these cannot be created, it is reported and the run continues without it
+    optional_categories = (DATASET_CATEGORY_KITTI_LIDAR_DET_3CLASS, DATASET_CATEGORY_KITTI_LIDAR_DET_1CLASS,
+                           DATASET_CATEGORY_KITTI_2015)
+    _load_datasets(settings, dataset_cache, dataset_loaders, optional_categories)
+    return dataset_cache
+
+
+def _load_dataset_group(dataset_loaders_group, optional_categories):
+    load_results = {}
+    for dataset_category, dataset_loader in dataset_loaders_group:
+        start_time = time.time()
+        try:
+            # the calibration dataset is created first, since it is the one that downloads the dataset (if needed)
+            datasets_loaded = {dataset_key: dataset_loader[dataset_key]()
+                               for dataset_key in ('calibration_dataset', 'input_dataset')}
+        except Exception as message:
+            if dataset_category not in optional_categories:
+                raise
+            #
+            print(f'{dataset_category} dataset loader could not be created: {message}')
+            continue
+        #
+        load_results[dataset_category] = (datasets_loaded, time.time() - start_time)
+    #
+    return load_results
+
+
+def _load_datasets(settings, dataset_cache, dataset_loaders, optional_categories=()):
+    '''
+    creates the datasets of the registered loaders and puts them in dataset_cache - concurrently, on a pool of
+    settings.dataset_loading_workers threads. the categories that share a dataset folder (eg. coco, cocokpts and cocoseg21)
+    are created one after the other in the same thread - so that a download or a cache file is not written twice at a time.
+    '''
+    if len(dataset_loaders) == 0:
+        return dataset_cache
+    #
+    dataset_loaders_groups = {}
+    for dataset_category, dataset_loader in dataset_loaders.items():
+        dataset_path = os.path.normpath(dataset_loader['calibration_dataset'].keywords.get('path', dataset_category))
+        dataset_loaders_groups.setdefault(dataset_path, []).append((dataset_category, dataset_loader))
+    #
+    start_time = time.time()
+    num_workers = max(min(settings.dataset_loading_workers or 1, len(dataset_loaders_groups)), 1)
+    load_results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        group_futures = [executor.submit(_load_dataset_group, dataset_loaders_group, optional_categories)
+                         for dataset_loaders_group in dataset_loaders_groups.values()]
+        for group_future in group_futures:
+            load_results.update(group_future.result())
+        #
+    #
+    load_times = []
+    for dataset_category, (datasets_loaded, load_time) in load_results.items():
+        dataset_cache[dataset_category].update(datasets_loaded)
+        load_times.append(f'{dataset_category}:{load_time:.2f}s')
+    #
+    print(utils.log_color("\nINFO", "dataset load time", f"{time.time()-start_time:.2f}s ({num_workers} threads) - " +
+                          ", ".join(load_times)))
     return dataset_cache
 
 
@@ -122,10 +122,8 @@ class CityscapesSegmentation(DatasetBase):
 
         shuffle = self.kwargs['shuffle'] if (isinstance(self.kwargs, dict) and 'shuffle' in self.kwargs) else False
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(self.imgs)
-            random.seed(int(shuffle))
-            random.shuffle(self.labels)
+            random.Random(int(shuffle)).shuffle(self.imgs)
+            random.Random(int(shuffle)).shuffle(self.labels)
         #
         self.num_frames = self.kwargs['num_frames'] = min(self.kwargs['num_frames'], len(self.imgs)) \
             if (self.kwargs['num_frames'] is not None) else len(self.imgs)
@@ -146,21 +144,22 @@ class CityscapesSegmentation(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            # image = PIL.Image.open(image_file)
-            label_img = PIL.Image.open(label_file)
-            label_img = self.encode_segmap(label_img)
-
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
-        #
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, output, **kwargs):
+        image_file, label_file = self.__getitem__(frame_idx, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        label_img = self.encode_segmap(label_img)
+
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # accumulate the confusion matrix
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        cmatrix = self.metric_state
+        self.metric_state = None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
@@ -81,16 +81,16 @@ import shutil
 import tempfile
 import numpy as np
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 from .. import utils
 from .dataset_base import *
+from .coco_index import COCOIndexDatasetBase
 
 __all__ = ['COCODetection', 'coco_det_label_offset_80to90', 'coco_det_label_offset_90to90']
 
 
-class COCODetection(DatasetBase):
+class COCODetection(COCOIndexDatasetBase):
     def __init__(self, num_classes=90, download=False, image_dir=None, annotation_file=None, num_frames=None, name='coco', **kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
         if image_dir is None or annotation_file is None:
@@ -117,48 +117,40 @@ class COCODetection(DatasetBase):
             self.annotation_file = annotation_file
         #
         self._load_dataset()
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def _load_dataset(self):
         shuffle = self.kwargs.get('shuffle', False)
-        self.coco_dataset = COCO(self.annotation_file)
+        self._load_annotation_index()
+        self.imgs = self.annotation_index.get_imgs()
         filter_imgs = self.kwargs['filter_imgs'] if 'filter_imgs' in self.kwargs else None
         if isinstance(filter_imgs, str):
             # filter images with the given list
             filter_imgs = os.path.join(self.kwargs['path'], filter_imgs)
             with open(filter_imgs) as filter_fp:
                 filter = [int(id) for id in list(filter_fp)]
-                orig_keys = list(self.coco_dataset.imgs)
+                orig_keys = list(self.imgs)
                 orig_keys = [k for k in orig_keys if k in filter]
-                self.coco_dataset.imgs = {k: self.coco_dataset.imgs[k] for k in orig_keys}
+                self.imgs = {k: self.imgs[k] for k in orig_keys}
             #
         elif filter_imgs:
             # filter and use images with gt only
-            sel_keys = []
-            for img_key, img_anns in self.coco_dataset.imgToAnns.items():
-                if len(img_anns) > 0:
-                    sel_keys.append(img_key)
-                #
-            #
-            self.coco_dataset.imgs = {k: self.coco_dataset.imgs[k] for k in sel_keys}
+            sel_keys = self.annotation_index.get_annotated_img_ids()
+            self.imgs = {k: self.imgs[k] for k in sel_keys}
         #
 
-        max_frames = len(self.coco_dataset.imgs)
+        max_frames = len(self.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
 
-        imgs_list = list(self.coco_dataset.imgs.items())
+        imgs_list = list(self.imgs.items())
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(imgs_list)
+            random.Random(int(shuffle)).shuffle(imgs_list)
         #
-        self.coco_dataset.imgs = {k:v for k,v in imgs_list[:num_frames]}
+        self.imgs = {k:v for k,v in imgs_list[:num_frames]}
 
-        self.cat_ids = self.coco_dataset.getCatIds()
-        self.img_ids = self.coco_dataset.getImgIds()
+        self.cat_ids = self.annotation_index.get_cat_ids()
+        self.img_ids = list(self.imgs.keys())
         self.num_frames = self.kwargs['num_frames'] = num_frames
         self.tempfiles = []
 
@@ -195,8 +187,8 @@ class COCODetection(DatasetBase):
 
     def __getitem__(self, idx, with_label=False):
         img_id = self.img_ids[idx]
-        img = self.coco_dataset.loadImgs([img_id])[0]
-        image_path = os.path.join(self.image_dir, img['file_name'])
+        img = self.imgs[img_id]
+        image_path = self.read_data(os.path.join(self.image_dir, img['file_name']), self.image_dir)
         if with_label:
             return image_path, None
         else:
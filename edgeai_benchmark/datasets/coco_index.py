@@ -0,0 +1,181 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import json
+import pickle
+import numpy as np
+from pycocotools.coco import COCO
+
+from .. import utils
+from .dataset_base import DatasetBase
+
+__all__ = ['COCOAnnotationIndex', 'COCOIndexDatasetBase']
+
+
+class COCOAnnotationIndex:
+    '''
+    a compact index of a COCO format annotation file - numpy arrays of the scalar fields of the images (id, file_name,
+    height, width etc.) and of the image_id, category_id, bbox, area, iscrowd and num_keypoints of each annotation,
+    plus the info and categories. parsing the json file of the annotations (hundreds of MB for coco) takes several
+    seconds - the index is written to index_path once (keyed by the path, size and mtime of the annotation file)
+    and it is loaded in milliseconds after that. None for index_path builds it from the json file without writing it.
+    the pycocotools COCO object needs all the annotations - get_coco_api() creates it from the json file when it is needed.
+    '''
+    version = 1
+
+    def __init__(self, annotation_file, index_path=None):
+        self.annotation_file = annotation_file
+        index_file = self.get_index_file(annotation_file, index_path) if index_path else None
+        if index_file is not None and os.path.exists(index_file + '.pkl'):
+            arrays, store = self._read_index(index_file)
+        else:
+            arrays, store = self._build_index(annotation_file)
+            if index_file is not None:
+                self._write_index(index_file, arrays, store)
+            #
+        #
+        self.image_fields = store['image_fields']
+        self.images = {field: arrays[f'image_{field}'] for field in self.image_fields}
+        self.ann_image_ids = arrays['ann_image_ids']
+        self.ann_category_ids = arrays['ann_category_ids']
+        self.ann_bboxes = arrays['ann_bboxes']
+        self.ann_areas = arrays['ann_areas']
+        self.ann_iscrowd = arrays['ann_iscrowd']
+        self.ann_num_keypoints = arrays['ann_num_keypoints']
+        # the part of the json file that is kept in the dataset_info
+        self.dataset_store = store['dataset_store']
+
+    @classmethod
+    def get_index_file(cls, annotation_file, index_path):
+        # a changed (or replaced) annotation file gets a new index - the old one is not used anymore
+        file_stat = os.stat(annotation_file)
+        index_key = utils.get_cache_key(cls.__name__, cls.version, os.path.abspath(annotation_file),
+                                        file_stat.st_size, file_stat.st_mtime_ns)
+        index_name = os.path.splitext(os.path.basename(annotation_file))[0]
+        return os.path.join(index_path, f'{index_name}_{index_key}')
+
+    @staticmethod
+    def _build_index(annotation_file):
+        with open(annotation_file) as afp:
+            dataset = json.load(afp)
+        #
+        images = dataset.get('images', [])
+        annotations = dataset.get('annotations', [])
+        # the fields that are scalars of the same type in all the images (eg. not the camera parameters of some datasets)
+        image_fields = [field for field in (images[0].keys() if len(images) > 0 else ['id', 'file_name'])
+                        if len({type(img.get(field, None)) for img in images} - {str, int, float}) == 0 and
+                        len({type(img.get(field, None)) for img in images}) <= 1]
+        arrays = {f'image_{field}': np.array([img[field] for img in images]) for field in image_fields}
+        arrays['ann_image_ids'] = np.array([ann['image_id'] for ann in annotations], dtype=np.int64)
+        arrays['ann_category_ids'] = np.array([ann.get('category_id', -1) for ann in annotations], dtype=np.int64)
+        arrays['ann_bboxes'] = np.array([ann.get('bbox', [0,0,0,0]) for ann in annotations], dtype=np.float64).reshape(-1,4)
+        arrays['ann_areas'] = np.array([ann.get('area', 0) for ann in annotations], dtype=np.float64)
+        arrays['ann_iscrowd'] = np.array([ann.get('iscrowd', 0) for ann in annotations], dtype=np.uint8)
+        arrays['ann_num_keypoints'] = np.array([ann.get('num_keypoints', 0) for ann in annotations], dtype=np.int32)
+        dataset_store = {key: dataset[key] for key in ('info', 'categories') if key in dataset}
+        return arrays, dict(image_fields=image_fields, dataset_store=dataset_store)
+
+    @staticmethod
+    def _read_index(index_file):
+        with np.load(index_file + '.npz') as index:
+            arrays = {key: index[key] for key in index.files}
+        #
+        with open(index_file + '.pkl', 'rb') as fp:
+            store = pickle.load(fp)
+        #
+        return arrays, store
+
+    @staticmethod
+    def _write_index(index_file, arrays, store):
+        # several processes may write the same index - each writes its own temporary files, that are then renamed.
+        # the .pkl is renamed last, since its presence marks a complete index
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        index_file_tmp = f'{index_file}.{os.getpid()}.tmp'
+        with open(index_file_tmp + '.npz', 'wb') as fp:
+            np.savez(fp, **arrays)
+        #
+        with open(index_file_tmp + '.pkl', 'wb') as fp:
+            pickle.dump(store, fp)
+        #
+        os.replace(index_file_tmp + '.npz', index_file + '.npz')
+        os.replace(index_file_tmp + '.pkl', index_file + '.pkl')
+
+    def get_imgs(self):
+        '''
+        the images (with their scalar fields) as a dict of image id to image - in the order of the annotation file,
+        the same as COCO.imgs
+        '''
+        img_list = [dict(zip(self.image_fields, values)) for values in
+                    zip(*[self.images[field].tolist() for field in self.image_fields])]
+        return {img['id']: img for img in img_list}
+
+    def get_cat_ids(self):
+        # the same as COCO.getCatIds()
+        return [cat['id'] for cat in self.dataset_store.get('categories', [])]
+
+    def get_cats(self):
+        return self.dataset_store.get('categories', [])
+
+    def get_annotated_img_ids(self, ann_mask=None):
+        '''
+        ids of the images that have annotations (only the annotations selected by ann_mask, if given) - in the order of
+        their first annotation, the same as the keys of COCO.imgToAnns
+        '''
+        ann_image_ids = self.ann_image_ids if ann_mask is None else self.ann_image_ids[ann_mask]
+        img_ids, first_index = np.unique(ann_image_ids, return_index=True)
+        return img_ids[np.argsort(first_index, kind='stable')].tolist()
+
+    def get_coco_api(self, img_ids=None):
+        '''
+        creates the pycocotools COCO object from the annotation file - its images are restricted to img_ids, in that order
+        '''
+        coco_dataset = COCO(self.annotation_file)
+        if img_ids is not None:
+            coco_dataset.imgs = {k: coco_dataset.imgs[k] for k in img_ids}
+        #
+        return coco_dataset
+
+
+class COCOIndexDatasetBase(DatasetBase):
+    '''
+    base class of the datasets that use a COCO format annotation file. the images and categories are taken from the
+    COCOAnnotationIndex of the annotation file (kwarg annotation_index_path is where it is cached).
+    coco_dataset - the pycocotools COCO object with the selected images (img_ids) - is created on first use (eg. in evaluate())
+    '''
+    def _load_annotation_index(self):
+        self.annotation_index = COCOAnnotationIndex(self.annotation_file, self.kwargs.get('annotation_index_path', None))
+        self.dataset_store = self.annotation_index.dataset_store
+        self._coco_dataset = None
+
+    @property
+    def coco_dataset(self):
+        if self._coco_dataset is None:
+            self._coco_dataset = self.annotation_index.get_coco_api(self.img_ids)
+        #
+        return self._coco_dataset
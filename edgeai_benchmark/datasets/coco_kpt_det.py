@@ -82,16 +82,16 @@ import shutil
 import tempfile
 import numpy as np
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 from .. import utils
 from .dataset_base import *
+from .coco_index import COCOIndexDatasetBase
 
 __all__ = ['COCOKeypointDetection']
 
 
-class COCOKeypointDetection(DatasetBase):
+class COCOKeypointDetection(COCOIndexDatasetBase):
     def __init__(self, num_classes=1, download=False, image_dir=None, annotation_file=None, num_frames=None, name='coco_kpt_det', num_keypoints=None, annotation_prefix=None,**kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, num_keypoints=num_keypoints, **kwargs)
         if image_dir is None or annotation_file is None:
@@ -118,49 +118,41 @@ class COCOKeypointDetection(DatasetBase):
             self.annotation_file = annotation_file
         #
         self._load_dataset()
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
         self.num_keypoints = len(self.dataset_store["categories"][0]["keypoints"])
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def _load_dataset(self):
         shuffle = self.kwargs.get('shuffle', False)
-        self.coco_dataset = COCO(self.annotation_file)
+        self._load_annotation_index()
+        self.imgs = self.annotation_index.get_imgs()
         filter_imgs = self.kwargs['filter_imgs'] if 'filter_imgs' in self.kwargs else None
         if isinstance(filter_imgs, str):
             # filter images with the given list
             filter_imgs = os.path.join(self.kwargs['path'], filter_imgs)
             with open(filter_imgs) as filter_fp:
                 filter = [int(id) for id in list(filter_fp)]
-                orig_keys = list(self.coco_dataset.imgs)
+                orig_keys = list(self.imgs)
                 orig_keys = [k for k in orig_keys if k in filter]
-                self.coco_dataset.imgs = {k: self.coco_dataset.imgs[k] for k in orig_keys}
+                self.imgs = {k: self.imgs[k] for k in orig_keys}
             #
         elif filter_imgs:
             # filter and use images with gt only
-            sel_keys = []
-            for img_key, img_anns in self.coco_dataset.imgToAnns.items():
-                if len(img_anns) > 0:
-                    sel_keys.append(img_key)
-                #
-            #
-            self.coco_dataset.imgs = {k: self.coco_dataset.imgs[k] for k in sel_keys}
+            sel_keys = self.annotation_index.get_annotated_img_ids()
+            self.imgs = {k: self.imgs[k] for k in sel_keys}
         #
 
-        max_frames = len(self.coco_dataset.imgs)
+        max_frames = len(self.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
 
-        imgs_list = list(self.coco_dataset.imgs.items())
+        imgs_list = list(self.imgs.items())
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(imgs_list)
+            random.Random(int(shuffle)).shuffle(imgs_list)
         #
-        self.coco_dataset.imgs = {k:v for k,v in imgs_list[:num_frames]}
+        self.imgs = {k:v for k,v in imgs_list[:num_frames]}
 
-        self.cat_ids = self.coco_dataset.getCatIds()
-        self.img_ids = self.coco_dataset.getImgIds()
+        self.cat_ids = self.annotation_index.get_cat_ids()
+        self.img_ids = list(self.imgs.keys())
         self.num_frames = self.kwargs['num_frames'] = num_frames
         self.tempfiles = []
 
@@ -197,7 +189,7 @@ class COCOKeypointDetection(DatasetBase):
 
     def __getitem__(self, idx, with_label=False):
         img_id = self.img_ids[idx]
-        img = self.coco_dataset.loadImgs([img_id])[0]
+        img = self.imgs[img_id]
         image_path = os.path.join(self.image_dir, img['file_name'])
         if with_label:
             return image_path, None
@@ -113,13 +113,13 @@ import tempfile
 import numpy as np
 from collections import OrderedDict, defaultdict
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 
 
 from ..utils import *
 # from ..utils import *
 from ..datasets.dataset_base import *
+from .coco_index import COCOIndexDatasetBase
 # from .dataset_base import *
 
 __all__ = ['COCOKeypoints', '_get_mapping_id_name']
@@ -144,7 +144,7 @@ def _get_mapping_id_name(imgs):
 
     return id2name, name2id
 
-class COCOKeypoints(DatasetBase):
+class COCOKeypoints(COCOIndexDatasetBase):
     def __init__(self, num_joints=17, download=False, num_frames=None, name="cocokpts", **kwargs):
         super().__init__(num_joints=num_joints, num_frames=num_frames, name=name, **kwargs)
         self.force_download = True if download == 'always' else False
@@ -167,7 +167,8 @@ class COCOKeypoints(DatasetBase):
         self.image_dir = os.path.join(image_base_dir, self.kwargs['split'])
 
         self.annotation_file = os.path.join(annotations_dir, f'person_keypoints_{self.kwargs["split"]}.json')
-        self.coco_dataset = COCO(self.annotation_file)
+        self._load_annotation_index()
+        self.imgs = self.annotation_index.get_imgs()
 
         filter_imgs = self.kwargs['filter_imgs'] if 'filter_imgs' in self.kwargs else None
         if isinstance(filter_imgs, str):
@@ -175,43 +176,36 @@ class COCOKeypoints(DatasetBase):
             filter_imgs = os.path.join(self.kwargs['path'], filter_imgs)
             with open(filter_imgs) as filter_fp:
                 filter = [int(id) for id in list(filter_fp)]
-                orig_keys = list(self.coco_dataset.imgs)
+                orig_keys = list(self.imgs)
                 orig_keys = [k for k in orig_keys if k in filter]
-                self.coco_dataset.imgs = {k: self.coco_dataset.imgs[k] for k in orig_keys}
+                self.imgs = {k: self.imgs[k] for k in orig_keys}
             #
         elif filter_imgs:
-            all_keys = self.coco_dataset.getImgIds()
-            sel_keys = []
             # filter and use images with gt having keypoints only.
-            for img_id in all_keys:
-                for ann in self.coco_dataset.imgToAnns[img_id]:
-                    if ann['num_keypoints'] >0 :
-                        sel_keys.append(img_id)
-                        break
-
-            self.coco_dataset.imgs = {k: self.coco_dataset.imgs[k] for k in sel_keys}
+            kpts_img_ids = set(self.annotation_index.get_annotated_img_ids(self.annotation_index.ann_num_keypoints > 0))
+            sel_keys = [img_id for img_id in self.imgs if img_id in kpts_img_ids]
+            self.imgs = {k: self.imgs[k] for k in sel_keys}
         #
 
-        max_frames = len(self.coco_dataset.imgs)
+        max_frames = len(self.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
 
-        imgs_list = list(self.coco_dataset.imgs.items())
+        imgs_list = list(self.imgs.items())
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(imgs_list)
+            random.Random(int(shuffle)).shuffle(imgs_list)
 
-        self.coco_dataset.imgs = {k:v for k,v in imgs_list[:num_frames]}
+        self.imgs = {k:v for k,v in imgs_list[:num_frames]}
         
         self.cats = [
-            cat['name'] for cat in self.coco_dataset.loadCats(self.coco_dataset.getCatIds())
+            cat['name'] for cat in self.annotation_index.get_cats()
         ]
 
         self.classes = ['__background__'] + self.cats
         self.num_classes = len(self.classes)
         self._class_to_ind = dict(zip(self.classes, range(self.num_classes)))
-        self._class_to_coco_ind = dict(zip(self.cats, self.coco_dataset.getCatIds()))
-        self.img_ids = self.coco_dataset.getImgIds()       
+        self._class_to_coco_ind = dict(zip(self.cats, self.annotation_index.get_cat_ids()))
+        self.img_ids = list(self.imgs.keys())
 
         self.num_frames = self.kwargs['num_frames'] = num_frames
         self.tempfiles = []
@@ -242,11 +236,8 @@ class COCOKeypoints(DatasetBase):
                     .87, .87, .89, .89
                 ]) / 10.0
 
-        self.id2name, self.name2id = _get_mapping_id_name(self.coco_dataset.imgs)
+        self.id2name, self.name2id = _get_mapping_id_name(self.imgs)
         # store dataset info
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def download(self, path, split):
@@ -282,7 +273,7 @@ class COCOKeypoints(DatasetBase):
 
     def __getitem__(self, idx):
         img_id = self.img_ids[idx]
-        img = self.coco_dataset.loadImgs([img_id])[0]
+        img = self.imgs[img_id]
         image_path = os.path.join(self.image_dir, img['file_name'])
         return image_path
 
@@ -81,17 +81,17 @@ import PIL
 import cv2
 import tempfile
 from colorama import Fore
-from pycocotools.coco import COCO
 from pycocotools import mask as coco_mask
 import json
 
 from .. import utils
 from .dataset_base import *
+from .coco_index import COCOIndexDatasetBase
 
 __all__ = ['COCOSegmentation']
 
 
-class COCOSegmentation(DatasetBase):
+class COCOSegmentation(COCOIndexDatasetBase):
     def __init__(self, num_classes=21, download=False, num_frames=None, name="cocoseg21", **kwargs):
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
         self.force_download = True if download == 'always' else False
@@ -128,29 +128,29 @@ class COCOSegmentation(DatasetBase):
         self.image_dir = os.path.join(image_base_dir, split)
 
         self.annotation_file = os.path.join(annotations_dir, f'instances_{split}.json')
-        self.coco_dataset = COCO(self.annotation_file)
+        self._load_annotation_index()
+        self.imgs = self.annotation_index.get_imgs()
 
-        self.cat_ids = self.coco_dataset.getCatIds()
-        img_ids = self.coco_dataset.getImgIds()
+        self.cat_ids = self.annotation_index.get_cat_ids()
+        img_ids = list(self.imgs.keys())
         self.img_ids = self._remove_images_without_annotations(img_ids)
 
-        max_frames = len(self.coco_dataset.imgs)
+        max_frames = len(self.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
 
-        imgs_list = list(self.coco_dataset.imgs.items())
+        imgs_list = list(self.imgs.items())
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(imgs_list)
+            random.Random(int(shuffle)).shuffle(imgs_list)
         #
-        self.coco_dataset.imgs = {k:v for k,v in imgs_list[:num_frames]}
+        self.imgs = {k:v for k,v in imgs_list[:num_frames]}
 
-        max_frames = len(self.coco_dataset.imgs)
+        max_frames = len(self.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
 
-        self.cat_ids = self.coco_dataset.getCatIds()
-        self.img_ids = self.coco_dataset.getImgIds()
+        self.cat_ids = self.annotation_index.get_cat_ids()
+        self.img_ids = list(self.imgs.keys())
         self.num_frames = self.kwargs['num_frames'] = num_frames
 
         run_dir = self.kwargs.get('run_dir', None)
@@ -160,9 +160,6 @@ class COCOSegmentation(DatasetBase):
             self.tempfiles.append(temp_dir)
         #
         self.label_dir = os.path.join(run_dir, 'labels')
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def download(self, path, split):
@@ -198,7 +195,7 @@ class COCOSegmentation(DatasetBase):
 
     def __getitem__(self, idx, with_label=False):
         img_id = self.img_ids[idx]
-        img = self.coco_dataset.loadImgs([img_id])[0]
+        img = self.imgs[img_id]
         image_path = os.path.join(self.image_dir, img['file_name'])
         if with_label:
             os.makedirs(self.label_dir, exist_ok=True)
@@ -233,20 +230,22 @@ class COCOSegmentation(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            label_img = self.encode_segmap(label_img)
-            # reshape prediction is needed
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
-        #
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, output, **kwargs):
+        image_file, label_file = self.__getitem__(frame_idx, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        label_img = self.encode_segmap(label_img)
+        # reshape prediction is needed
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # accumulate the confusion matrix
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        cmatrix = self.metric_state
+        self.metric_state = None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
@@ -261,16 +260,15 @@ class COCOSegmentation(DatasetBase):
         return dataset_store
 
     def _remove_images_without_annotations(self, img_ids):
-        ids = []
-        for ds_idx, img_id in enumerate(img_ids):
-            ann_ids = self.coco_dataset.getAnnIds(imgIds=img_id, iscrowd=None)
-            anno = self.coco_dataset.loadAnns(ann_ids)
-            if self.categories:
-                anno = [obj for obj in anno if obj["category_id"] in self.categories]
-            if self._has_valid_annotation(anno):
-                ids.append(img_id)
-            #
+        # the same as _has_valid_annotation() for each image - but using the arrays of the annotation index
+        ann_mask = np.isin(self.annotation_index.ann_category_ids, list(self.categories)) if self.categories else None
+        ann_image_ids = self.annotation_index.ann_image_ids if ann_mask is None else self.annotation_index.ann_image_ids[ann_mask]
+        ann_areas = self.annotation_index.ann_areas if ann_mask is None else self.annotation_index.ann_areas[ann_mask]
+        image_areas = {}
+        for img_id, area in zip(ann_image_ids.tolist(), ann_areas.tolist()):
+            image_areas[img_id] = image_areas.get(img_id, 0) + area
         #
+        ids = [img_id for img_id in img_ids if image_areas.get(img_id, 0) > 1000]
         return ids
 
     def _has_valid_annotation(self, anno):
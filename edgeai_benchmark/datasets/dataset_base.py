@@ -1,4 +1,7 @@
+import os
+import copy
 from .. import utils
+from .dataset_shard import DatasetShard
 
 
 class DatasetBase(utils.ParamsBase):
@@ -7,4 +10,50 @@ class DatasetBase(utils.ParamsBase):
         # this is required to save the params
         self.kwargs = kwargs
         # call the utils.ParamsBase.initialize()
-        super().initialize()
\ No newline at end of file
+        super().initialize()
+        # state of the metric being accumulated by update() - cleared by finalize()
+        # only the derived classes that accumulate the metric incrementally implement update() and finalize() and set it.
+        # the others are evaluated by evaluate() on the list of outputs at the end of the inference
+        self.metric_state = None
+        # optional packed shard of the data files of this dataset - see read_data()
+        shard_file = self.kwargs.get('shard_file', None)
+        self.shard = DatasetShard(shard_file) if shard_file else None
+
+    def read_data(self, path, root):
+        '''
+        if the dataset has a shard (kwarg shard_file, written by scripts/pack_dataset_shard.py with the same root),
+        returns the packed bytes of the file as a zero copy memoryview, along with the path (a utils.FileBuffer)
+        - otherwise (or if it is not in the shard) the path
+        '''
+        if self.shard is None:
+            return path
+        #
+        buffer = self.shard.get(os.path.relpath(path, root), None)
+        return utils.FileBuffer(buffer, path) if buffer is not None else path
+
+    def evaluate_incremental(self, predictions, **kwargs):
+        '''
+        evaluate a list of predictions using update() and finalize()
+        derived classes that implement update() and finalize() can use this to implement evaluate()
+        '''
+        self.metric_state = None
+        num_frames = min(self.num_frames, len(predictions))
+        for frame_idx in range(num_frames):
+            self.update(frame_idx, predictions[frame_idx], **kwargs)
+        #
+        return self.finalize(**kwargs)
+
+    def get_shared_copy(self):
+        '''
+        a light weight handle to this dataset that can be given to a pipeline, instead of a deepcopy.
+        the heavy members (eg. the annotation index) are shared and must be treated as read-only.
+        only the members that are modified per pipeline are copied: kwargs (eg. dataset_info),
+        the metric state and the list of tempfiles (that are cleaned up when the handle is deleted).
+        '''
+        dataset = copy.copy(self)
+        dataset.kwargs = copy.copy(self.kwargs)
+        dataset.metric_state = None
+        if hasattr(self, 'tempfiles'):
+            dataset.tempfiles = []
+        #
+        return dataset
@@ -0,0 +1,110 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import mmap
+import numpy as np
+
+__all__ = ['DatasetShard', 'write_dataset_shard']
+
+
+def write_dataset_shard(shard_file, file_names, root='', labels=None):
+    '''
+    packs the given files (eg. the images of a dataset split) into one shard file, one after the other.
+    the index is written to shard_file + '.index.npz' - the offset and length of each file in the shard,
+    its name (relative to root - that is how it is looked up) and its label (-1 if labels are not given).
+    '''
+    num_files = len(file_names)
+    offsets = np.zeros(num_files, dtype=np.int64)
+    lengths = np.zeros(num_files, dtype=np.int64)
+    labels = np.array(labels if labels is not None else [-1]*num_files, dtype=np.int64)
+    shard_file_tmp = shard_file + '.tmp'
+    with open(shard_file_tmp, 'wb') as shard_fp:
+        offset = 0
+        for file_idx, file_name in enumerate(file_names):
+            with open(os.path.join(root, file_name), 'rb') as fp:
+                file_data = fp.read()
+            #
+            shard_fp.write(file_data)
+            offsets[file_idx] = offset
+            lengths[file_idx] = len(file_data)
+            offset += len(file_data)
+        #
+    #
+    names = np.array([os.path.normpath(f) for f in file_names])
+    with open(shard_file_tmp + '.index.npz', 'wb') as fp:
+        np.savez(fp, names=names, offsets=offsets, lengths=lengths, labels=labels)
+    #
+    os.replace(shard_file_tmp + '.index.npz', shard_file + '.index.npz')
+    os.replace(shard_file_tmp, shard_file)
+    return shard_file
+
+
+class DatasetShard:
+    '''
+    reader for the shard written by write_dataset_shard(). the shard is memory mapped (when it is first accessed
+    in a process) and each entry is returned as a zero copy memoryview - to be decoded by ImageRead.
+    reading one large file avoids opening tens of thousands of small files, which is slow on network file systems.
+    '''
+    def __init__(self, shard_file):
+        self.shard_file = shard_file
+        with np.load(shard_file + '.index.npz') as index:
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+            self.labels = index['labels']
+            names = index['names']
+        #
+        self.name_to_index = {str(name): idx for idx, name in enumerate(names)}
+        self.shard_mmap = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, name):
+        return os.path.normpath(name) in self.name_to_index
+
+    def __getitem__(self, idx):
+        if self.shard_mmap is None:
+            with open(self.shard_file, 'rb') as fp:
+                self.shard_mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            #
+        #
+        offset = self.offsets[idx]
+        return memoryview(self.shard_mmap)[offset:offset+self.lengths[idx]]
+
+    def get(self, name, default=None):
+        idx = self.name_to_index.get(os.path.normpath(name), None)
+        return self[idx] if idx is not None else default
+
+    def get_label(self, name):
+        return int(self.labels[self.name_to_index[os.path.normpath(name)]])
+
+    def __getstate__(self):
+        # the memory map is not copied or pickled - it is opened again when needed
+        state = self.__dict__.copy()
+        state['shard_mmap'] = None
+        return state
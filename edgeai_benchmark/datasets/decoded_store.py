@@ -0,0 +1,128 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import shutil
+import pickle
+import numpy as np
+
+from .. import utils
+
+__all__ = ['DecodedImageStore', 'get_decoded_store_key', 'write_decoded_store']
+
+
+def get_decoded_store_key(dataset, preprocess):
+    '''
+    the key of the decoded images of this dataset with this preprocess - None if the preprocess does not support it.
+    the key covers the dataset (class and params) and the spec of the decode/resize/crop transforms, so a store is only
+    ever found for exactly the same images - any change in the preprocess config gives a different key.
+    '''
+    decoded_spec, num_transforms = preprocess.get_decoded_spec() if hasattr(preprocess, 'get_decoded_spec') else (None, 0)
+    if decoded_spec is None or not hasattr(dataset, 'peek_params'):
+        return None
+    #
+    # dataset_info is a file inside the run_dir, a shard has the same images as the files and the annotation index is
+    # a cache of the annotation file - these are not part of the identity
+    dataset_params = {k: v for k, v in dataset.peek_params().items()
+                      if k not in ('dataset_info', 'shard_file', 'annotation_index_path')}
+    return utils.get_cache_key(DecodedImageStore.__name__, dataset.__class__.__name__, dataset_params, decoded_spec)
+
+
+def write_decoded_store(store_path, dataset, preprocess, num_frames=None):
+    '''
+    decodes the first num_frames of the dataset with the decode/resize/crop transforms of the preprocess and writes
+    them as one (N,H,W,3) uint8 array to store_path/<key>/images.npy - along with the info_dict entries of each frame
+    (data_shape, resize_shape etc. - but not the original image). returns the folder of the store.
+    '''
+    store_key = get_decoded_store_key(dataset, preprocess)
+    assert store_key is not None, f'the preprocess does not support a decoded image store: {preprocess}'
+    num_frames = min(num_frames, len(dataset)) if num_frames else len(dataset)
+    store_folder = os.path.join(store_path, store_key)
+    temp_folder = f'{store_folder}.{os.getpid()}.tmp'
+    os.makedirs(temp_folder, exist_ok=True)
+    images = None
+    info_dicts = []
+    for frame_idx in utils.progress_step(range(num_frames), desc='decoding', position=0):
+        image, info_dict = preprocess.decode(dataset[frame_idx], {})
+        if images is None:
+            images = np.lib.format.open_memmap(os.path.join(temp_folder, 'images.npy'), mode='w+',
+                                               dtype=np.uint8, shape=(num_frames,)+image.shape)
+        #
+        images[frame_idx] = image
+        # the original image (data) is not stored
+        info_dicts.append({k: v for k, v in info_dict.items() if k != 'data' and not isinstance(v, np.ndarray)})
+    #
+    images.flush()
+    del images
+    decoded_spec, num_transforms = preprocess.get_decoded_spec()
+    with open(os.path.join(temp_folder, 'info.pkl'), 'wb') as fp:
+        pickle.dump(dict(key=store_key, spec=decoded_spec, num_frames=num_frames, info_dicts=info_dicts), fp)
+    #
+    shutil.rmtree(store_folder, ignore_errors=True)
+    os.rename(temp_folder, store_folder)
+    return store_folder
+
+
+class DecodedImageStore:
+    '''
+    the decoded images of a dataset, as written by write_decoded_store() - a wrapper for the dataset that returns
+    (image, info_dict) with the HWC uint8 RGB image at the model input resolution, instead of the image file.
+    the images are memory mapped, so only the frames that are used are read from disk.
+    use load() to look up the store of a dataset and preprocess.
+    '''
+    def __init__(self, store_folder):
+        self.store_folder = store_folder
+        with open(os.path.join(store_folder, 'info.pkl'), 'rb') as fp:
+            store_info = pickle.load(fp)
+        #
+        self.key = store_info['key']
+        self.spec = store_info['spec']
+        self.info_dicts = store_info['info_dicts']
+        self.images = np.load(os.path.join(store_folder, 'images.npy'), mmap_mode='r')
+        assert len(self.images) == store_info['num_frames'] == len(self.info_dicts), \
+            f'incomplete decoded image store: {store_folder}'
+
+    @classmethod
+    def load(cls, store_path, dataset, preprocess):
+        '''
+        returns the store of this dataset and preprocess if it has been written to store_path - otherwise None
+        '''
+        store_key = get_decoded_store_key(dataset, preprocess)
+        store_folder = os.path.join(store_path, store_key) if (store_path and store_key) else None
+        if store_folder is None or not os.path.exists(os.path.join(store_folder, 'info.pkl')):
+            return None
+        #
+        store = cls(store_folder)
+        assert store.key == store_key, f'decoded image store {store_folder} was written for a different key: {store.key}'
+        return store
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, idx):
+        # the image is copied out of the memory map - the transforms that follow may modify it
+        return np.array(self.images[idx]), dict(self.info_dicts[idx])
@@ -63,8 +63,7 @@ class ImageClassification(DatasetBase):
         self.num_frames = self.kwargs['num_frames'] = self.kwargs.get('num_frames',len(self.imgs))
         shuffle = self.kwargs.get('shuffle', False)
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(self.imgs)
+            random.Random(int(shuffle)).shuffle(self.imgs)
         #
 
     def download(self, path, split_file):
@@ -73,7 +72,7 @@ class ImageClassification(DatasetBase):
     def __getitem__(self, idx, **kwargs):
         with_label = kwargs.get('with_label', False)
         words = self.imgs[idx].split(' ')
-        image_name = words[0]
+        image_name = self.read_data(words[0], self.kwargs['path'])
         if with_label:
             assert len(words)>0, f'ground truth requested, but missing at the dataset entry for {words}'
             label = int(words[1])
@@ -89,15 +88,20 @@ class ImageClassification(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        in_lines = self.imgs
-        metric_tracker = utils.AverageMeter(name='accuracy_top1%')
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            words = in_lines[n].split(' ')
-            gt_label = int(words[1])
-            accuracy = self.classification_accuracy(predictions[n], gt_label, **kwargs)
-            metric_tracker.update(accuracy)
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, output, **kwargs):
+        if self.metric_state is None:
+            self.metric_state = utils.AverageMeter(name='accuracy_top1%')
         #
+        words = self.imgs[frame_idx].split(' ')
+        gt_label = int(words[1])
+        accuracy = self.classification_accuracy(output, gt_label, **kwargs)
+        self.metric_state.update(accuracy)
+
+    def finalize(self, **kwargs):
+        metric_tracker = self.metric_state or utils.AverageMeter(name='accuracy_top1%')
+        self.metric_state = None
         return {metric_tracker.name:metric_tracker.avg}
 
     def classification_accuracy(self, prediction, target, label_offset_pred=0, label_offset_gt=0,
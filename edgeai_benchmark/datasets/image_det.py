@@ -42,8 +42,7 @@ class ImageDetection(DatasetBase):
         self.num_frames = self.kwargs['num_frames'] = self.kwargs.get('num_frames',len(self.imgs))
         shuffle = self.kwargs.get('shuffle', False)
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(self.imgs)
+            random.Random(int(shuffle)).shuffle(self.imgs)
         #
 
     def download(self, path, split_file):
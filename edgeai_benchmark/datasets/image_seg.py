@@ -46,18 +46,21 @@ class ImageSegmentation(ImagePixel2Pixel):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
-        for n in range(self.num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            # reshape prediction is needed
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
-        #
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, output, **kwargs):
+        image_file, label_file = self.__getitem__(frame_idx, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        # reshape prediction is needed
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # accumulate the confusion matrix
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        cmatrix = self.metric_state
+        self.metric_state = None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
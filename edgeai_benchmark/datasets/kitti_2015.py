@@ -281,12 +281,12 @@ class Kitti2015(DatasetBase):
         
         shuffle = self.kwargs.get('shuffle', False)
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(self.left_imgs)
-            #random.seed(int(shuffle))
-            random.shuffle(self.right_imgs)
-            #random.seed(int(shuffle))
-            random.shuffle(self.gt_imgs)
+            shuffle_rng = random.Random(int(shuffle))
+            shuffle_rng.shuffle(self.left_imgs)
+            #shuffle_rng = random.Random(int(shuffle))
+            shuffle_rng.shuffle(self.right_imgs)
+            #shuffle_rng = random.Random(int(shuffle))
+            shuffle_rng.shuffle(self.gt_imgs)
 
 
     def download(self, path, split):
@@ -309,28 +309,32 @@ class Kitti2015(DatasetBase):
     def __call__(self, predictions, **kwargs):
         return self.evaluate(predictions, **kwargs)
         
-    def evaluate(self, predictions, **kwargs):        
-        accuracy = 0.0
-        max_disp = self.kwargs.get('max_disp')
-
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            left_file, right_file, gt_file = self.__getitem__(n, with_label=True)
-            gt_img = PIL.Image.open(gt_file)
-            gt_img = np.array(gt_img, dtype=np.float32) / 256.
-            prediction = predictions[n]
+    def evaluate(self, predictions, **kwargs):
+        return self.evaluate_incremental(predictions, **kwargs)
 
-            gt_img = F.center_crop(gt_img, (prediction.shape[0], prediction.shape[1]))
+    def update(self, frame_idx, prediction, **kwargs):
+        max_disp = self.kwargs.get('max_disp')
+        left_file, right_file, gt_file = self.__getitem__(frame_idx, with_label=True)
+        gt_img = PIL.Image.open(gt_file)
+        gt_img = np.array(gt_img, dtype=np.float32) / 256.
 
-            mask = (gt_img < max_disp) & (gt_img > 0)
+        gt_img = F.center_crop(gt_img, (prediction.shape[0], prediction.shape[1]))
 
-            diff = abs(gt_img - prediction[:, :, 0])
-            diff = diff[mask]
+        mask = (gt_img < max_disp) & (gt_img > 0)
 
-            accuracy += diff.sum() / mask.sum()
+        diff = abs(gt_img - prediction[:, :, 0])
+        diff = diff[mask]
+        # accumulate the error and the number of frames
+        if self.metric_state is None:
+            self.metric_state = {'error': 0.0, 'num_frames': 0}
+        #
+        self.metric_state['error'] += diff.sum() / mask.sum()
+        self.metric_state['num_frames'] += 1
 
-        accuracy /= (n+1)             
-        #return accuracy
+    def finalize(self, **kwargs):
+        metric_state = self.metric_state or {'error': 0.0, 'num_frames': 0}
+        self.metric_state = None
+        accuracy = metric_state['error'] / max(metric_state['num_frames'], 1)
         return {'disparity_error_%':accuracy}   
 
 
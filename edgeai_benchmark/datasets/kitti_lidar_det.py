@@ -270,8 +270,7 @@ class KittiLidar3D(DatasetBase):
         self.num_frames = self.kwargs['num_frames'] = self.kwargs.get('num_frames',len(self.val_image_ids))
         shuffle = self.kwargs.get('shuffle', False)
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(self.val_image_ids)
+            random.Random(int(shuffle)).shuffle(self.val_image_ids)
 
         self.num_classes = kwargs['num_classes']
 
@@ -53,9 +53,6 @@ class ModelMakerDetectionDataset(coco_det.COCODetection):
         annotation_file = os.path.join(path, 'annotations', f'{annotation_prefix}_{split}.json')
         super().__init__(num_classes=num_classes, image_dir=image_dir, annotation_file=annotation_file,
                          download=False, num_frames=num_frames, name=name, **kwargs)
-        with open(annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def download(self, path, split):
@@ -128,14 +125,20 @@ class ModelMakerClassificationDataset(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        metric_tracker = utils.AverageMeter(name='accuracy_top1%')
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            words = self.__getitem__(n, with_label=True)
-            gt_label = int(words[1])
-            accuracy = self.classification_accuracy(predictions[n], gt_label, **kwargs)
-            metric_tracker.update(accuracy)
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, output, **kwargs):
+        if self.metric_state is None:
+            self.metric_state = utils.AverageMeter(name='accuracy_top1%')
         #
+        words = self.__getitem__(frame_idx, with_label=True)
+        gt_label = int(words[1])
+        accuracy = self.classification_accuracy(output, gt_label, **kwargs)
+        self.metric_state.update(accuracy)
+
+    def finalize(self, **kwargs):
+        metric_tracker = self.metric_state or utils.AverageMeter(name='accuracy_top1%')
+        self.metric_state = None
         return {metric_tracker.name: metric_tracker.avg}
 
     def classification_accuracy(self, prediction, target, label_offset_pred=0, label_offset_gt=0,
@@ -212,8 +215,7 @@ class ModelMakerSegmentationDataset(DatasetBase):
 
         imgs_list = list(self.coco_dataset.imgs.items())
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(imgs_list)
+            random.Random(int(shuffle)).shuffle(imgs_list)
         #
         self.coco_dataset.imgs = {k: v for k, v in imgs_list[:num_frames]}
 
@@ -284,20 +286,22 @@ class ModelMakerSegmentationDataset(DatasetBase):
         return self.evaluate(predictions, **kwargs)
 
     def evaluate(self, predictions, **kwargs):
-        cmatrix = None
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            label_img = self.encode_segmap(label_img)
-            # reshape prediction is needed
-            output = predictions[n]
-            output = output.astype(np.uint8)
-            output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
-            output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
-            # compute metric
-            cmatrix = utils.confusion_matrix(cmatrix, output, label_img, self.num_classes)
-        #
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, output, **kwargs):
+        image_file, label_file = self.__getitem__(frame_idx, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        label_img = self.encode_segmap(label_img)
+        # reshape prediction is needed
+        output = output.astype(np.uint8)
+        output = output[0] if (output.ndim > 2 and output.shape[0] == 1) else output
+        output = output[:2] if (output.ndim > 2 and output.shape[2] == 1) else output
+        # accumulate the confusion matrix
+        self.metric_state = utils.confusion_matrix(self.metric_state, output, label_img, self.num_classes)
+
+    def finalize(self, **kwargs):
+        cmatrix = self.metric_state
+        self.metric_state = None
         accuracy = utils.segmentation_accuracy(cmatrix)
         return accuracy
 
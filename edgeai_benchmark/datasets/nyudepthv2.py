@@ -182,48 +182,53 @@ class NYUDepthV2(DatasetBase):
 
             return x_0, x_1
 
-    def evaluate(self, predictions, threshold=1.25, depth_cap_max = 80, depth_cap_min = 1e-3, **kwargs):
+    def evaluate(self, predictions, **kwargs):
+        return self.evaluate_incremental(predictions, **kwargs)
+
+    def update(self, frame_idx, prediction, threshold=1.25, depth_cap_max = 80, depth_cap_min = 1e-3, **kwargs):
         disparity = kwargs.get('disparity')
         scale_and_shift_needed = kwargs.get('scale_shift')
 
-        delta_1 = 0.0
-        num_frames = min(self.num_frames, len(predictions))
-        for n in range(num_frames):
-            image_file, label_file = self.__getitem__(n, with_label=True)
-            label_img = PIL.Image.open(label_file)
-            label_img = np.array(label_img, dtype=np.float32) / self.depth_label_scale
-            prediction = predictions[n]
-            if scale_and_shift_needed:
-                mask = label_img != 0
-                disp_label = np.zeros_like(label_img)
-                disp_label[mask] = 1.0 / label_img[mask]
-                if not disparity:
-                    disp_prediction = np.zeros_like(prediction)
-                    disp_prediction[prediction != 0] = 1.0 / prediction[prediction != 0]
-                else:
-                    disp_prediction = prediction
-                scale, shift = self.compute_scale_and_shift(disp_prediction, disp_label, mask)
-
-                prediction = scale * disp_prediction + shift
-                prediction[prediction < 1 / depth_cap_max] = 1 / depth_cap_max
-                prediction[prediction > 1 / depth_cap_min] = 1 / depth_cap_min
-
-            mask = np.minimum(label_img, prediction) != 0
-
-            if disparity:
-                disp_pred = prediction
-                prediction = np.zeros_like(disp_pred)
-                prediction[mask] = 1.0 / disp_pred[mask]
-
-            delta = np.zeros_like(label_img, dtype=np.float32)
-            delta = np.maximum(
-                prediction[mask] / label_img[mask], 
-                label_img[mask] / prediction[mask]
-            )
-            good_pixels_in_img = delta < threshold
-            delta_1 += good_pixels_in_img.sum() / mask.sum()
+        image_file, label_file = self.__getitem__(frame_idx, with_label=True)
+        label_img = PIL.Image.open(label_file)
+        label_img = np.array(label_img, dtype=np.float32) / self.depth_label_scale
+        if scale_and_shift_needed:
+            mask = label_img != 0
+            disp_label = np.zeros_like(label_img)
+            disp_label[mask] = 1.0 / label_img[mask]
+            if not disparity:
+                disp_prediction = np.zeros_like(prediction)
+                disp_prediction[prediction != 0] = 1.0 / prediction[prediction != 0]
+            else:
+                disp_prediction = prediction
+            scale, shift = self.compute_scale_and_shift(disp_prediction, disp_label, mask)
+
+            prediction = scale * disp_prediction + shift
+            prediction[prediction < 1 / depth_cap_max] = 1 / depth_cap_max
+            prediction[prediction > 1 / depth_cap_min] = 1 / depth_cap_min
+
+        mask = np.minimum(label_img, prediction) != 0
+
+        if disparity:
+            disp_pred = prediction
+            prediction = np.zeros_like(disp_pred)
+            prediction[mask] = 1.0 / disp_pred[mask]
+
+        delta = np.maximum(
+            prediction[mask] / label_img[mask],
+            label_img[mask] / prediction[mask]
+        )
+        good_pixels_in_img = delta < threshold
+        # accumulate the fraction of good pixels and the number of frames
+        if self.metric_state is None:
+            self.metric_state = {'delta_1': 0.0, 'num_frames': 0}
         #
+        self.metric_state['delta_1'] += good_pixels_in_img.sum() / mask.sum()
+        self.metric_state['num_frames'] += 1
 
-        delta_1 /= (n + 1)
+    def finalize(self, **kwargs):
+        metric_state = self.metric_state or {'delta_1': 0.0, 'num_frames': 0}
+        self.metric_state = None
+        delta_1 = metric_state['delta_1'] / max(metric_state['num_frames'], 1)
         metric = {'accuracy_delta_1%': delta_1 * 100}
-        return metric
\ No newline at end of file
+        return metric
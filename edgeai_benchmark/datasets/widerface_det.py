@@ -84,13 +84,9 @@ class WiderFaceDetection(coco_det.COCODetection):
             self.image_dir = image_dir
             self.annotation_file = annotation_file
         #
-        with open(self.annotation_file) as afp:
-            dataset_store = json.load(afp)
-        #
-        categories = dataset_store['categories']
         num_classes = num_classes or len(num_classes)
+        # COCODetection.__init__() loads the images from the annotation index
         super().__init__(num_classes=num_classes, num_frames=num_frames, name=name, **kwargs)
-        self._load_dataset()
         # create the dataset info
         categories = [{'id':1, 'name':'face'}]
         info = dict(description='WIDERFACE: A Face Detection Dataset', url='http://shuoyang1213.me/WIDERFACE/', version='1.5',
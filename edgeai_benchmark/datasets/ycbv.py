@@ -37,7 +37,6 @@ import numpy as np
 from collections import OrderedDict, defaultdict
 from colorama import Fore
 import cv2
-from pycocotools.coco import COCO
 from pycocotools.cocoeval import COCOeval
 from plyfile import PlyData
 from sklearn.neighbors import KDTree
@@ -45,6 +44,7 @@ from sklearn.neighbors import KDTree
 from ..utils import *
 # from ..utils import *
 from ..datasets.dataset_base import *
+from .coco_index import COCOIndexDatasetBase
 # from .dataset_base import *
 
 __all__ = ['YCBV', '_get_mapping_id_name']
@@ -70,7 +70,7 @@ def _get_mapping_id_name(imgs):
     return id2name, name2id
 
 
-class YCBV(DatasetBase):
+class YCBV(COCOIndexDatasetBase):
     def __init__(self, download=False, num_frames=None, name="ycbv", **kwargs):
         super().__init__(num_frames=num_frames, name=name, **kwargs)
         self.force_download = True if download == 'always' else False
@@ -97,27 +97,27 @@ class YCBV(DatasetBase):
         assert self.kwargs['split'] in image_split_dirs, f'invalid path to coco dataset images/split {kwargs["split"]}'
         self.image_dir = os.path.join(self.kwargs['path'], self.kwargs['split'])
         self.annotation_file = os.path.join(annotations_dir, 'instances_{}.json'.format(split))
-        self.coco_dataset = COCO(self.annotation_file)
-        max_frames = len(self.coco_dataset.imgs)
+        self._load_annotation_index()
+        self.imgs = self.annotation_index.get_imgs()
+        max_frames = len(self.imgs)
         num_frames = self.kwargs.get('num_frames', None)
         num_frames = min(num_frames, max_frames) if num_frames is not None else max_frames
 
-        imgs_list = list(self.coco_dataset.imgs.items())
+        imgs_list = list(self.imgs.items())
         if shuffle:
-            random.seed(int(shuffle))
-            random.shuffle(imgs_list)
+            random.Random(int(shuffle)).shuffle(imgs_list)
 
-        self.coco_dataset.imgs = {k:v for k,v in imgs_list[:num_frames]}
+        self.imgs = {k:v for k,v in imgs_list[:num_frames]}
 
         self.cats = [
-            cat['name'] for cat in self.coco_dataset.loadCats(self.coco_dataset.getCatIds())
+            cat['name'] for cat in self.annotation_index.get_cats()
         ]
 
         self.classes = ['__background__'] + self.cats
         self.num_classes = len(self.classes)
         self._class_to_ind = dict(zip(self.classes, range(self.num_classes)))
-        self._class_to_coco_ind = dict(zip(self.cats, self.coco_dataset.getCatIds()))
-        self.img_ids = self.coco_dataset.getImgIds()
+        self._class_to_coco_ind = dict(zip(self.cats, self.annotation_index.get_cat_ids()))
+        self.img_ids = list(self.imgs.keys())
 
         self.num_frames = self.kwargs['num_frames'] = num_frames
         self.tempfiles = []
@@ -127,11 +127,8 @@ class YCBV(DatasetBase):
         self.models_corners, self.class_to_diameter = self.cad_models.models_corners, self.cad_models.models_diameter
         self.class_to_model = self.cad_models.class_to_model
         self.ann_info = {}
-        self.id2name, self.name2id = _get_mapping_id_name(self.coco_dataset.imgs)
+        self.id2name, self.name2id = _get_mapping_id_name(self.imgs)
         # create dataset_info
-        with open(self.annotation_file) as afp:
-            self.dataset_store = json.load(afp)
-        #
         self.kwargs['dataset_info'] = self.get_dataset_info()
 
     def get_dataset_info(self):
@@ -259,7 +256,7 @@ class YCBV(DatasetBase):
 
     def __getitem__(self, idx):
         img_id = self.img_ids[idx]
-        img = self.coco_dataset.loadImgs([img_id])[0]
+        img = self.imgs[img_id]
         image_path = os.path.join(self.image_dir,  img['image_folder'], 'rgb', img['file_name'])
         return image_path
 
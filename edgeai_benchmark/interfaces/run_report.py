@@ -140,6 +140,12 @@ def run_report(settings, rewrite_results=True, skip_pattern=None):
     if report_perfsim:
         performance_keys += ['perfsim_time_ms', 'perfsim_ddr_transfer_mb', 'perfsim_gmacs']
     #
+    if settings.report_latency_percentiles:
+        performance_keys += [f'infer_time_{t}_p{p}_ms' for t in ('core', 'invoke') for p in settings.report_latency_percentiles]
+    #
+    if settings.throughput_threads:
+        performance_keys += ['throughput_fps', 'throughput_scaling', 'throughput_latency_p99_ms']
+    #
 
     results_table = dict()
     metric_title = [m+'_metric' for m in results_collection.keys()]
@@ -30,9 +30,14 @@ import os
 import sys
 import copy
 import yaml
+import shutil
+import pickle
 import time
 import itertools
-from .. import utils, constants
+import collections
+import concurrent.futures
+import numpy as np
+from .. import utils, constants, datasets
 
 
 class AccuracyPipeline():
@@ -46,6 +51,20 @@ class AccuracyPipeline():
         # if it has not been created, it will be created in start
         self.session = self.pipeline_config['session']
         self.run_dir = self.session.get_param('run_dir')
+        # the canonical read/resize/crop/to-tensor preprocess chain is run as one fused transform, unless disabled
+        if hasattr(self.pipeline_config['preprocess'], 'enable_fused'):
+            self.pipeline_config['preprocess'].enable_fused = self.settings.preprocess_fused
+        #
+        # reduced scale jpeg decode - opt-in with the setting or for a pipeline with the pipeline_config entry
+        self.decode_reduce = self.pipeline_config.get('decode_reduce', self.settings.preprocess_decode_reduce)
+        if hasattr(self.pipeline_config['preprocess'], 'set_decode_reduce'):
+            self.pipeline_config['preprocess'].set_decode_reduce(self.decode_reduce)
+        #
+        # library that decodes the images - set for a pipeline with the pipeline_config entry image_decoder
+        self.image_decoder = self.pipeline_config.get('image_decoder', self.settings.image_decoder)
+        if hasattr(self.pipeline_config['preprocess'], 'set_image_decoder'):
+            self.pipeline_config['preprocess'].set_image_decoder(self.image_decoder, self.settings.image_decoder_cache_path)
+        #
         self.run_dir_base = os.path.split(self.run_dir)[-1]
         self.config_yaml = os.path.join(self.run_dir, 'config.yaml')
         # these files will be written after import and inference respectively
@@ -100,6 +119,9 @@ class AccuracyPipeline():
         #
 
         ##################################################################
+        # optional tracing of the stages of the pipeline - written to the run_dir at the end
+        tracer = utils.start_trace() if self.settings.enable_trace else None
+
         # start() must be called to create the required directories
         self.session.start()
 
@@ -120,7 +142,15 @@ class AccuracyPipeline():
         #
 
         # now actually run the import and inference
-        param_result = self._run(description=description)
+        try:
+            param_result = self._run(description=description)
+        finally:
+            if tracer is not None:
+                utils.stop_trace()
+                tracer.write_chrome_trace(os.path.join(self.run_dir, 'trace.json'))
+                tracer.write_summary_csv(os.path.join(self.run_dir, 'trace.csv'))
+            #
+        #
 
         result_dict = param_result.get('result', {})
         self.write_log(utils.log_color('\n\nSUCCESS', 'benchmark results', f'{result_dict}\n'))
@@ -170,6 +200,12 @@ class AccuracyPipeline():
                     yaml.safe_dump(param_dict, fp, sort_keys=False)
                 #
             #
+        elif self.settings.run_import:
+            # the model has already been imported (run_missing) - return its params, as an empty result
+            # is a failure for the import stage and the inference that depends on it would not be run
+            with open(self.param_yaml) as fp:
+                param_result = yaml.safe_load(fp) or utils.pretty_object(self.pipeline_config)
+            #
         #
 
         ##################################################################
@@ -193,6 +229,8 @@ class AccuracyPipeline():
                     yaml.safe_dump(param_result, fp, sort_keys=False)
                 #
             #
+            # the run is complete - the checkpoint is not needed anymore
+            self._clear_checkpoint()
         #
         return param_result
 
@@ -208,16 +246,15 @@ class AccuracyPipeline():
             utils.log_color('\nERROR', 'import', f'too few calibration data - calibration dataset size ({len(calibration_dataset)}) '
                                                  f'should be >= calibration_frames ({calibration_frames})')
 
-        calib_data = []
-        for data_index in range(calibration_frames):
-            info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
-            data = calibration_dataset[data_index]
-            data, info_dict = preprocess(data, info_dict)
-            calib_data.append(data)
+        # the artifacts are being re-generated - the outputs of an earlier incomplete inference are no longer valid
+        self._clear_checkpoint()
+        with utils.trace_span('calibration_data', 'import'):
+            calib_data = self._read_calibration_frames(calibration_dataset, preprocess, calibration_frames)
         #
-
         # this is the actual import
-        self._run_with_log(session.import_model, calib_data)
+        with utils.trace_span('compile', 'import'):
+            self._run_with_log(session.import_model, calib_data)
+        #
         # close the interpreter
         session.close_interpreter()
 
@@ -239,62 +276,508 @@ class AccuracyPipeline():
         subgraph_time = 0.0
         ddr_transfer = 0.0
         num_frames_ddr = 0
-
-        output_list = []
+        # the per frame benchmark data is collected only every infer_stats_interval frames
+        infer_stats_interval = max(self.settings.infer_stats_interval or 1, 1)
+        num_frames_stats = 0
+        # per frame timings in ms - column 0: invoke time, column 1: core time (nan for the frames without stats)
+        frame_times = np.full((num_frames, 2), np.nan, dtype=np.float32)
+
+        # if the metrics support incremental evaluation, each output is given to the metric as soon as it is available
+        # the metric update runs in a background thread, overlapping with the inference of the next frames
+        # otherwise the outputs are collected in output_list and evaluated at the end
+        metric_list = self._get_metric_list()
+        metric_incremental = all(hasattr(m, 'update') and hasattr(m, 'finalize') for m, m_options in metric_list)
+        metric_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if metric_incremental else None
+        metric_futures = collections.deque()
+        # the number of pending metric updates is bounded, so that the outputs do not pile up in memory
+        metric_max_pending = max(self.settings.prefetch_frames or 0, 1)
+
+        output_list = [] if not metric_incremental else None
         pbar_desc = f'infer {description}: {run_dir_base}'
-        for data_index in utils.progress_step(range(num_frames), desc=pbar_desc, file=self.logger, position=0):
-            info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
-            data = input_dataset[data_index]
-            data, info_dict = preprocess(data, info_dict)
-            output, info_dict = self._run_with_log(session.infer_frame, data, info_dict)
-            invoke_time += info_dict['session_invoke_time']
-
-            stats_dict = session.infer_stats()
-            core_time += stats_dict['core_time']
-            subgraph_time += stats_dict['subgraph_time']
-            if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                num_frames_ddr += 1
-           
-            if self.settings.flip_test:
-                outputs_flip, info_dict = self._run_with_log(session.infer_frame, info_dict['flip_img'], info_dict)
+        # in batch mode (cpu execution only), several frames are stacked and run in one call to the interpreter
+        infer_batch_size = self.settings.infer_batch_size or 1
+        infer_batch_size = infer_batch_size if (infer_batch_size > 1 and (not self.settings.flip_test) and
+                                                session.supports_batch_inference()) else 1
+        # with flip_test, the image and its flipped copy are run as a batch of 2 in one call to the interpreter, if possible
+        flip_batch = bool(self.settings.flip_test and self.settings.flip_test_batch and
+                          session.supports_batch_inference(batch_size=2))
+        batch_frames = []
+        batch_invoke_time = 0.0
+        num_batches = 0
+        # the preprocessed inputs are kept (up to throughput_frames) and reused for the throughput mode
+        throughput_threads = self.settings.throughput_threads or 0
+        throughput_inputs = []
+
+        # the accumulated metric state (metric_state of each metric) and stats are written to the run_dir every
+        # infer_checkpoint_interval frames - if an earlier run of this pipeline did not complete, inference resumes from
+        # its last checkpoint. only the metrics that are accumulated incrementally can be checkpointed - not the raw outputs
+        checkpoint_interval = (self.settings.infer_checkpoint_interval or 0) \
+            if (metric_incremental and all(self._is_metric_checkpointable(m) for m, m_options in metric_list)) else 0
+        num_frames_checkpoint = 0
+        start_frame = 0
+        checkpoint = self._load_checkpoint(num_frames, len(metric_list)) if checkpoint_interval > 0 else None
+        if checkpoint is not None:
+            start_frame = checkpoint['next_frame']
+            frame_times = checkpoint['frame_times']
+            (invoke_time, core_time, subgraph_time, ddr_transfer, num_frames_ddr, num_frames_stats,
+                batch_invoke_time, num_batches) = checkpoint['infer_stats']
+            for (m, m_options), metric_state in zip(metric_list, checkpoint['metric_states']):
+                m.metric_state = metric_state
+            #
+            self.write_log(utils.log_color('\nINFO', 'infer checkpoint', f'resuming from frame {start_frame}'))
+        #
+        # the input normalization of the session is folded into the fused preprocess during inference, if it can take it
+        input_normalizer = self._move_input_normalizer(preprocess, session)
+        # frames are read and preprocessed ahead of time (if prefetch is enabled), but they arrive here in order
+        # preprocessed inputs are shared with the other pipelines that have the same dataset and preprocess
+        input_cache = self._get_input_cache(input_dataset, preprocess, num_frames)
+        # if the images of this dataset have been decoded (at the input resolution of this preprocess) in advance, use those
+        decoded_store = self._get_decoded_store(input_dataset, preprocess)
+        # the per frame outputs of the preprocess and of the input normalization in the session are written into
+        # preallocated buffers. the slots cover the frames that are in use at the same time: the read-ahead queue,
+        # the frames of a batch and the current frame
+        buffer_arena = utils.BufferArena(num_slots=(self.settings.prefetch_frames or 0) + infer_batch_size + 1) \
+            if self.settings.preprocess_buffer_arena else None
+        self._set_buffer_arena(preprocess, session, buffer_arena)
+        frames_iter = self._prefetch_frames(input_dataset, preprocess, range(start_frame, num_frames), input_cache, decoded_store)
+        for data_index in utils.progress_step(range(start_frame, num_frames), desc=pbar_desc, file=self.logger, position=0):
+            data, info_dict = next(frames_iter)
+            if throughput_threads > 1 and len(throughput_inputs) < self.settings.throughput_frames:
+                # these are kept - so they must not be in the buffers of the arena that are reused
+                throughput_inputs.append(copy.deepcopy(data) if buffer_arena is not None else data)
+            #
+            if infer_batch_size > 1:
+                batch_frames.append((data_index, data, info_dict))
+                if len(batch_frames) < infer_batch_size and data_index < (num_frames-1):
+                    continue
+                #
+                batch_indices, batch_data, batch_info_dicts = zip(*batch_frames)
+                with utils.trace_span('invoke_batch', 'infer'):
+                    outputs, info_dicts = self._run_with_log(session.infer_batch, list(batch_data), list(batch_info_dicts))
+                #
+                frames_invoke_time = sum([info_dict['session_invoke_time'] for info_dict in info_dicts])
+                invoke_time += frames_invoke_time
+                batch_invoke_time += info_dicts[0].get('session_batch_invoke_time', frames_invoke_time)
+                num_batches += 1
+                for frame_index, info_dict in zip(batch_indices, info_dicts):
+                    info_dict['outputs_flip'] = None
+                    frame_times[frame_index, 0] = info_dict['session_invoke_time'] * constants.MILLI_CONST
+                #
+                if any(frame_index % infer_stats_interval == 0 for frame_index in batch_indices):
+                    # the stats are of the last call to the interpreter - which covers all the frames if they were run
+                    # stacked, otherwise only the last frame. they are divided among the frames that they cover
+                    stats_dict = session.infer_frame_stats()
+                    stats_indices = batch_indices if 'session_batch_invoke_time' in info_dicts[0] else batch_indices[-1:]
+                    num_stats_frames = len(stats_indices)
+                    core_time += stats_dict['core_time']
+                    frame_times[list(stats_indices), 1] = stats_dict['core_time'] * constants.MILLI_CONST / num_stats_frames
+                    subgraph_time += stats_dict['subgraph_time']
+                    if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
+                        ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
+                        num_frames_ddr += num_stats_frames
+                    #
+                    num_frames_stats += num_stats_frames
+                #
+                frame_outputs = list(zip(batch_indices, outputs, info_dicts))
+                batch_frames = []
+            elif flip_batch:
+                # the flipped copy is a view of the image - it is materialized only once, in the stacked batch
+                with utils.trace_span('invoke_flip_batch', 'infer'):
+                    (output, outputs_flip), (info_dict, flip_info_dict) = self._run_with_log(session.infer_batch,
+                        [data, info_dict['flip_img']], [info_dict, {}])
+                #
                 info_dict['outputs_flip'] = outputs_flip
+                # the frame invoke time covers both the image and its flipped copy - as with two separate calls
+                info_dict['session_invoke_time'] = info_dict.get('session_batch_invoke_time',
+                    info_dict['session_invoke_time'] + flip_info_dict['session_invoke_time'])
                 invoke_time += info_dict['session_invoke_time']
-
-                stats_dict = session.infer_stats()
-                core_time += stats_dict['core_time']
-                subgraph_time += stats_dict['subgraph_time']
-                if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
-                    ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
-                    num_frames_ddr += 1
+                frame_times[data_index, 0] = info_dict['session_invoke_time'] * constants.MILLI_CONST
+                # there is only one call to the interpreter - so the stats are collected once for the frame
+                if data_index % infer_stats_interval == 0:
+                    stats_dict = session.infer_frame_stats()
+                    core_time += stats_dict['core_time']
+                    frame_times[data_index, 1] = stats_dict['core_time'] * constants.MILLI_CONST
+                    subgraph_time += stats_dict['subgraph_time']
+                    if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
+                        ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
+                        num_frames_ddr += 1
+                    #
+                    num_frames_stats += 1
+                #
+                frame_outputs = [(data_index, output, info_dict)]
             else:
-                info_dict['outputs_flip'] = None
-
-            output, info_dict = postprocess(output, info_dict)
-            output_list.append(output)
+                with utils.trace_span('invoke', 'infer'):
+                    output, info_dict = self._run_with_log(session.infer_frame, data, info_dict)
+                #
+                invoke_time += info_dict['session_invoke_time']
+                frame_times[data_index, 0] = info_dict['session_invoke_time'] * constants.MILLI_CONST
+
+                collect_stats = (data_index % infer_stats_interval == 0)
+                if collect_stats:
+                    stats_dict = session.infer_frame_stats()
+                    core_time += stats_dict['core_time']
+                    frame_times[data_index, 1] = stats_dict['core_time'] * constants.MILLI_CONST
+                    subgraph_time += stats_dict['subgraph_time']
+                    if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
+                        ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
+                        num_frames_ddr += 1
+                    #
+                    num_frames_stats += 1
+                #
+                if self.settings.flip_test:
+                    with utils.trace_span('invoke_flip', 'infer'):
+                        outputs_flip, info_dict = self._run_with_log(session.infer_frame, info_dict['flip_img'], info_dict)
+                    #
+                    info_dict['outputs_flip'] = outputs_flip
+                    invoke_time += info_dict['session_invoke_time']
+                    frame_times[data_index, 0] += info_dict['session_invoke_time'] * constants.MILLI_CONST
+
+                    if collect_stats:
+                        stats_dict = session.infer_frame_stats()
+                        core_time += stats_dict['core_time']
+                        frame_times[data_index, 1] += stats_dict['core_time'] * constants.MILLI_CONST
+                        subgraph_time += stats_dict['subgraph_time']
+                        if stats_dict['write_total'] >= 0  and stats_dict['read_total'] >= 0 :
+                            ddr_transfer += (stats_dict['write_total'] + stats_dict['read_total'])
+                            num_frames_ddr += 1
+                        #
+                    #
+                else:
+                    info_dict['outputs_flip'] = None
+                #
+                frame_outputs = [(data_index, output, info_dict)]
+            #
+            for frame_index, output, info_dict in frame_outputs:
+                with utils.trace_span('postprocess', 'infer'):
+                    output, info_dict = postprocess(output, info_dict)
+                #
+                if metric_incremental:
+                    metric_futures.append(metric_executor.submit(self._update_metrics, metric_list, frame_index, output))
+                    while len(metric_futures) > metric_max_pending:
+                        metric_futures.popleft().result()
+                    #
+                else:
+                    output_list.append(output)
+                #
+                num_frames_checkpoint += 1
+            #
+            if checkpoint_interval > 0 and num_frames_checkpoint >= checkpoint_interval and data_index < (num_frames-1):
+                # the metric state must include all the frames up to data_index
+                while len(metric_futures) > 0:
+                    metric_futures.popleft().result()
+                #
+                infer_stats = (invoke_time, core_time, subgraph_time, ddr_transfer, num_frames_ddr, num_frames_stats,
+                               batch_invoke_time, num_batches)
+                self._save_checkpoint(num_frames, data_index+1, metric_list, infer_stats, frame_times)
+                num_frames_checkpoint = 0
+            #
+        #
+        frames_iter.close()
+        if input_cache is not None:
+            input_cache.close()
+            self.write_log(utils.log_color('\nINFO', 'input cache', f'{input_cache.get_stats()}'))
+        #
+        if metric_incremental:
+            while len(metric_futures) > 0:
+                metric_futures.popleft().result()
+            #
+            metric_executor.shutdown()
         #
         # compute and populate final stats so that it can be used in result
+        # the static stats (num_subgraphs, perfsim) are parsed only once per session
+        static_stats_dict = session.infer_static_stats()
+        num_frames_stats = max(num_frames_stats, 1)
         self.infer_stats_dict = {
-            'num_subgraphs': stats_dict['num_subgraphs'],
+            'num_subgraphs': static_stats_dict['num_subgraphs'],
             #'infer_time_invoke_ms': invoke_time * constants.MILLI_CONST / num_frames,
-            'infer_time_core_ms': core_time * constants.MILLI_CONST / num_frames,
-            'infer_time_subgraph_ms': subgraph_time * constants.MILLI_CONST / num_frames,
+            'infer_time_core_ms': core_time * constants.MILLI_CONST / num_frames_stats,
+            'infer_time_subgraph_ms': subgraph_time * constants.MILLI_CONST / num_frames_stats,
             'ddr_transfer_mb': (ddr_transfer / num_frames_ddr / constants.MEGA_CONST) if num_frames_ddr > 0 else 0
         }
-        if 'perfsim_time' in stats_dict:
-            self.infer_stats_dict.update({'perfsim_time_ms': stats_dict['perfsim_time'] * constants.MILLI_CONST})
+        if decoded_store is not None:
+            self.infer_stats_dict.update({'decoded_store': True})
         #
-        if 'perfsim_ddr_transfer' in stats_dict:
-            self.infer_stats_dict.update({'perfsim_ddr_transfer_mb': stats_dict['perfsim_ddr_transfer'] / constants.MEGA_CONST})
+        if self.decode_reduce:
+            # the accuracy delta can be seen by comparing with a run without it (eg. in the report of both work_dirs)
+            self.infer_stats_dict.update({'decode_reduce': True})
         #
-        if 'perfsim_macs' in stats_dict:
-            self.infer_stats_dict.update({'perfsim_gmacs': stats_dict['perfsim_macs'] / constants.GIGA_CONST})
+        if self.image_decoder is not None:
+            self.infer_stats_dict.update({'image_decoder': self.image_decoder})
+        #
+        if infer_batch_size > 1:
+            # in batch mode, the latency of each frame is the time taken for the whole batch
+            self.infer_stats_dict.update({'infer_batch_size': infer_batch_size,
+                'infer_time_batch_ms': batch_invoke_time * constants.MILLI_CONST / max(num_batches, 1),
+                'infer_fps': (num_frames / invoke_time) if invoke_time > 0 else 0.0})
+        #
+        # the distribution of the per frame timings - the first few frames (eg. allocation, lazy init) are excluded
+        infer_warmup_frames = max(min(self.settings.infer_warmup_frames or 0, num_frames-1), 0)
+        if self.settings.enable_logging:
+            np.save(os.path.join(self.run_dir, 'infer_frame_times.npy'), frame_times)
+        #
+        self.infer_stats_dict.update(self._get_latency_stats(frame_times[infer_warmup_frames:,0], 'infer_time_invoke'))
+        self.infer_stats_dict.update(self._get_latency_stats(frame_times[infer_warmup_frames:,1], 'infer_time_core'))
+        if throughput_threads > 1 and len(throughput_inputs) > 0:
+            throughput_stats_dict = self._run_with_log(session.infer_throughput, throughput_inputs, throughput_threads)
+            if throughput_stats_dict is not None:
+                self.infer_stats_dict.update(throughput_stats_dict)
+            else:
+                self.write_log(utils.log_color('\nWARNING', 'throughput mode', f'not supported by {session.get_session_name()}'))
+            #
+        #
+        self._set_buffer_arena(preprocess, session, None)
+        self._restore_input_normalizer(preprocess, session, input_normalizer)
+        if 'perfsim_time' in static_stats_dict:
+            self.infer_stats_dict.update({'perfsim_time_ms': static_stats_dict['perfsim_time'] * constants.MILLI_CONST})
+        #
+        if 'perfsim_ddr_transfer' in static_stats_dict:
+            self.infer_stats_dict.update({'perfsim_ddr_transfer_mb': static_stats_dict['perfsim_ddr_transfer'] / constants.MEGA_CONST})
+        #
+        if 'perfsim_macs' in static_stats_dict:
+            self.infer_stats_dict.update({'perfsim_gmacs': static_stats_dict['perfsim_macs'] / constants.GIGA_CONST})
         #
         # close the interpreter
         session.close_interpreter()
         return output_list
 
-    def _evaluate(self, output_list):
+    def _read_calibration_frames(self, dataset, preprocess, calibration_frames):
+        '''
+        reads and preprocesses the calibration frames.
+        many models share the same calibration dataset and preprocess - so the preprocessed tensors are
+        stored in a persistent cache (settings.calibration_cache_path) that is shared across models and work_dirs.
+        '''
+        frame_indices = list(range(calibration_frames))
+        tensor_cache = cache_key = None
+        preprocess_signature = self._get_preprocess_signature(dataset, preprocess)
+        if self.settings.calibration_cache_path and preprocess_signature is not None:
+            cache_size = self.settings.calibration_cache_size_gb
+            cache_size = int(cache_size * constants.GIGA_CONST) if cache_size else None
+            tensor_cache = utils.TensorCache(self.settings.calibration_cache_path, max_size=cache_size)
+            cache_key = utils.get_cache_key(preprocess_signature, frame_indices)
+            calib_data = tensor_cache.load(cache_key)
+            if calib_data is not None and len(calib_data) == calibration_frames:
+                self.write_log(utils.log_color('\nINFO', 'calibration data', f'loaded from cache: {tensor_cache.get_entry_path(cache_key)}'))
+                return calib_data
+            #
+        #
+        calib_data = []
+        decoded_store = self._get_decoded_store(dataset, preprocess)
+        for data, info_dict in self._prefetch_frames(dataset, preprocess, frame_indices, decoded_store=decoded_store):
+            calib_data.append(data)
+        #
+        if tensor_cache is not None:
+            tensor_cache.save(cache_key, calib_data)
+        #
+        return calib_data
+
+    def _is_metric_checkpointable(self, metric):
+        # only a metric that accumulates its metric_state in its own update() is checkpointed - never the raw outputs
+        # (DatasetBase has no update(), the datasets without it are evaluated on the list of outputs)
+        return hasattr(metric, 'metric_state') and \
+            getattr(type(metric), 'update', None) is not getattr(datasets.DatasetBase, 'update', None)
+
+    def _get_checkpoint_folder(self):
+        return os.path.join(self.run_dir, 'infer_checkpoint')
+
+    def _save_checkpoint(self, num_frames, next_frame, metric_list, infer_stats, frame_times):
+        '''
+        writes the progress marker (next_frame) with the accumulated metric states and stats.
+        it is renamed into place, so a crash leaves the previous checkpoint valid.
+        '''
+        checkpoint_folder = self._get_checkpoint_folder()
+        os.makedirs(checkpoint_folder, exist_ok=True)
+        metric_states = [m.metric_state for m, m_options in metric_list]
+        checkpoint = {'num_frames': num_frames, 'flip_test': self.settings.flip_test, 'next_frame': next_frame,
+                      'metric_states': metric_states, 'infer_stats': infer_stats, 'frame_times': frame_times}
+        checkpoint_file = os.path.join(checkpoint_folder, 'checkpoint.pkl')
+        with open(checkpoint_file + '.tmp', 'wb') as fp:
+            pickle.dump(checkpoint, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        #
+        os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+    def _load_checkpoint(self, num_frames, num_metrics):
+        '''
+        returns the checkpoint of an earlier incomplete inference - or None if there is no valid checkpoint
+        '''
+        checkpoint_folder = self._get_checkpoint_folder()
+        checkpoint_file = os.path.join(checkpoint_folder, 'checkpoint.pkl')
+        if not os.path.exists(checkpoint_file):
+            return None
+        #
+        try:
+            with open(checkpoint_file, 'rb') as fp:
+                checkpoint = pickle.load(fp)
+            #
+        except Exception as e:
+            self.write_log(utils.log_color('\nWARNING', 'infer checkpoint', f'could not be loaded - starting from frame 0: {e}'))
+            self._clear_checkpoint()
+            return None
+        #
+        if checkpoint.get('metric_states', None) is None or len(checkpoint['metric_states']) != num_metrics or \
+                checkpoint['num_frames'] != num_frames or checkpoint['flip_test'] != self.settings.flip_test:
+            self._clear_checkpoint()
+            return None
+        #
+        return checkpoint
+
+    def _clear_checkpoint(self):
+        shutil.rmtree(self._get_checkpoint_folder(), ignore_errors=True)
+
+    def _get_preprocess_signature(self, dataset, preprocess):
+        '''
+        canonical signature of the dataset and preprocess chain - pipelines with the same signature get the same input tensors.
+        returns None if the preprocess is not a list of transforms, since then it cannot be identified.
+        '''
+        if not hasattr(preprocess, 'transforms'):
+            return None
+        #
+        # dataset_info is a file inside the run_dir and annotation_index_path is only where the annotation index is cached
+        # - these are not part of the identity of the dataset
+        dataset_params = {k: v for k, v in dataset.peek_params().items() if k not in ('dataset_info', 'annotation_index_path')} \
+            if hasattr(dataset, 'peek_params') else None
+        transforms_params = [(t.__class__.__name__, t) for t in preprocess.transforms]
+        # the input normalization of the session, if it has been moved into the preprocess - see _move_input_normalizer()
+        input_normalizer = getattr(preprocess, 'input_normalizer', None)
+        # the fused preprocess is within 1 of the unfused one (see ImageReadResizeCropToTensor) - it is not part of the signature
+        return utils.get_cache_key(dataset.__class__.__name__, dataset_params,
+                                   preprocess.__class__.__name__, preprocess, transforms_params, input_normalizer)
+
+    def _get_input_cache(self, dataset, preprocess, num_frames):
+        '''
+        returns the cache of the preprocessed inference inputs of the signature of this pipeline.
+        the first pipeline with a given signature fills the cache and the later ones read memory mapped tensors from it.
+        the original images are not in the cache - so it is not used if the outputs are to be saved.
+        '''
+        if not self.settings.input_cache_path or self.settings.save_output:
+            return None
+        #
+        preprocess_signature = self._get_preprocess_signature(dataset, preprocess)
+        if preprocess_signature is None:
+            return None
+        #
+        cache_size = self.settings.input_cache_size_gb
+        cache_size = int(cache_size * constants.GIGA_CONST) if cache_size else None
+        return utils.FrameTensorCache(self.settings.input_cache_path, preprocess_signature, num_frames, max_size=cache_size)
+
+    def _move_input_normalizer(self, preprocess, session):
+        '''
+        moves the input normalization of the session into the preprocess, if the preprocess can take it - the fused
+        transform then writes the normalized float tensor in one pass. returns the normalizer that has been moved, or None.
+        '''
+        input_normalizer = getattr(session, 'input_normalizer', None)
+        if input_normalizer is None or not hasattr(preprocess, 'set_input_normalizer') or \
+                not preprocess.set_input_normalizer(input_normalizer):
+            return None
+        #
+        session.input_normalizer = None
+        return input_normalizer
+
+    def _restore_input_normalizer(self, preprocess, session, input_normalizer):
+        if input_normalizer is not None:
+            preprocess.set_input_normalizer(None)
+            session.input_normalizer = input_normalizer
+        #
+
+    def _set_buffer_arena(self, preprocess, session, buffer_arena):
+        if hasattr(preprocess, 'set_buffer_arena'):
+            preprocess.set_buffer_arena(buffer_arena)
+        #
+        if hasattr(session, 'set_buffer_arena'):
+            session.set_buffer_arena(buffer_arena)
+        #
+
+    def _get_decoded_store(self, dataset, preprocess):
+        '''
+        returns the decoded images of this dataset and preprocess (written by scripts/pack_decoded_store.py) if available.
+        the original images are not in the store - so it is not used if the outputs are to be saved.
+        '''
+        if not self.settings.decoded_store_path or self.settings.save_output:
+            return None
+        #
+        decoded_store = datasets.DecodedImageStore.load(self.settings.decoded_store_path, dataset, preprocess)
+        if decoded_store is not None:
+            self.write_log(utils.log_color('\nINFO', 'decoded store', f'{len(decoded_store)} frames from {decoded_store.store_folder}'))
+        #
+        return decoded_store
+
+    def _read_frame(self, dataset, preprocess, data_index, input_cache=None, decoded_store=None):
+        info_dict = {'dataset_info': self.dataset_info, 'label_offset_pred': self.pipeline_config.get('metric',{}).get('label_offset_pred',None)}
+        if input_cache is not None:
+            cache_entry = input_cache.load(data_index)
+            if cache_entry is not None:
+                tensors, cache_info = cache_entry
+                num_inputs = cache_info['num_inputs']
+                data = tensors[:num_inputs] if cache_info['is_list'] else tensors[0]
+                info_dict.update(cache_info['info_dict'])
+                # arrays in info_dict (eg. the flipped input) may be modified later on - so those are copied
+                for k, t in zip(cache_info['array_keys'], tensors[num_inputs:]):
+                    info_dict[k] = np.array(t)
+                #
+                return data, info_dict
+            #
+        #
+        if decoded_store is not None and data_index < len(decoded_store):
+            # read, resize and crop are replaced by the image from the store - only the rest of the preprocess is run
+            with utils.trace_span('decoded_read', 'read'):
+                data, decoded_info_dict = decoded_store[data_index]
+                info_dict.update(decoded_info_dict)
+            #
+            with utils.trace_span('preprocess', 'read'):
+                data, info_dict = preprocess.run_decoded(data, info_dict)
+            #
+        else:
+            with utils.trace_span('dataset_read', 'read'):
+                data = dataset[data_index]
+            #
+            with utils.trace_span('preprocess', 'read'):
+                data, info_dict = preprocess(data, info_dict)
+            #
+        #
+        if input_cache is not None:
+            is_list = isinstance(data, (list,tuple))
+            tensors = list(data) if is_list else [data]
+            # the entries that are specific to this pipeline are not cached - only the ones added by preprocess
+            # the original image is not cached either - it is at the source resolution and only used to save the outputs
+            # the (input resolution) arrays in info_dict are stored as tensors and the rest is kept in the frame info
+            cache_info_dict = {k: v for k, v in info_dict.items() if k not in ('dataset_info', 'label_offset_pred', 'data')}
+            array_keys = [k for k, v in cache_info_dict.items() if isinstance(v, np.ndarray)]
+            cache_info = {'is_list': is_list, 'num_inputs': len(tensors), 'array_keys': array_keys,
+                          'info_dict': {k: v for k, v in cache_info_dict.items() if k not in array_keys}}
+            input_cache.save(data_index, tensors + [cache_info_dict[k] for k in array_keys], info=cache_info)
+        #
+        return data, info_dict
+
+    def _prefetch_frames(self, dataset, preprocess, frame_indices, input_cache=None, decoded_store=None):
+        '''
+        yields (data, info_dict) of the given frame_indices in order.
+        upto prefetch_frames frames are read and preprocessed in advance by a pool of prefetch_workers threads,
+        so that image decode and resize can overlap with the inference of the current frame.
+        '''
+        prefetch_frames = self.settings.prefetch_frames or 0
+        prefetch_workers = self.settings.prefetch_workers or 1
+        if prefetch_frames <= 0:
+            for data_index in frame_indices:
+                yield self._read_frame(dataset, preprocess, data_index, input_cache, decoded_store)
+            #
+            return
+        #
+        frame_indices = iter(frame_indices)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=prefetch_workers) as executor:
+            futures = collections.deque()
+            for data_index in itertools.islice(frame_indices, prefetch_frames):
+                futures.append(executor.submit(self._read_frame, dataset, preprocess, data_index, input_cache, decoded_store))
+            #
+            while len(futures) > 0:
+                future = futures.popleft()
+                # keep the read-ahead queue full
+                for data_index in itertools.islice(frame_indices, 1):
+                    futures.append(executor.submit(self._read_frame, dataset, preprocess, data_index, input_cache, decoded_store))
+                #
+                yield future.result()
+            #
+        #
+
+    def _get_metric_list(self):
         session = self.pipeline_config['session']
         # if metric is not given use input_dataset
         if 'metric' in self.pipeline_config and callable(self.pipeline_config['metric']):
@@ -308,15 +791,44 @@ class AccuracyPipeline():
         metric_options['run_dir'] = run_dir
         metric = utils.as_list(metric)
         metric_options = utils.as_list(metric_options)
+        return list(zip(metric, metric_options))
+
+    def _update_metrics(self, metric_list, data_index, output):
+        for m, m_options in metric_list:
+            with utils.trace_span('metric_update', 'metric'):
+                m.update(data_index, output, **m_options)
+            #
+        #
+
+    def _evaluate(self, output_list=None):
+        # output_list is None if the metrics have been accumulated incrementally during inference
+        session = self.pipeline_config['session']
+        run_dir = session.get_param('run_dir')
         output_dict = {}
         inference_path = os.path.split(run_dir)[-1]
         output_dict.update({'infer_path':inference_path})
-        for m, m_options in zip(metric, metric_options):
-            output = m(output_list, **m_options)
+        for m, m_options in self._get_metric_list():
+            with utils.trace_span('metric_evaluate', 'metric'):
+                if output_list is None:
+                    output = m.finalize(**m_options)
+                else:
+                    output = m(output_list, **m_options)
+                #
+            #
             output_dict.update(output)
         #
         return output_dict
 
+    def _get_latency_stats(self, frame_times, name):
+        # percentiles of the per frame timings (in ms) - the frames with nan (no stats collected) are skipped
+        frame_times = frame_times[np.isfinite(frame_times)]
+        if len(frame_times) == 0:
+            return {}
+        #
+        latency_stats = {f'{name}_p{p}_ms': float(np.percentile(frame_times, p)) for p in (50, 90, 99)}
+        latency_stats.update({f'{name}_max_ms': float(np.max(frame_times)), f'{name}_std_ms': float(np.std(frame_times))})
+        return latency_stats
+
     def _run_with_log(self, func, *args, **kwargs):
         log_fp = self.logger.log_file if self.logger is not None else None
         logging_mode = 'wurlitzer' if self.settings.capture_log else None
@@ -26,7 +26,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import sys
+import re
+import yaml
 import functools
 import itertools
 import warnings
@@ -85,17 +88,25 @@ class PipelineRunner():
         # sending dataset_list to download_datasets will cause only those to be downloaded
         download_ok = datasets.download_datasets(settings, dataset_list=pipeline_config_dataset_list)
         # populate the dataset objects into the pipeline_configs
+        # each pipeline gets its own handle to the dataset, but the heavy dataset index is shared between them
         for pipeline_key, pipeline_config in self.pipeline_configs.items():
-            if isinstance(pipeline_config['calibration_dataset'], str):
-                dataset_category_name = pipeline_config['calibration_dataset']
-                pipeline_config['calibration_dataset'] = copy.deepcopy(settings.dataset_cache[dataset_category_name]['calibration_dataset'])
-            #
-            if isinstance(pipeline_config['input_dataset'], str):
-                dataset_category_name = pipeline_config['input_dataset']
-                pipeline_config['input_dataset'] = copy.deepcopy(settings.dataset_cache[dataset_category_name]['input_dataset'])
+            for dataset_key in ('calibration_dataset', 'input_dataset'):
+                dataset = pipeline_config[dataset_key]
+                if isinstance(dataset, str):
+                    dataset = settings.dataset_cache[dataset][dataset_key]
+                #
+                pipeline_config[dataset_key] = self._get_dataset_handle(dataset)
             #
         #
 
+    def _get_dataset_handle(self, dataset):
+        if isinstance(dataset, datasets.DatasetBase):
+            return dataset.get_shared_copy()
+        elif dataset is not None:
+            return copy.deepcopy(dataset)
+        #
+        return dataset
+
     def run(self):
         if self.settings.parallel_processes in (None, 0):
             return self._run_pipelines_sequential()
@@ -125,17 +136,204 @@ class PipelineRunner():
         #
         cwd = os.getcwd()
         description = 'TASKS'
-        parallel_exec = utils.ParallelRun(parallel_processes=self.settings.parallel_processes, parallel_devices=parallel_devices,
-                                          desc=description)
-        for pipeline_index, pipeline_config in enumerate(self.pipeline_configs.values()):
-            os.chdir(cwd)
-            run_pipeline_bound_func = functools.partial(self._run_pipeline, self.settings, pipeline_config,
-                                                        description='')
-            parallel_exec.enqueue(run_pipeline_bound_func)
+        # import and inference can be run as separate tasks, each stage with its own limit on the number of processes
+        # import is heavy on cpu and memory, where as inference is lighter - so more inference processes can be run
+        parallel_processes_import = self.settings.parallel_processes_import
+        parallel_processes_infer = self.settings.parallel_processes_infer
+        split_stages = (parallel_processes_import or parallel_processes_infer) and \
+            self.settings.run_import and self.settings.run_inference
+        if split_stages:
+            if parallel_processes_import and parallel_processes_infer:
+                parallel_processes = parallel_processes_import + parallel_processes_infer
+            else:
+                # only one of the limits is set - the other stage gets the rest of parallel_processes (at least 1)
+                # and parallel_processes stays the limit of the two stages together, so that the host is not oversubscribed
+                parallel_processes = self.settings.parallel_processes
+                parallel_processes_import = parallel_processes_import or max(parallel_processes - parallel_processes_infer, 1)
+                parallel_processes_infer = parallel_processes_infer or max(parallel_processes - parallel_processes_import, 1)
+            #
+            stage_limits = {'import': parallel_processes_import, 'infer': parallel_processes_infer}
+            import_settings = self._get_stage_settings(self.settings, run_import=True, run_inference=False)
+            infer_settings = self._get_stage_settings(self.settings, run_import=False, run_inference=True)
+        else:
+            parallel_processes = self.settings.parallel_processes
+            stage_limits = None
         #
-        results_list = parallel_exec.run()
+        memory_watermark = self.settings.parallel_memory_watermark_gb
+        memory_watermark = int(memory_watermark * constants.GIGA_CONST) if memory_watermark else None
+        parallel_exec = utils.ParallelRun(parallel_processes=parallel_processes, parallel_devices=parallel_devices,
+                                          desc=description, schedule=self.settings.parallel_schedule, stage_limits=stage_limits,
+                                          memory_watermark=memory_watermark, worker_pool=self.settings.parallel_worker_pool,
+                                          preload_modules=self._get_preload_modules())
+        final_task_ids = []
+        # (pipeline_config, stage, measured cost) of each task - to save the peak memory after the run
+        task_info_dict = {}
+        if split_stages:
+            import_costs = self._estimate_pipeline_costs(import_settings, self.pipeline_configs)
+            infer_costs = self._estimate_pipeline_costs(infer_settings, self.pipeline_configs)
+            import_memory = self._estimate_pipeline_memory(self.pipeline_configs, 'import')
+            infer_memory = self._estimate_pipeline_memory(self.pipeline_configs, 'infer')
+            for pipeline_index, pipeline_config in enumerate(self.pipeline_configs.values()):
+                os.chdir(cwd)
+                import_pipeline_bound_func = functools.partial(self._run_pipeline, import_settings, pipeline_config,
+                                                               description='import')
+                import_task_id = parallel_exec.enqueue(import_pipeline_bound_func, cost=import_costs[pipeline_index],
+                                                       stage='import', memory=import_memory[pipeline_index])
+                # inference of a model starts once its import is complete
+                infer_pipeline_bound_func = functools.partial(self._run_pipeline, infer_settings, pipeline_config,
+                                                              description='infer')
+                infer_task_id = parallel_exec.enqueue(infer_pipeline_bound_func, cost=infer_costs[pipeline_index],
+                                                      stage='infer', depends_on=import_task_id, memory=infer_memory[pipeline_index])
+                final_task_ids.append(infer_task_id)
+                task_info_dict[import_task_id] = (pipeline_config, 'import', self._get_measured_cost(import_settings, pipeline_config))
+                task_info_dict[infer_task_id] = (pipeline_config, 'infer', self._get_measured_cost(infer_settings, pipeline_config))
+            #
+        else:
+            pipeline_costs = self._estimate_pipeline_costs(self.settings, self.pipeline_configs)
+            pipeline_memory = self._estimate_pipeline_memory(self.pipeline_configs, 'run')
+            # the tasks are pickled to be sent to the worker pool - avoid sending the dataset_cache with each of them
+            run_settings = self.settings.basic_settings() if self.settings.parallel_worker_pool else self.settings
+            for pipeline_index, pipeline_config in enumerate(self.pipeline_configs.values()):
+                os.chdir(cwd)
+                run_pipeline_bound_func = functools.partial(self._run_pipeline, run_settings, pipeline_config,
+                                                            description='')
+                task_id = parallel_exec.enqueue(run_pipeline_bound_func, cost=pipeline_costs[pipeline_index],
+                                                memory=pipeline_memory[pipeline_index])
+                final_task_ids.append(task_id)
+                task_info_dict[task_id] = (pipeline_config, 'run', self._get_measured_cost(self.settings, pipeline_config))
+            #
+        #
+        parallel_exec.run()
+        # save the peak memory of the tasks that actually ran - so that it can be used as the estimate in the next run
+        for task_id, peak_memory in parallel_exec.peak_memory_dict.items():
+            pipeline_config, stage, measured_cost = task_info_dict[task_id]
+            if measured_cost != 0.0 and peak_memory > 0:
+                self._save_pipeline_memory(pipeline_config, stage, peak_memory)
+            #
+        #
+        results_list = [parallel_exec.result_dict.get(task_id, {}) for task_id in final_task_ids]
         return results_list
 
+    def _get_preload_modules(self):
+        # heavy modules that are imported once in the forkserver of the worker pool - the ones that are not installed are ignored
+        preload_modules = ['numpy', 'cv2', 'PIL.Image', 'edgeai_benchmark', 'onnxruntime', 'tflite_runtime.interpreter', 'dlr']
+        return preload_modules
+
+    def _estimate_pipeline_memory(self, pipeline_configs, stage):
+        '''
+        estimated peak memory (in bytes) of each pipeline for the given stage - from the peak memory observed in a previous run.
+        pipelines that do not have it, use the average of those that have it.
+        '''
+        pipeline_memory = [self._load_pipeline_memory(pipeline_config, stage) for pipeline_config in pipeline_configs.values()]
+        known_memory = [m for m in pipeline_memory if m is not None]
+        default_memory = (sum(known_memory) / len(known_memory)) if len(known_memory) > 0 else None
+        pipeline_memory = [(m if m is not None else default_memory) for m in pipeline_memory]
+        return pipeline_memory
+
+    def _load_pipeline_memory(self, pipeline_config, stage):
+        memory_yaml = os.path.join(pipeline_config['session'].get_param('run_dir'), 'memory.yaml')
+        if not os.path.exists(memory_yaml):
+            return None
+        #
+        with open(memory_yaml) as fp:
+            memory_dict = yaml.safe_load(fp) or {}
+        #
+        peak_memory_mb = memory_dict.get(f'{stage}_peak_memory_mb', None)
+        return (peak_memory_mb * constants.MEGA_CONST) if peak_memory_mb is not None else None
+
+    def _save_pipeline_memory(self, pipeline_config, stage, peak_memory):
+        run_dir = pipeline_config['session'].get_param('run_dir')
+        if not os.path.isdir(run_dir):
+            return
+        #
+        memory_yaml = os.path.join(run_dir, 'memory.yaml')
+        memory_dict = {}
+        if os.path.exists(memory_yaml):
+            with open(memory_yaml) as fp:
+                memory_dict = yaml.safe_load(fp) or {}
+            #
+        #
+        memory_dict[f'{stage}_peak_memory_mb'] = round(peak_memory / constants.MEGA_CONST, 1)
+        with open(memory_yaml, 'w') as fp:
+            yaml.safe_dump(memory_dict, fp, sort_keys=False)
+        #
+
+    def _get_stage_settings(self, settings, run_import, run_inference):
+        stage_settings = settings.basic_settings()
+        stage_settings.run_import = run_import
+        stage_settings.run_inference = run_inference
+        return stage_settings
+
+    def _estimate_pipeline_costs(self, settings, pipeline_configs):
+        '''
+        estimated run time (in seconds) of each pipeline - used to schedule the slowest pipelines first.
+        the import and infer times logged in run.log in a previous run are used if available.
+        otherwise the cost is estimated from the model size, input resolution and the number of frames -
+        scaled to seconds using the pipelines for which previous timings are available.
+        '''
+        measured_costs = []
+        heuristic_costs = []
+        for pipeline_config in pipeline_configs.values():
+            measured_costs.append(self._get_measured_cost(settings, pipeline_config))
+            heuristic_costs.append(self._get_heuristic_cost(settings, pipeline_config))
+        #
+        measured_pairs = [(m, h) for m, h in zip(measured_costs, heuristic_costs) if m is not None and m > 0]
+        if len(measured_pairs) > 0:
+            seconds_per_unit = sum(m for m, h in measured_pairs) / max(sum(h for m, h in measured_pairs), 1e-6)
+        else:
+            # a rough default for pc emulation
+            seconds_per_unit = 2e-3
+        #
+        pipeline_costs = [(m if m is not None else h * seconds_per_unit) for m, h in zip(measured_costs, heuristic_costs)]
+        return pipeline_costs
+
+    def _get_measured_cost(self, settings, pipeline_config):
+        run_dir = pipeline_config['session'].get_param('run_dir')
+        result_yaml = os.path.join(run_dir, 'result.yaml')
+        param_yaml = os.path.join(run_dir, 'param.yaml')
+        if settings.run_missing and os.path.exists(result_yaml):
+            # the existing result will be just read back
+            return 0.0
+        #
+        run_log = os.path.join(run_dir, 'run.log')
+        if not os.path.exists(run_log):
+            return None
+        #
+        stage_times = {}
+        with open(run_log) as fp:
+            for line in fp:
+                # the last logged time of each stage is used
+                match = re.search(r'(import|infer) completed.* - (\d+) sec', line)
+                if match:
+                    stage_times[match.group(1)] = float(match.group(2))
+                #
+            #
+        #
+        run_import = settings.run_import and not (settings.run_missing and os.path.exists(param_yaml))
+        if (run_import and 'import' not in stage_times) or (settings.run_inference and 'infer' not in stage_times):
+            return None
+        #
+        cost = (stage_times['import'] if run_import else 0.0) + (stage_times['infer'] if settings.run_inference else 0.0)
+        return cost
+
+    def _get_heuristic_cost(self, settings, pipeline_config):
+        # model size in MB
+        model_path = utils.as_list(pipeline_config['session'].get_param('model_path'))
+        model_size = sum([os.path.getsize(m) for m in model_path if isinstance(m, str) and os.path.isfile(m)])
+        model_size = (model_size / constants.MEGA_CONST) if model_size > 0 else 10.0
+        # input resolution relative to 224x224
+        preprocess = pipeline_config.get('preprocess', None)
+        preprocess_params = preprocess.peek_params() if isinstance(preprocess, utils.ParamsBase) else {}
+        input_size = preprocess_params.get('crop', None) or preprocess_params.get('resize', None) or 224
+        input_size = utils.as_list(input_size) if not isinstance(input_size, (list,tuple)) else input_size
+        input_size = [s for s in input_size if isinstance(s, (int,float))] or [224]
+        input_pixels = input_size[0] * input_size[-1]
+        resolution_factor = input_pixels / (224 * 224)
+        # number of frames processed during import and inference
+        num_frames = (settings.num_frames or 0) if settings.run_inference else 0
+        num_frames += (settings.calibration_frames * settings.calibration_iterations) if settings.run_import else 0
+        return model_size * resolution_factor * max(num_frames, 1)
+
     # this function cannot be an instance method of PipelineRunner, as it causes an
     # error during pickling, involved in the launch of a process is parallel run. make it classmethod
     @classmethod
@@ -34,6 +34,8 @@ from .object_6d_pose import *
 from . import transforms as postprocess_transform_types
 
 class PostProcessTransforms(utils.TransformsCompose):
+    trace_category = 'postprocess'
+
     def __init__(self, settings, transforms=None, **kwargs):
         super().__init__(transforms, **kwargs)
         self.settings = settings
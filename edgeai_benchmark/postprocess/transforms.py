@@ -335,6 +335,10 @@ class SegmentationImageSave():
         prediction_size = info_dict['data_shape']
         output_image = np.array(palette)[prediction.ravel()].reshape(prediction_size)
         input_bgr = cv2.imread(data_path)  # Read the actual RGB image
+        if input_bgr is None and isinstance(info_dict.get('data', None), np.ndarray):
+            # eg. the image was read from a DatasetShard and the file is not there - the decoded image is in info_dict
+            input_bgr = np.ascontiguousarray(info_dict['data'][:,:,::-1])
+        #
         # if args.img_border_crop is not None:
         #    t, l, h, w = args.img_border_crop
         #    input_bgr = input_bgr[t:t + h, l:l + w]
@@ -391,8 +395,10 @@ class SegmentationImageSave():
 ##############################################################################
 class DetectionResizeOnlyNormalized():
     def __call__(self, bbox, info_dict):
-        img_data = info_dict['data']
-        assert isinstance(img_data, np.ndarray), 'only supports np array for now'
+        if 'data' in info_dict:
+            img_data = info_dict['data']
+            assert isinstance(img_data, np.ndarray), 'only supports np array for now'
+        #
         data_shape = info_dict['data_shape']
         data_height, data_width, _ = data_shape
         # avoid accidental overflow
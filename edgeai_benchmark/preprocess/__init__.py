@@ -26,15 +26,69 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
+
 from .. import constants
 from .. import utils
 from .transforms import *
+from .image_decoders import *
 
 
 class PreProcessTransforms(utils.TransformsCompose):
+    trace_category = 'preprocess'
+
     def __init__(self, settings, transforms=None, **kwargs):
         super().__init__(transforms, **kwargs)
         self.settings = settings
+        # run the canonical read/resize/crop/to-tensor chain as one fused transform - see ImageReadResizeCropToTensor
+        self.enable_fused = True
+        # decode jpeg images at a reduced scale, as allowed by the resize that follows ImageRead
+        self.decode_reduce = False
+        # optional utils.BufferArena that provides the output arrays of the transforms - see set_buffer_arena()
+        self.buffer_arena = None
+        # optional normalization of the session that is run at the end of this chain - see set_input_normalizer()
+        self.input_normalizer = None
+        # the fused transform is built once - it is rebuilt if the transforms (or enable_fused) change, see _get_fused_transform()
+        self._fused_transform = None
+        self._fused_transform_key = None
+
+    def __call__(self, tensor, info_dict):
+        fused_transform, num_fused = self._get_fused_transform() \
+            if (self.enable_fused and isinstance(tensor, (str, bytes, bytearray, memoryview, utils.FileBuffer))) else (None, 0)
+        if fused_transform is None:
+            tensor, info_dict = super().__call__(tensor, info_dict)
+            return self._normalize_input(tensor, info_dict)
+        #
+        fused_transform.set_buffer_arena(self.buffer_arena)
+        # set_input_normalizer() takes a normalizer only if the fused transform is the whole chain - so it is folded into it
+        fused_transform.normalizer = self.input_normalizer
+        with utils.trace_span(fused_transform.__class__.__name__, self.trace_category):
+            tensor, info_dict = fused_transform(tensor, info_dict)
+        #
+        for t in self.transforms[num_fused:]:
+            with utils.trace_span(t.__class__.__name__, self.trace_category):
+                tensor, info_dict = t(tensor, info_dict)
+            #
+        #
+        return tensor, info_dict
+
+    def _normalize_input(self, tensor, info_dict):
+        if self.input_normalizer is None:
+            return tensor, info_dict
+        #
+        with utils.trace_span(self.input_normalizer.__class__.__name__, self.trace_category):
+            return self.input_normalizer(tensor, info_dict)
+        #
+
+    def _get_fused_transform(self):
+        # the fused transform holds the transforms that it replaces (and copies their sizes) - so it is valid as long as
+        # the list of transforms is the same. set_input_size() changes the sizes, so it clears it
+        fused_transform_key = (self.enable_fused, tuple(id(t) for t in self.transforms))
+        if fused_transform_key != self._fused_transform_key:
+            self._fused_transform = ImageReadResizeCropToTensor.from_transforms(self.transforms)
+            self._fused_transform_key = fused_transform_key
+        #
+        return self._fused_transform
 
     def set_input_size(self, resize, crop):
         for t in self.transforms:
@@ -44,6 +98,127 @@ class PreProcessTransforms(utils.TransformsCompose):
                 t.set_size(crop)
             #
         #
+        self._fused_transform_key = None
+        self.set_decode_reduce(self.decode_reduce)
+
+    def set_decode_reduce(self, decode_reduce):
+        '''
+        give ImageRead the size of the resize that follows it - so that jpeg images can be decoded at a reduced scale
+        (that is still at or above the resize size). this changes the input of the resize, so the accuracy may change slightly.
+        '''
+        self.decode_reduce = decode_reduce
+        for t_idx, t in enumerate(self.transforms):
+            if isinstance(t, ImageRead):
+                t_next = self.transforms[t_idx+1] if (t_idx+1) < len(self.transforms) else None
+                resize_only = isinstance(t_next, ImageResize) and not t_next.args and \
+                    not t_next.kwargs.get('resize_with_pad', False)
+                t.decode_size = t_next.size if (decode_reduce and resize_only) else None
+            #
+        #
+
+    def set_image_decoder(self, decoder, decoder_cache_path=None):
+        '''
+        the library that ImageRead uses to decode the images - see image_decoders. None decodes with the library of
+        the backend, 'auto' selects the fastest one that is installed, for each image format (its choice is cached in
+        decoder_cache_path) - or the name of a registered decoder. the decoded pixels may differ slightly from those
+        of the backend - scripts/check_image_decoder_parity.py reports by how much.
+        '''
+        assert decoder in (None, 'auto') or decoder in get_available_image_decoders(), \
+            f'image decoder {decoder} is not installed. available image decoders: {get_available_image_decoders()}'
+        for t in self.transforms:
+            if isinstance(t, ImageRead):
+                t.decoder = decoder
+                t.decoder_cache_path = decoder_cache_path
+            #
+        #
+
+    def set_buffer_arena(self, buffer_arena):
+        '''
+        the fused transform and the normalization transforms write their outputs into the buffers of buffer_arena,
+        instead of allocating new arrays for every frame. an output is valid only until the arena gives out the same
+        buffer again - so the outputs must not be kept beyond the num_slots of the arena. None disables this.
+        '''
+        self.buffer_arena = buffer_arena
+        for t in self.transforms:
+            if hasattr(t, 'set_buffer_arena'):
+                t.set_buffer_arena(buffer_arena)
+            #
+        #
+        if self.input_normalizer is not None:
+            self.input_normalizer.set_buffer_arena(buffer_arena)
+        #
+
+    def set_input_normalizer(self, input_normalizer):
+        '''
+        run the input normalization of the session (an ImageNorm or ImageNormMeanScale) at the end of this chain, so that
+        the fused transform converts the image to float and normalizes it in the same pass that writes the tensor.
+        it is taken only if the fused transform is enabled and is the whole chain (eg. not with ImageFlipAdd) -
+        returns False otherwise, then the session has to run it. None removes it.
+        '''
+        if input_normalizer is not None:
+            fused_transform, num_fused = ImageReadResizeCropToTensor.from_transforms(self.transforms)
+            if (not self.enable_fused) or fused_transform is None or num_fused != len(self.transforms) or \
+                    getattr(input_normalizer, 'data_layout', None) != fused_transform.data_layout:
+                return False
+            #
+        #
+        self.input_normalizer = input_normalizer
+        return True
+
+    def __getstate__(self):
+        # the arena is local to the process that runs the pipeline
+        state = self.__dict__.copy()
+        state['buffer_arena'] = None
+        state['_fused_transform'] = None
+        state['_fused_transform_key'] = None
+        return state
+
+    def get_decoded_spec(self):
+        '''
+        the leading ImageRead -> ImageResize (optional) -> ImageCenterCrop of the chain produces a fixed size uint8 RGB image
+        that can be stored once and reused - see datasets.DecodedImageStore. returns (spec, num_transforms):
+        spec identifies the decoded images and num_transforms is the number of transforms that it replaces.
+        returns (None, 0) if the chain does not start that way or if the crop size is not fixed.
+        '''
+        fused_transform, num_fused = ImageReadResizeCropToTensor.from_transforms(self.transforms)
+        if fused_transform is None or fused_transform.crop_size is None:
+            return None, 0
+        #
+        num_transforms = 3 if isinstance(self.transforms[1], ImageResize) else 2
+        decoded_transforms = self.transforms[:num_transforms]
+        # the fused path is bit exact with the unfused one - so it is not part of the spec
+        spec = dict(transforms=[repr(t) for t in decoded_transforms], decode_size=decoded_transforms[0].decode_size)
+        return spec, num_transforms
+
+    def decode(self, data, info_dict):
+        '''
+        runs only the transforms that are replaced by the decoded image store - returns the HWC uint8 RGB image
+        '''
+        spec, num_transforms = self.get_decoded_spec()
+        assert spec is not None, f'{self.__class__.__name__}.decode() is not supported for: {self.transforms}'
+        if self.enable_fused:
+            image_resize = self.transforms[1] if num_transforms == 3 else None
+            fused_transform = ImageReadResizeCropToTensor(self.transforms[0], image_resize, self.transforms[num_transforms-1],
+                                                          ImageToNPTensor4D(data_layout='NHWC'))
+            tensor, info_dict = fused_transform(data, info_dict)
+            return tensor[0], info_dict
+        #
+        for t in self.transforms[:num_transforms]:
+            data, info_dict = t(data, info_dict)
+        #
+        return np.asarray(data), info_dict
+
+    def run_decoded(self, image, info_dict):
+        '''
+        runs the rest of the chain on an image from the decoded image store
+        '''
+        spec, num_transforms = self.get_decoded_spec()
+        for t in self.transforms[num_transforms:]:
+            with utils.trace_span(t.__class__.__name__, self.trace_category):
+                image, info_dict = t(image, info_dict)
+            #
+        #
+        return self._normalize_input(image, info_dict)
 
     ###############################################################
     # preprocess transforms
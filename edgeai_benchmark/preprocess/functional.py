@@ -61,7 +61,6 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import copy
 import math
 import numbers
 import warnings
@@ -139,7 +138,7 @@ def to_numpy_tensor_4d(img, data_layout, reverse_channels):
     return img
 
 
-def normalize(tensor, mean, std, data_layout, inplace):
+def normalize(tensor, mean, std, data_layout, inplace, out=None):
     """Normalize a tensor image with mean and standard deviation.
 
     .. note::
@@ -153,19 +152,23 @@ def normalize(tensor, mean, std, data_layout, inplace):
         std (sequence): Sequence of standard deviations for each channel.
         data_layout (str): 'NCHW' or 'NHCW'
         inplace(bool,optional): Bool to make this operation inplace.
+        out (Tensor,optional): preallocated output tensor - see get_normalize_output()
 
     Returns:
         Tensor: Normalized Tensor image.
     """
+    mean, std = _normalize_pre(tensor, mean, std, data_layout)
     if (std == 0).any():
         raise ValueError('std evaluated to zero after conversion, leading to division by zero.')
     #
-    mean, std = _normalize_pre(tensor, mean, std, data_layout, inplace)
-    tensor = (tensor - mean) / std
-    return tensor
+    out = get_normalize_output(tensor, mean, inplace, out)
+    # the conversion to float is done by the subtract (eg. uint8 to float32) - without a converted copy of the input
+    np.subtract(tensor, mean, out=out)
+    np.divide(out, std, out=out)
+    return out
 
 
-def normalize_mean_scale(tensor, mean, scale, data_layout, inplace):
+def normalize_mean_scale(tensor, mean, scale, data_layout, inplace, out=None):
     """Normalize a tensor image with mean and standard deviation.
 
     .. note::
@@ -179,21 +182,25 @@ def normalize_mean_scale(tensor, mean, scale, data_layout, inplace):
         scale (sequence): Sequence of scaling values for each channel.
         data_layout (str): 'NCHW' or 'NHCW'
         inplace(bool,optional): Bool to make this operation inplace.
+        out (Tensor,optional): preallocated output tensor - see get_normalize_output()
 
     Returns:
         Tensor: Normalized Tensor image.
     """
 
-    mean, scale = _normalize_pre(tensor, mean, scale, data_layout, inplace)
-    tensor = (tensor - mean) * scale
-    return tensor
+    mean, scale = _normalize_pre(tensor, mean, scale, data_layout)
+    out = get_normalize_output(tensor, mean, inplace, out)
+    # the conversion to float is done by the subtract (eg. uint8 to float32) - without a converted copy of the input
+    np.subtract(tensor, mean, out=out)
+    np.multiply(out, scale, out=out)
+    return out
 
 
-def _normalize_pre(tensor, mean, s, data_layout, inplace=False):
+def get_normalize_params(mean, s, data_layout, ndim):
+    """mean and std/scale as float32 arrays that broadcast to a tensor of rank ndim in the given layout.
+    these do not depend on the tensor - so they can be computed once and given to normalize() for every frame.
+    """
     assert data_layout in ('NCHW', 'NHWC'), f'invalid data_layout {data_layout}'
-    if not inplace:
-        tensor = copy.deepcopy(tensor)
-    #
     mean = [mean] if isinstance(mean, numbers.Number) else mean
     s = [s] if isinstance(s, numbers.Number) else s
     mean = np.array(mean, dtype=np.float32)
@@ -205,15 +212,41 @@ def _normalize_pre(tensor, mean, s, data_layout, inplace=False):
         mean = mean[None, None, :] if mean.ndim == 1 else mean
         s = s[None, None, :] if s.ndim == 1 else s
     #
-    if mean.ndim < tensor.ndim:
+    if mean.ndim < ndim:
         mean = mean[None, ...]
     #
-    if s.ndim < tensor.ndim:
+    if s.ndim < ndim:
         s = s[None, ...]
     #
     return mean, s
 
 
+def get_normalize_output(tensor, mean, inplace=False, out=None):
+    """the output of normalize(): out if given, else the tensor itself if inplace (and it is of the output type), else a new array.
+    the output type is that of (tensor - mean) - eg. float32 for a uint8 tensor.
+    """
+    out_shape = np.broadcast_shapes(tensor.shape, mean.shape)
+    out_dtype = np.result_type(tensor, mean)
+    if out is not None:
+        assert out.shape == out_shape and out.dtype == out_dtype, \
+            f'normalize: expected an output of shape {out_shape} and type {out_dtype}, got {out.shape} {out.dtype}'
+        return out
+    #
+    if inplace and tensor.shape == out_shape and tensor.dtype == out_dtype and tensor.flags.writeable:
+        return tensor
+    #
+    return np.empty(out_shape, dtype=out_dtype)
+
+
+def _normalize_pre(tensor, mean, s, data_layout):
+    # mean and s that have been prepared with get_normalize_params() are used as they are
+    if isinstance(mean, np.ndarray) and isinstance(s, np.ndarray) and mean.dtype == s.dtype == np.float32 and \
+            mean.ndim == s.ndim == tensor.ndim:
+        return mean, s
+    #
+    return get_normalize_params(mean, s, data_layout, tensor.ndim)
+
+
 def resize(img, size, *args, **kwargs):
     r"""Resize the input image to the given size.
     The image can be a PIL Image or a torch Tensor, in which case it is expected
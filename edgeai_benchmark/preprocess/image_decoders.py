@@ -0,0 +1,404 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import io
+import math
+import time
+import platform
+import threading
+import yaml
+import numpy as np
+import PIL
+import cv2
+from PIL import Image
+
+from .. import utils
+
+
+__all__ = ['ImageDecoderBase', 'PILImageDecoder', 'CV2ImageDecoder', 'TurboJPEGImageDecoder', 'SimpleJPEGImageDecoder',
+           'register_image_decoder', 'get_image_decoder', 'get_available_image_decoders', 'get_image_format',
+           'check_image_decoder_parity', 'benchmark_image_decoders', 'select_image_decoder']
+
+
+_cv2_imread_reduced_flags = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def get_image_format(path):
+    '''
+    'jpeg', 'png' or 'other' - from the extension of a path or from the signature at the start of an encoded buffer
+    '''
+    if isinstance(path, str):
+        ext = os.path.splitext(path)[-1].lower()
+        return 'jpeg' if ext in ('.jpg', '.jpeg') else ('png' if ext == '.png' else 'other')
+    #
+    signature = bytes(path[:8])
+    if signature[:2] == b'\xff\xd8':
+        return 'jpeg'
+    elif signature == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    #
+    return 'other'
+
+
+class ImageDecoderBase(object):
+    '''
+    a library that decodes an encoded image (the path of the file or the encoded bytes) into a HWC uint8 ndarray.
+    the output is always 3 channels - in RGB or BGR order as asked for. a jpeg image can be decoded at a reduced
+    scale (reduction 2, 4 or 8 - in the DCT domain), where the output is ceil(width/reduction) x ceil(height/reduction).
+    derived classes are registered with register_image_decoder() and are selected with the decoder of ImageRead.
+    '''
+    # name of the decoder in the registry
+    name = None
+    # the image formats that the decoder can read - None for all
+    image_formats = None
+
+    @classmethod
+    def is_available(cls):
+        '''whether the library of the decoder is installed (and can be loaded) on this host'''
+        return True
+
+    def get_version(self):
+        return None
+
+    def supports(self, image_format):
+        return self.image_formats is None or image_format in self.image_formats
+
+    def read_buffer(self, path):
+        # the encoded bytes of the image - a buffer is used as it is, without copying it
+        if isinstance(path, str):
+            with open(path, 'rb') as fp:
+                return fp.read()
+            #
+        #
+        return path
+
+    def read_size(self, path):
+        '''(width, height) of the image - from the header, without decoding it'''
+        with Image.open(path if isinstance(path, str) else io.BytesIO(path)) as img_header:
+            return img_header.size
+        #
+
+    def decode(self, path, reduction=1, channel_order='RGB'):
+        raise NotImplementedError
+
+    def decode_pil(self, path, reduction=1):
+        '''the decoded image as a RGB PIL Image - for the pil backend of ImageRead'''
+        return Image.fromarray(self.decode(path, reduction=reduction, channel_order='RGB'))
+
+
+class PILImageDecoder(ImageDecoderBase):
+    '''
+    Pillow - or pillow-simd, which is a drop in replacement of it (the version of pillow-simd ends with .postN)
+    '''
+    name = 'pil'
+
+    def get_version(self):
+        return PIL.__version__
+
+    def decode(self, path, reduction=1, channel_order='RGB'):
+        img_data = np.asarray(self.decode_pil(path, reduction=reduction))
+        return img_data if channel_order == 'RGB' else img_data[:,:,::-1]
+
+    def decode_pil(self, path, reduction=1):
+        img_data = Image.open(path if isinstance(path, str) else io.BytesIO(path))
+        if reduction > 1:
+            # draft() selects the largest jpeg scale at which the image is at least this size - which is the reduction
+            img_data.draft('RGB', (img_data.size[0] // reduction, img_data.size[1] // reduction))
+        #
+        return img_data.convert('RGB')
+
+
+class CV2ImageDecoder(ImageDecoderBase):
+    '''
+    OpenCV - a jpeg image is decoded at a reduced scale with the IMREAD_REDUCED_COLOR_* modes
+    '''
+    name = 'cv2'
+
+    def get_version(self):
+        return cv2.__version__
+
+    def decode(self, path, reduction=1, channel_order='RGB'):
+        imread_flags = _cv2_imread_reduced_flags[reduction] if reduction > 1 else cv2.IMREAD_COLOR
+        # a bytes buffer is decoded in place - without copying it
+        img_data = cv2.imread(path, imread_flags) if isinstance(path, str) else \
+            cv2.imdecode(np.frombuffer(path, dtype=np.uint8), imread_flags)
+        assert img_data is not None, f'{self.__class__.__name__} could not decode the image'
+        if img_data.ndim == 2 or img_data.shape[-1] == 1:
+            img_data = cv2.cvtColor(img_data, cv2.COLOR_GRAY2BGR)
+        elif img_data.shape[-1] == 4:
+            img_data = cv2.cvtColor(img_data, cv2.COLOR_BGRA2BGR)
+        #
+        return img_data if channel_order == 'BGR' else img_data[:,:,::-1]
+
+
+class TurboJPEGImageDecoder(ImageDecoderBase):
+    '''
+    libjpeg-turbo with the PyTurboJPEG bindings (pip install PyTurboJPEG - needs the libturbojpeg shared library)
+    '''
+    name = 'turbojpeg'
+    image_formats = ('jpeg',)
+
+    def __init__(self):
+        import turbojpeg
+        self.turbojpeg = turbojpeg
+        self.jpeg = turbojpeg.TurboJPEG()
+
+    @classmethod
+    def is_available(cls):
+        try:
+            import turbojpeg
+            turbojpeg.TurboJPEG()
+            return True
+        except Exception:
+            # the module is not installed or the libturbojpeg library cannot be found
+            return False
+        #
+
+    def get_version(self):
+        return getattr(self.turbojpeg, '__version__', None)
+
+    def read_size(self, path):
+        width, height, _, _ = self.jpeg.decode_header(self.read_buffer(path))
+        return width, height
+
+    def decode(self, path, reduction=1, channel_order='RGB'):
+        pixel_format = self.turbojpeg.TJPF_RGB if channel_order == 'RGB' else self.turbojpeg.TJPF_BGR
+        scaling_factor = (1, reduction) if reduction > 1 else None
+        return self.jpeg.decode(self.read_buffer(path), pixel_format=pixel_format, scaling_factor=scaling_factor)
+
+
+class SimpleJPEGImageDecoder(ImageDecoderBase):
+    '''
+    libjpeg-turbo with the simplejpeg bindings (pip install simplejpeg - the library is included in the wheel)
+    '''
+    name = 'simplejpeg'
+    image_formats = ('jpeg',)
+
+    def __init__(self):
+        import simplejpeg
+        self.simplejpeg = simplejpeg
+
+    @classmethod
+    def is_available(cls):
+        try:
+            import simplejpeg
+            return True
+        except ImportError:
+            return False
+        #
+
+    def get_version(self):
+        return getattr(self.simplejpeg, '__version__', None)
+
+    def read_size(self, path):
+        height, width, _, _ = self.simplejpeg.decode_jpeg_header(self.read_buffer(path))
+        return width, height
+
+    def decode(self, path, reduction=1, channel_order='RGB'):
+        buffer = self.read_buffer(path)
+        if reduction > 1:
+            # simplejpeg selects the smallest scale at which the image is at least this size - which is the reduction
+            height, width, _, _ = self.simplejpeg.decode_jpeg_header(buffer)
+            return self.simplejpeg.decode_jpeg(buffer, colorspace=channel_order, fastdct=False, fastupsample=False,
+                min_width=math.ceil(width / reduction), min_height=math.ceil(height / reduction))
+        #
+        return self.simplejpeg.decode_jpeg(buffer, colorspace=channel_order, fastdct=False, fastupsample=False)
+
+
+_image_decoder_types = {}
+_image_decoders = {}
+_image_decoders_lock = threading.Lock()
+
+
+def register_image_decoder(decoder_type):
+    '''
+    add a decoder (a class derived from ImageDecoderBase) to the registry - under decoder_type.name
+    '''
+    assert issubclass(decoder_type, ImageDecoderBase) and decoder_type.name, \
+        f'an image decoder must be derived from ImageDecoderBase and have a name. got {decoder_type}'
+    _image_decoder_types[decoder_type.name] = decoder_type
+    return decoder_type
+
+
+for _decoder_type in (PILImageDecoder, CV2ImageDecoder, TurboJPEGImageDecoder, SimpleJPEGImageDecoder):
+    register_image_decoder(_decoder_type)
+#
+
+
+def get_available_image_decoders(image_format=None):
+    '''
+    names of the registered decoders that are installed on this host - and that can read image_format, if it is given
+    '''
+    decoder_names = [name for name, decoder_type in _image_decoder_types.items() if decoder_type.is_available()]
+    if image_format is not None:
+        decoder_names = [name for name in decoder_names if get_image_decoder(name).supports(image_format)]
+    #
+    return decoder_names
+
+
+def get_image_decoder(name):
+    '''
+    the decoder instance of this name - one for each process, as the bindings hold handles that cannot be pickled
+    '''
+    decoder = _image_decoders.get(name, None)
+    if decoder is None:
+        with _image_decoders_lock:
+            if name not in _image_decoders:
+                assert name in _image_decoder_types, \
+                    f'unknown image decoder: {name}. registered decoders: {list(_image_decoder_types.keys())}'
+                assert _image_decoder_types[name].is_available(), f'image decoder {name} is not installed on this host'
+                _image_decoders[name] = _image_decoder_types[name]()
+            #
+            decoder = _image_decoders[name]
+        #
+    #
+    return decoder
+
+
+def check_image_decoder_parity(img_data, img_data_ref, max_mean_diff=0.5, max_diff=8):
+    '''
+    whether the decoded image matches the reference within the tolerance - jpeg decoders may differ slightly in
+    the IDCT and the chroma upsampling: that is a difference of a few levels at some pixels. a decoder with a different
+    upsampling or color conversion differs more than max_diff at the edges, even if the mean difference is small.
+    returns (match, mean absolute difference, max absolute difference)
+    '''
+    img_data, img_data_ref = np.asarray(img_data), np.asarray(img_data_ref)
+    if img_data.shape != img_data_ref.shape or img_data.dtype != img_data_ref.dtype:
+        return False, None, None
+    #
+    abs_diff = np.abs(img_data.astype(np.int16) - img_data_ref.astype(np.int16))
+    mean_diff, worst_diff = float(abs_diff.mean()), int(abs_diff.max())
+    return (mean_diff <= max_mean_diff and worst_diff <= max_diff), mean_diff, worst_diff
+
+
+def benchmark_image_decoders(paths, backend, decoder_names=None, num_repeats=5, reduction=1):
+    '''
+    time each of the decoders on the images (paths or encoded buffers - or one of those), decoded at the given scale
+    reduction, in the output that the backend of ImageRead uses: a PIL Image for pil and a BGR ndarray for cv2.
+    the decoded pixels are compared with those of the decoder of the backend (the reference) at that reduction
+    and the decoders that do not match within tolerance (on any of the images) are left out.
+    the time of a decoder is the sum over the images of the median of num_repeats decodes (after one warm up decode).
+    returns a dict of decoder name: (decode time in seconds, max of the mean absolute differences from the reference)
+    '''
+    paths = paths if isinstance(paths, (list,tuple)) else [paths]
+    buffers = [PILImageDecoder().read_buffer(path) for path in paths]
+    image_format = get_image_format(buffers[0])
+    decoder_names = decoder_names or get_available_image_decoders(image_format)
+    imgs_data_ref = [get_image_decoder(backend).decode(buffer, reduction=reduction) for buffer in buffers]
+    decode_times = {}
+    for name in decoder_names:
+        decoder = get_image_decoder(name)
+        if not decoder.supports(image_format):
+            continue
+        #
+        parity = [check_image_decoder_parity(decoder.decode(buffer, reduction=reduction), img_data_ref)
+                  for buffer, img_data_ref in zip(buffers, imgs_data_ref)]
+        if not all(match for match, mean_diff, max_diff in parity):
+            continue
+        #
+        decode_fn = (lambda b: decoder.decode_pil(b, reduction=reduction)) if backend == 'pil' else \
+            (lambda b: decoder.decode(b, reduction=reduction, channel_order='BGR'))
+        decode_time = 0.0
+        for buffer in buffers:
+            decode_fn(buffer)
+            elapsed_times = []
+            for _ in range(num_repeats):
+                start_time = time.perf_counter()
+                decode_fn(buffer)
+                elapsed_times.append(time.perf_counter() - start_time)
+            #
+            decode_time += float(np.median(elapsed_times))
+        #
+        decode_times[name] = (decode_time, max(mean_diff for match, mean_diff, max_diff in parity))
+    #
+    return decode_times
+
+
+_selected_decoders = {}
+_selected_decoders_lock = threading.Lock()
+
+
+def _get_host_key():
+    # the choice depends on the cpu and on the versions of the libraries that are installed
+    decoder_versions = {name: get_image_decoder(name).get_version() for name in get_available_image_decoders()}
+    return utils.get_cache_key(platform.node(), platform.machine(), platform.processor(), decoder_versions)
+
+
+def select_image_decoder(image_format, backend, path, cache_path=None, reduction=1):
+    '''
+    name of the fastest decoder of image_format on this host, for the backend of ImageRead and the scale reduction that
+    the image is decoded at - decoded pixels must match those of the decoder of the backend, at that reduction.
+    the first call for a format and reduction runs benchmark_image_decoders() on the image (path or encoded buffer - or
+    a list of those, for a more stable choice) and the choice is kept for the process - and in a yaml file (one for
+    each host and set of installed decoders) in cache_path, if it is given, so that the benchmark runs only once.
+    '''
+    selection_key = (image_format, backend, reduction)
+    decoder_name = _selected_decoders.get(selection_key, None)
+    if decoder_name is not None:
+        return decoder_name
+    #
+    with _selected_decoders_lock:
+        if selection_key in _selected_decoders:
+            return _selected_decoders[selection_key]
+        #
+        cache_file = os.path.join(cache_path, f'image_decoders_{_get_host_key()}.yaml') if cache_path else None
+        selections = {}
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file) as fp:
+                selections = yaml.safe_load(fp) or {}
+            #
+        #
+        # {backend: {image_format: {reduction: decoder name}}}
+        format_selections = selections.get(backend, {}).get(image_format, None)
+        format_selections = format_selections if isinstance(format_selections, dict) else {}
+        decoder_name = format_selections.get(reduction, None)
+        if decoder_name is None or decoder_name not in get_available_image_decoders(image_format):
+            decode_times = benchmark_image_decoders(path, backend, num_repeats=10, reduction=reduction)
+            decoder_name = min(decode_times.keys(), key=lambda name: decode_times[name][0]) if decode_times else backend
+            decode_times_ms = {name: round(t * 1000, 3) for name, (t, _) in decode_times.items()}
+            print(utils.log_color('\nINFO', f'image decoder for {image_format} ({backend}, reduction {reduction})',
+                                  f'{decoder_name} - decode time (ms): {decode_times_ms}'))
+            if cache_file:
+                format_selections[reduction] = decoder_name
+                selections.setdefault(backend, {})[image_format] = format_selections
+                os.makedirs(cache_path, exist_ok=True)
+                cache_file_tmp = f'{cache_file}.{os.getpid()}.tmp'
+                with open(cache_file_tmp, 'w') as fp:
+                    yaml.safe_dump(selections, fp)
+                #
+                os.replace(cache_file_tmp, cache_file)
+            #
+        #
+        _selected_decoders[selection_key] = decoder_name
+    #
+    return decoder_name
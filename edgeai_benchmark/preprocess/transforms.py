@@ -62,6 +62,9 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import os
+import io
+import math
 import numbers
 from collections.abc import Sequence
 import numpy as np
@@ -69,7 +72,10 @@ import PIL
 import cv2
 
 from PIL import Image
+from .. import utils
 from . import functional as F
+from . import image_decoders
+from .image_decoders import _cv2_imread_reduced_flags
 
 _pil_interpolation_to_str = {
     Image.NEAREST: 'PIL.Image.NEAREST',
@@ -81,31 +87,46 @@ _pil_interpolation_to_str = {
 }
 
 
+def get_buffer_and_path(path):
+    '''
+    returns what is to be decoded and the path that identifies it (info_dict['data_path']) - a utils.FileBuffer
+    (eg. from a DatasetShard) is decoded from its buffer and identified by its name. a bare buffer has no path
+    '''
+    if isinstance(path, utils.FileBuffer):
+        return path.buffer, path.name
+    #
+    return path, (path if isinstance(path, str) else './')
+
+
 class ImageRead(object):
-    def __init__(self, backend='pil'):
+    def __init__(self, backend='pil', decoder=None):
         assert backend in ('pil', 'cv2'), f'backend must be one of pil or cv2. got {backend}'
         self.backend = backend
+        # library that decodes the images (see image_decoders) - the backend still does the resize that follows.
+        # None decodes with the library of the backend, 'auto' selects the fastest available decoder for each image
+        # format on this host (with a micro-benchmark, cached in decoder_cache_path) or the name of a registered decoder
+        # this is set by PreProcessTransforms.set_image_decoder()
+        self.decoder = decoder
+        self.decoder_cache_path = None
+        # size of the downstream resize (as given to ImageResize) - if set, jpeg images are decoded at a reduced
+        # scale (1/2, 1/4 or 1/8 in the DCT domain) that still keeps the image at or above the size of the resize
+        # this is set by PreProcessTransforms.set_decode_reduce()
+        self.decode_size = None
 
     def __call__(self, path, info_dict):
-        if isinstance(path, str):
+        # the input can be the path of an image file or the encoded image as a bytes buffer (eg. from a DatasetShard)
+        if isinstance(path, (str, bytes, bytearray, memoryview, utils.FileBuffer)):
+            path, data_path = get_buffer_and_path(path)
             img_data = None
             if self.backend == 'pil':
-                img_data = PIL.Image.open(path)
-                img_data = img_data.convert('RGB')
-                info_dict['data_shape'] = img_data.size[1], img_data.size[0], len(img_data.getbands())
+                img_data = self.read_pil(path, info_dict)
             elif self.backend == 'cv2':
-                img_data = cv2.imread(path)
-                if img_data.shape[-1] == 1:
-                    img_data = cv2.cvtColor(img_data, cv2.COLOR_GRAY2BGR)
-                elif img_data.shape[-1] == 4:
-                    img_data = cv2.cvtColor(img_data, cv2.COLOR_BGRA2BGR)
-                #
+                img_data = self.read_cv2(path, info_dict)
                 # always return in RGB format
                 img_data = img_data[:,:,::-1]
-                info_dict['data_shape'] = img_data.shape
             #
             info_dict['data'] = img_data
-            info_dict['data_path'] = path
+            info_dict['data_path'] = data_path
         elif isinstance(path, np.ndarray):
             img_data = path
             info_dict['data_shape'] = img_data.shape
@@ -137,11 +158,185 @@ class ImageRead(object):
         #
         return img_data, info_dict
 
+    def read_pil(self, path, info_dict):
+        decoder = self.get_decoder(path)
+        if decoder is not None:
+            return self.read_decoder(decoder, path, info_dict, 'PIL')
+        #
+        img_data = PIL.Image.open(path if isinstance(path, str) else io.BytesIO(path))
+        # data_shape is the size of the source image - even if it is decoded at a reduced scale
+        info_dict['data_shape'] = img_data.size[1], img_data.size[0], 3
+        decode_reduced_size = self.get_decode_reduced_size(img_data.size[0], img_data.size[1])
+        if decode_reduced_size is not None:
+            # draft() selects the largest jpeg scale at which the image is at least this size - no-op for other formats
+            img_data.draft('RGB', decode_reduced_size)
+        #
+        img_data = img_data.convert('RGB')
+        return img_data
+
+    def read_cv2(self, path, info_dict):
+        # returns the image in BGR format
+        decoder = self.get_decoder(path)
+        if decoder is not None:
+            return self.read_decoder(decoder, path, info_dict, 'BGR')
+        #
+        is_buffer = not isinstance(path, str)
+        is_jpeg = (bytes(path[:2]) == b'\xff\xd8') if is_buffer else (os.path.splitext(path)[-1].lower() in ('.jpg', '.jpeg'))
+        decode_reduction = 1
+        if self.decode_size is not None and is_jpeg:
+            # the size of the image is read from the header, without decoding it
+            with PIL.Image.open(io.BytesIO(path) if is_buffer else path) as img_header:
+                width, height = img_header.size
+            #
+            decode_reduction = self.get_decode_reduction(width, height)
+        #
+        imread_flags = _cv2_imread_reduced_flags[decode_reduction] if decode_reduction > 1 else cv2.IMREAD_COLOR
+        # a bytes buffer is decoded in place - without copying it
+        img_data = cv2.imdecode(np.frombuffer(path, dtype=np.uint8), imread_flags) if is_buffer else \
+            cv2.imread(path, imread_flags)
+        if decode_reduction > 1:
+            info_dict['data_shape'] = height, width, img_data.shape[-1]
+        else:
+            if img_data.shape[-1] == 1:
+                img_data = cv2.cvtColor(img_data, cv2.COLOR_GRAY2BGR)
+            elif img_data.shape[-1] == 4:
+                img_data = cv2.cvtColor(img_data, cv2.COLOR_BGRA2BGR)
+            #
+            info_dict['data_shape'] = img_data.shape
+        #
+        return img_data
+
+    def get_decoder(self, path):
+        '''
+        the decoder (an image_decoders.ImageDecoderBase) of the image - None if it is decoded by the backend itself
+        '''
+        if self.decoder is None:
+            return None
+        #
+        image_format = image_decoders.get_image_format(path)
+        if self.decoder == 'auto':
+            # the fastest decoder (and whether it matches the backend) can differ with the scale it decodes at
+            decode_reduction = 1
+            if self.decode_size is not None and image_format == 'jpeg':
+                width, height = image_decoders.get_image_decoder(self.backend).read_size(path)
+                decode_reduction = self.get_decode_reduction(width, height)
+            #
+            decoder_name = image_decoders.select_image_decoder(image_format, self.backend, path,
+                self.decoder_cache_path, reduction=decode_reduction)
+        else:
+            decoder_name = self.decoder
+        #
+        decoder = image_decoders.get_image_decoder(decoder_name) if decoder_name != self.backend else None
+        # formats that the decoder cannot read (eg. png for the jpeg decoders) are decoded by the backend
+        return decoder if (decoder is not None and decoder.supports(image_format)) else None
+
+    def read_decoder(self, decoder, path, info_dict, output_format):
+        # output_format is PIL (a RGB PIL Image) or BGR (ndarray) - same as read_pil and read_cv2
+        buffer = decoder.read_buffer(path)
+        decode_reduction = 1
+        if self.decode_size is not None and image_decoders.get_image_format(buffer) == 'jpeg':
+            width, height = decoder.read_size(buffer)
+            decode_reduction = self.get_decode_reduction(width, height)
+        #
+        if output_format == 'PIL':
+            img_data = decoder.decode_pil(buffer, reduction=decode_reduction)
+            decoded_shape = img_data.size[1], img_data.size[0], 3
+        else:
+            img_data = decoder.decode(buffer, reduction=decode_reduction, channel_order=output_format)
+            decoded_shape = img_data.shape
+        #
+        # data_shape is the size of the source image - even if it is decoded at a reduced scale
+        info_dict['data_shape'] = (height, width, 3) if decode_reduction > 1 else decoded_shape
+        return img_data
+
+    def get_decode_reduction(self, width, height):
+        '''
+        the jpeg scale reduction (1, 2, 4 or 8) at which the image is decoded - 1 if it is decoded at its full size
+        '''
+        decode_reduced_size = self.get_decode_reduced_size(width, height)
+        if decode_reduced_size is None:
+            return 1
+        #
+        decode_reduction = min(width // decode_reduced_size[0], height // decode_reduced_size[1])
+        return max([s for s in (1, 2, 4, 8) if s <= decode_reduction])
+
+    def get_decode_reduced_size(self, width, height):
+        '''
+        the minimum (width, height) at which the image can be decoded, so that it is still at or above
+        the size of the downstream resize. None if the image is to be decoded at its full size.
+        '''
+        if self.decode_size is None:
+            return None
+        #
+        size = self.decode_size
+        if isinstance(size, int) or len(size) == 1:
+            # the smaller side is resized to size
+            size = size[0] if isinstance(size, Sequence) else size
+            short_side = min(width, height)
+            reduced_size = math.ceil(width * size / short_side), math.ceil(height * size / short_side)
+        else:
+            reduced_size = size[1], size[0]
+        #
+        if reduced_size[0] * 2 > width or reduced_size[1] * 2 > height:
+            return None
+        #
+        return reduced_size
+
     def __repr__(self):
-        return self.__class__.__name__ + f'(backend={self.backend})'
+        # the decoder changes the decoded pixels slightly - it is part of the repr only if set, so that existing keys stay the same
+        decoder_repr = f', decoder={self.decoder}' if self.decoder is not None else ''
+        return self.__class__.__name__ + f'(backend={self.backend}{decoder_repr})'
 
 
-class ImageNorm(object):
+class ImageNormBase(object):
+    """Common part of ImageNorm and ImageNormMeanScale.
+    The broadcast mean and std/scale arrays are computed once (for each rank of the input), and the output
+    is written into a buffer of buffer_arena (a utils.BufferArena) if it is set - otherwise into a new array.
+    """
+
+    def __init__(self, data_layout='NCHW', inplace=False):
+        self.data_layout = data_layout
+        self.inplace = inplace
+        # optional arena of preallocated outputs - set by the pipeline for the duration of inference
+        self._buffer_arena = None
+        self._norm_params = {}
+
+    def __call__(self, tensor, info_dict):
+        if isinstance(tensor, (list,tuple)):
+            tensor = [self._normalize(t, t_idx) for t_idx, t in enumerate(tensor)]
+        else:
+            tensor = self._normalize(tensor, 0)
+        #
+        return tensor, info_dict
+
+    def _normalize(self, tensor, t_idx, out=None):
+        raise NotImplementedError
+
+    def set_buffer_arena(self, buffer_arena):
+        self._buffer_arena = buffer_arena
+
+    def _get_norm_params(self, tensor, s):
+        norm_params = self._norm_params.get(tensor.ndim, None)
+        if norm_params is None:
+            norm_params = self._norm_params[tensor.ndim] = F.get_normalize_params(self.mean, s, self.data_layout, tensor.ndim)
+        #
+        return norm_params
+
+    def _get_output(self, tensor, mean, t_idx):
+        if self._buffer_arena is None or self.inplace:
+            return None
+        #
+        return self._buffer_arena.get((id(self), t_idx), np.broadcast_shapes(tensor.shape, mean.shape), np.result_type(tensor, mean))
+
+    def __getstate__(self):
+        # the arena is local to the process that runs the pipeline and the params are recomputed when needed
+        state = self.__dict__.copy()
+        state['_buffer_arena'] = None
+        state['_norm_params'] = {}
+        return state
+
+
+class ImageNorm(ImageNormBase):
     """Normalize a tensor image with mean and standard deviation.
     Given mean: ``(mean[1],...,mean[n])`` and std: ``(std[1],..,std[n])`` for ``n``
     channels, this transform will normalize each channel of the input
@@ -159,12 +354,11 @@ class ImageNorm(object):
     """
 
     def __init__(self, mean, std, data_layout='NCHW', inplace=False):
+        super().__init__(data_layout, inplace)
         self.mean = mean
         self.std = std
-        self.data_layout = data_layout
-        self.inplace = inplace
 
-    def __call__(self, tensor, info_dict):
+    def _normalize(self, tensor, t_idx, out=None):
         """
         Args:
             tensor (Tensor): Tensor image of size (C, H, W) to be normalized.
@@ -172,18 +366,15 @@ class ImageNorm(object):
         Returns:
             Tensor: Normalized Tensor image.
         """
-        if isinstance(tensor, (list,tuple)):
-            tensor = [F.normalize(t, self.mean, self.std, self.data_layout, self.inplace) for t in tensor]
-        else:
-            tensor = F.normalize(tensor, self.mean, self.std, self.data_layout, self.inplace)
-        #
-        return tensor, info_dict
+        mean, std = self._get_norm_params(tensor, self.std)
+        out = self._get_output(tensor, mean, t_idx) if out is None else out
+        return F.normalize(tensor, mean, std, self.data_layout, self.inplace, out=out)
 
     def __repr__(self):
         return self.__class__.__name__ + '(mean={0}, std={1})'.format(self.mean, self.std)
 
 
-class ImageNormMeanScale(object):
+class ImageNormMeanScale(ImageNormBase):
     """Normalize a tensor image with mean and standard deviation.
     Given mean: ``(mean[1],...,mean[n])`` and scale: ``(scale[1],..,scale[n])`` for ``n``
     channels, this transform will normalize each channel of the input
@@ -200,12 +391,11 @@ class ImageNormMeanScale(object):
     """
 
     def __init__(self, mean, scale, data_layout='NCHW', inplace=False):
+        super().__init__(data_layout, inplace)
         self.mean = mean
         self.scale = scale
-        self.data_layout = data_layout
-        self.inplace = inplace
 
-    def __call__(self, tensor, info_dict):
+    def _normalize(self, tensor, t_idx, out=None):
         """
         Args:
             tensor (Tensor): Tensor image of size (C, H, W) to be normalized.
@@ -213,12 +403,9 @@ class ImageNormMeanScale(object):
         Returns:
             Tensor: Normalized Tensor image.
         """
-        if isinstance(tensor, (list,tuple)):
-            tensor = [F.normalize_mean_scale(t, self.mean, self.scale, self.data_layout, self.inplace) for t in tensor]
-        else:
-            tensor = F.normalize_mean_scale(tensor, self.mean, self.scale, self.data_layout, self.inplace)
-        #
-        return tensor, info_dict
+        mean, scale = self._get_norm_params(tensor, self.scale)
+        out = self._get_output(tensor, mean, t_idx) if out is None else out
+        return F.normalize_mean_scale(tensor, mean, scale, self.data_layout, self.inplace, out=out)
 
     def __repr__(self):
         return self.__class__.__name__ + '(mean={0}, scale={1})'.format(self.mean, self.scale)
@@ -445,6 +632,161 @@ class ImageFlipAdd:
         info_dict['flip_img'] = np.flip(img, axis=[self.flip_axis])
         return img, info_dict
 
+class ImageReadResizeCropToTensor(object):
+    """Fused form of the canonical chain built by PreProcessTransforms.get_transform_base():
+    ImageRead -> ImageResize (optional) -> ImageCenterCrop -> ImageToNPTensor4D -> NPTensor4DChanReverse (optional)
+
+    The crop window is computed up front and the result is written once into a contiguous tensor,
+    instead of allocating an intermediate image for each step.
+
+    With pil, only the region of the image that survives the crop is resized (Image.resize with a box) - the pixels
+    are sampled at the same positions as the full resize, but the rounding of the two passes of pil can differ:
+    the output is within 1 of the unfused chain. With cv2, the full image is resized (the region cannot be given
+    to cv2.resize without changing its scale) and the crop is a view - so it is bit exact.
+    The crop, channel order and layout conversion are done in one copy. If a normalizer is set
+    (see PreProcessTransforms.set_input_normalizer()), the conversion to float and the normalization are done in
+    that same pass, into a float tensor - bit exact with the normalization of the uint8 tensor.
+    """
+
+    def __init__(self, image_read, image_resize, center_crop, to_tensor, chan_reverse=None):
+        self.image_read = image_read
+        self.backend = image_read.backend
+        self.size = image_resize.size if image_resize is not None else None
+        self.interpolation = image_resize.kwargs.get('interpolation', None) if image_resize is not None else None
+        self.crop_size = center_crop.size
+        self.data_layout = to_tensor.data_layout
+        # a channel reverse after the conversion to tensor cancels the one in the conversion
+        self.reverse_channels = (to_tensor.reverse_channels != (chan_reverse is not None))
+        # optional arena of preallocated outputs - see PreProcessTransforms.set_buffer_arena()
+        self._buffer_arena = None
+        # optional ImageNorm / ImageNormMeanScale that is folded into the output - see PreProcessTransforms.set_input_normalizer()
+        self.normalizer = None
+
+    @classmethod
+    def from_transforms(cls, transforms):
+        """Returns the fused transform and the number of transforms that it replaces
+        from the start of the list - or (None, 0) if the list does not start with the canonical chain.
+        """
+        transforms = list(transforms)
+        if len(transforms) < 3 or type(transforms[0]) is not ImageRead:
+            return None, 0
+        #
+        t_idx = 1
+        image_resize = None
+        if type(transforms[t_idx]) is ImageResize:
+            image_resize = transforms[t_idx]
+            if image_resize.args or image_resize.kwargs.get('resize_with_pad', False):
+                return None, 0
+            #
+            t_idx += 1
+        #
+        if len(transforms) < (t_idx + 2) or type(transforms[t_idx]) is not ImageCenterCrop or \
+                type(transforms[t_idx+1]) is not ImageToNPTensor4D:
+            return None, 0
+        #
+        center_crop = transforms[t_idx]
+        to_tensor = transforms[t_idx+1]
+        t_idx += 2
+        chan_reverse = None
+        if len(transforms) > t_idx and type(transforms[t_idx]) is NPTensor4DChanReverse and \
+                transforms[t_idx].data_layout == to_tensor.data_layout:
+            chan_reverse = transforms[t_idx]
+            t_idx += 1
+        #
+        return cls(transforms[0], image_resize, center_crop, to_tensor, chan_reverse), t_idx
+
+    def __call__(self, path, info_dict):
+        assert isinstance(path, (str, bytes, bytearray, memoryview, utils.FileBuffer)), \
+            f'{self.__class__.__name__} expects an image path or buffer. got {type(path)}'
+        path, info_dict['data_path'] = get_buffer_and_path(path)
+        if self.backend == 'pil':
+            img = self._read_resize_crop_pil(path, info_dict)
+        else:
+            img = self._read_resize_crop_cv2(path, info_dict)
+        #
+        # single pass into the output tensor - with the layout conversion (and the normalization)
+        img = img.transpose((2, 0, 1))[None] if self.data_layout == 'NCHW' else img[None]
+        if self.normalizer is None:
+            tensor = self._get_output(img.shape, img.dtype)
+            np.copyto(tensor, img)
+        else:
+            # the per channel mean and scale are float32 - normalize() checks that the output is of that shape and type
+            tensor = self._get_output(img.shape, np.float32)
+            tensor = self.normalizer._normalize(img, 0, out=tensor)
+        #
+        return tensor, info_dict
+
+    def set_buffer_arena(self, buffer_arena):
+        self._buffer_arena = buffer_arena
+
+    def _get_output(self, shape, dtype):
+        if self._buffer_arena is None:
+            return np.empty(shape, dtype=dtype)
+        #
+        # the fused transform is rebuilt if the chain changes - the ImageRead that it wraps identifies the chain
+        return self._buffer_arena.get((id(self.image_read), self.__class__.__name__), shape, dtype)
+
+    def _get_resize_shape(self, h, w):
+        # same as F.resize (without pad)
+        size = self.size
+        if isinstance(size, int) or len(size) == 1:
+            size = size[0] if isinstance(size, Sequence) else size
+            if w < h:
+                return int(size * h / w), size
+            else:
+                return size, int(size * w / h)
+            #
+        #
+        return tuple(size)
+
+    def _get_crop_window(self, h, w):
+        # same as F.center_crop
+        crop_height, crop_width = self.crop_size if self.crop_size is not None else (h, w)
+        crop_top = int((h - crop_height + 1) * 0.5)
+        crop_left = int((w - crop_width + 1) * 0.5)
+        return crop_top, crop_left, crop_height, crop_width
+
+    def _read_resize_crop_pil(self, path, info_dict):
+        img = self.image_read.read_pil(path, info_dict)
+        w, h = img.size
+        info_dict['data'] = img
+        oh, ow = (h, w)
+        if self.size is not None:
+            oh, ow = self._get_resize_shape(h, w)
+            info_dict['resize_shape'] = oh, ow, len(img.getbands())
+            info_dict['resize_border'] = (0,0,0,0)
+        #
+        crop_top, crop_left, crop_height, crop_width = self._get_crop_window(oh, ow)
+        if (oh, ow) != (h, w):
+            # the crop window in the resized image, mapped back to the source - only that region is resized
+            scale_x, scale_y = w / ow, h / oh
+            box = (crop_left * scale_x, crop_top * scale_y, (crop_left + crop_width) * scale_x, (crop_top + crop_height) * scale_y)
+            img = img.resize((crop_width, crop_height), resample=(self.interpolation or Image.BILINEAR), box=box)
+        else:
+            img = img.crop((crop_left, crop_top, crop_left + crop_width, crop_top + crop_height))
+        #
+        img = np.asarray(img)
+        return img[:,:,::-1] if self.reverse_channels else img
+
+    def _read_resize_crop_cv2(self, path, info_dict):
+        # the image is kept in BGR order until the final copy - resize is independent for each channel
+        img = self.image_read.read_cv2(path, info_dict)
+        info_dict['data'] = img[:,:,::-1]
+        if self.size is not None:
+            oh, ow = self._get_resize_shape(img.shape[0], img.shape[1])
+            img = cv2.resize(img, (ow, oh), interpolation=(self.interpolation or cv2.INTER_LINEAR))
+            info_dict['resize_shape'] = img.shape
+            info_dict['resize_border'] = (0,0,0,0)
+        #
+        crop_top, crop_left, crop_height, crop_width = self._get_crop_window(img.shape[0], img.shape[1])
+        img = img[crop_top:(crop_top + crop_height), crop_left:(crop_left + crop_width), ...]
+        return img if self.reverse_channels else img[:,:,::-1]
+
+    def __repr__(self):
+        return self.__class__.__name__ + f'(backend={self.backend}, size={self.size}, crop_size={self.crop_size}, ' \
+            f'data_layout={self.data_layout}, reverse_channels={self.reverse_channels})'
+
+
 class PointCloudRead(object):
     def __init__(self):
         pass
@@ -452,7 +794,8 @@ class PointCloudRead(object):
     def __call__(self, path, info_dict):
         point_cloud_data = None
 
-        point_cloud_data = np.fromfile(path, dtype='float32')
+        # memory mapped - the pages of the file are read only when the points are accessed (by Voxelization)
+        point_cloud_data = np.memmap(path, dtype='float32', mode='r')
         point_cloud_data = np.reshape(point_cloud_data,(-1,4))
 
         info_dict['data_shape'] = point_cloud_data.shape[1], point_cloud_data.shape[0]
@@ -480,195 +823,110 @@ class Voxelization(object):
         self.num_feat_per_voxel = 10
         self.num_channel = 64
         self.scale_fact = 32.0
+        # optional arena of preallocated outputs - see PreProcessTransforms.set_buffer_arena()
+        self._buffer_arena = None
+        # input1 is all zeros - one read-only array is given for every frame
+        self._input1 = None
 
 
     def __call__(self, lidar_data, info_dict):
+        """
+        The points are scattered into the voxels without a python loop over the points or the voxels:
+        the points are grouped by voxel (np.unique + stable argsort) and the rank of a point within its voxel
+        is its position in the group - the points with a rank of max_points_per_voxel or more are dropped.
+        The per voxel sums (for the mean) are accumulated in float64 by np.bincount - the per voxel implementation
+        summed in float32, so the means can differ by a float32 rounding. the features are truncated to int, so a
+        feature that is that close to an integer can differ by 1 - see scripts/check_voxelization_parity.py
+        """
+        input0 = self._get_buffer('input0', (1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels), np.float32)
+        input2 = self._get_buffer('input2', (1, self.num_channel, self.nw_max_num_voxels), np.int32)
+        if self._input1 is None:
+            self._input1 = np.zeros((1, self.num_channel, (int)(self.num_voxel_x*self.num_voxel_y)),dtype='float32')
+            self._input1.flags.writeable = False
+        #
+        input1 = self._input1
+
+        # voxel index of the points that are inside the range - the others are dropped
+        x = lidar_data[:, 0]
+        y = lidar_data[:, 1]
+        z = lidar_data[:, 2]
+        valid_pts = (x > self.min_x) & (x < self.max_x) & (y > self.min_y) & \
+                    (y < self.max_y) & (z > self.min_z) & (z < self.max_z)
+        lidar_data = np.asarray(lidar_data[valid_pts])
+        x_id = ((lidar_data[:, 0] - self.min_x) / self.voxel_size_x).astype(int)
+        y_id = ((lidar_data[:, 1] - self.min_y) / self.voxel_size_y).astype(int)
+        voxel_idx = y_id * self.num_voxel_x + x_id
+
+        # group the points by voxel (in the order of the voxel index), keeping the order of the points within a voxel
+        voxel_ids, point_voxel, num_points = np.unique(voxel_idx, return_inverse=True, return_counts=True)
+        point_voxel = point_voxel.reshape(-1)
+        # the last entry of input2 is needed for the end marker - the voxels beyond that are dropped
+        num_non_empty_voxels = min(len(voxel_ids), self.nw_max_num_voxels - 1)
+        order = np.argsort(point_voxel, kind='stable')
+        point_voxel = point_voxel[order]
+        voxel_start = np.cumsum(num_points) - num_points
+        point_rank = np.arange(len(order)) - voxel_start[point_voxel]
+        keep = (point_rank < self.max_points_per_voxel) & (point_voxel < num_non_empty_voxels)
+        order, point_voxel, point_rank = order[keep], point_voxel[keep], point_rank[keep]
+        num_points = np.minimum(num_points[:num_non_empty_voxels], self.max_points_per_voxel)
+        voxel_ids = voxel_ids[:num_non_empty_voxels]
+
+        points = lidar_data[order] * self.scale_fact
+        input0[0, 0:3, point_rank, point_voxel] = points[:, 0:3]
+        voxel_mean = [np.bincount(point_voxel, weights=points[:, c], minlength=num_non_empty_voxels) / num_points
+                      for c in range(3)]
+        # the per voxel implementation subtracted the mean as a float64 scalar from a float32 array:
+        # that is done in float32 with the value based casting of numpy < 2 and in float64 with numpy 2
+        mean_dtype = np.result_type(input0.dtype, np.float64(0))
+        voxel_mean = [m.astype(mean_dtype)[point_voxel] for m in voxel_mean]
+
+        input2[0, 0, :num_non_empty_voxels] = voxel_ids
+        x_offset = self.voxel_size_x / 2 + self.min_x
+        y_offset = self.voxel_size_y / 2 + self.min_y
+        z_offset = self.voxel_size_z / 2 + self.min_z
+        voxel_center_y = (input2[0, 0, :num_non_empty_voxels] / self.num_voxel_x).astype(int)
+        voxel_center_x = (input2[0, 0, :num_non_empty_voxels] - voxel_center_y * self.num_voxel_x).astype(int)
+        voxel_center_x = voxel_center_x * self.voxel_size_x + x_offset
+        voxel_center_y = voxel_center_y * self.voxel_size_y + y_offset
+        voxel_center_z = 0 * self.voxel_size_z + z_offset
+        # the centers are subtracted in float32 - as python floats were
+        voxel_center_x = (voxel_center_x * self.scale_fact).astype(np.float32)[point_voxel]
+        voxel_center_y = (voxel_center_y * self.scale_fact).astype(np.float32)[point_voxel]
+        voxel_center_z = np.float32(voxel_center_z * self.scale_fact)
+
+        features = np.empty((len(points), self.num_feat_per_voxel), dtype=np.float32)
+        features[:, 3] = points[:, 3]
+        features[:, 4] = points[:, 0] - voxel_mean[0]
+        features[:, 5] = points[:, 1] - voxel_mean[1]
+        features[:, 6] = points[:, 2] - voxel_mean[2]
+        features[:, 7] = points[:, 0] - voxel_center_x
+        features[:, 8] = points[:, 1] - voxel_center_y
+        features[:, 9] = points[:, 2] - voxel_center_z
+        #/*looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour*/
+        features[:, 0:3] = features[:, 7:10]
+        features = features.astype("int32").astype("float32")
+        input0[0, :, point_rank, point_voxel] = features
+
+        input2[0][0][num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
+        input2[0][1:64] = input2[0][0] # replicating the firsh channel indices to all channels. As scatter is same for all channels.
+        return (input0,input2,input1), info_dict
 
-        scratch_2 =[]
-        enable_pre_proc = True
-        enable_opt_pre_proc = True
-
-        input1 = np.zeros((1, self.num_channel, (int)(self.num_voxel_x*self.num_voxel_y)),dtype='float32')
-
-        if enable_pre_proc == True:
-            input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
-            input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
-
-            #start_time = time.time()
-
-            if enable_opt_pre_proc == False:
-
-                scratch_1 = []
-                for i, data in enumerate(lidar_data):
-
-                    x = data[0]
-                    y = data[1]
-                    z = data[2]
-
-                    if ((x > self.min_x) and (x < self.max_x) and (y > self.min_y) and (y < self.max_y) and
-                        (z > self.min_z) and (z < self.max_z)):
-
-                        x_id = (((x - self.min_x) / self.voxel_size_x)).astype(int)
-                        y_id = (((y - self.min_y) / self.voxel_size_y)).astype(int)
-                        scratch_1.append(y_id * self.num_voxel_x + x_id)
-                    else:
-                        scratch_1.append(-1 - i) # filing unique non valid index
-            else:
-                x = lidar_data[:, 0]
-                y = lidar_data[:, 1]
-                z = lidar_data[:, 2]
-
-                x_id = ((((x - self.min_x) / self.voxel_size_x))).astype(int)
-                y_id =  ((((y - self.min_y) / self.voxel_size_y))).astype(int)
-                valid_idx = y_id * self.num_voxel_x + x_id
-                not_valid_idx = np.ones(len(lidar_data))*-1 # -1  is the invalid index
-
-                valid_pts = (x > self.min_x)*(x < self.max_x)*(y > self.min_y)*\
-                            (y < self.max_y)*(z > self.min_z)*(z < self.max_z)
-
-                indx_write = np.where(valid_pts,valid_idx,not_valid_idx)
-
-                scratch_1  = indx_write
-
-            num_points = np.zeros(self.nw_max_num_voxels,dtype=int)
-
-            # Find unique indices
-            # There will be voxel which doesnt have any 3d point, hence collecting the voxel ids for valid voxels*/
-            # scratch_2 is the index in valid voxels
-            num_non_empty_voxels = 0
-
-            lidar_data = lidar_data[np.where(scratch_1 != -1)]
-            scratch_1 = scratch_1[np.where(scratch_1 != -1)]
-
-            if enable_opt_pre_proc == False:
-                for i in range(len(lidar_data)):
-                    if (scratch_1[i] >= 0):
-
-                        find_voxel = scratch_1[i] in scratch_1[:i]
-
-                        if find_voxel == False:
-                            scratch_2.append(num_non_empty_voxels) # this voxel idx has come first time, hence allocate a new index for this
-                            input2[0][0][num_non_empty_voxels] = scratch_1[i]
-                            num_non_empty_voxels += 1
-                        else:
-                            if enable_opt_pre_proc == False:
-                                k = scratch_1[:i].index(scratch_1[i])
-                            else:
-                                k = (np.where(scratch_1[:i] == scratch_1[i]))[0][0]
-                            scratch_2.append(scratch_2[k]) #already this voxel is having one id hence reuse it
-                    else:
-                        scratch_2.append(None)
-            else:
-                unq_rtn = np.unique(scratch_1, return_inverse = True, return_counts = True)
-                num_non_empty_voxels = (int)(unq_rtn[2].shape[0])
-                #num_points = unq_rtn[2]
-                #num_points = np.clip(num_points,0,self.max_points_per_voxel)
-                scratch_2 = unq_rtn[1]
-                input2[0, 0, :num_non_empty_voxels] = unq_rtn[0][:num_non_empty_voxels]
-
-
-            #Even though current_voxels is less than self.nw_max_num_voxels, then also arrange
-            #    the data as per maximum number of voxels.
-
-            if enable_opt_pre_proc == False:
-                tot_num_pts = 0
-                for i in range(len(lidar_data)):
-                    if (scratch_1[i] >= 0):
-                        j = scratch_2[i] #voxel index
-                        if(num_points[j]<self.max_points_per_voxel):
-                            input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
-                            num_points[j] = num_points[j] + 1
-                        else:
-                            tot_num_pts = tot_num_pts+1
-            else:
-                for i in range(len(lidar_data)):
-                    j = scratch_2[i] #voxel index
-                    if(num_points[j] < self.max_points_per_voxel):
-                        input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
-                        num_points[j] = num_points[j] + 1
-
-            line_pitch = self.nw_max_num_voxels
-            channel_pitch = self.max_points_per_voxel * line_pitch
-            x_offset = self.voxel_size_x / 2 + self.min_x
-            y_offset = self.voxel_size_y / 2 + self.min_y
-            z_offset = self.voxel_size_z / 2 + self.min_z
-
-            for i in range(num_non_empty_voxels):
-                x = 0
-                y = 0
-                z = 0
-
-                if enable_opt_pre_proc == False:
-                    for j in range(num_points[i]):
-                        x += input0[0][0][j][i]
-                        y += input0[0][1][j][i]
-                        z += input0[0][2][j][i]
-                else:
-                    x = input0[0, 0, :num_points[i], i].sum()
-                    y = input0[0, 1, :num_points[i], i].sum()
-                    z = input0[0, 2, :num_points[i], i].sum()
-
-                x_avg = x / num_points[i]
-                y_avg = y / num_points[i]
-                z_avg = z / num_points[i]
-
-                voxel_center_y = (int)(input2[0][0][i] / self.num_voxel_x)
-                voxel_center_x = (int)(input2[0][0][i] - ((int)(voxel_center_y)) * self.num_voxel_x)
-
-                voxel_center_x *= self.voxel_size_x
-                voxel_center_x += x_offset
-
-                voxel_center_y *= self.voxel_size_y
-                voxel_center_y += y_offset
-
-                voxel_center_z = 0
-                voxel_center_z *= self.voxel_size_z
-                voxel_center_z += z_offset
-                if enable_opt_pre_proc == False:
-                    for j in range(num_points[i]):
-                        input0[0][4][j][i] = input0[0][0][j][i] - x_avg
-                        input0[0][5][j][i] = input0[0][1][j][i] - y_avg
-                        input0[0][6][j][i] = input0[0][2][j][i] - z_avg
-                        input0[0][7][j][i] = input0[0][0][j][i] - voxel_center_x * self.scale_fact
-                        input0[0][8][j][i] = input0[0][1][j][i] - voxel_center_y * self.scale_fact
-                        input0[0][9][j][i] = input0[0][2][j][i] - voxel_center_z * self.scale_fact
-
-                    #/*looks like bug in python mmdetection3d code, hence below code is to mimic the mmdetect behaviour*/
-                    for j in range (num_points[i]):
-                        input0[0][0][j][i] = input0[0][7][j][i]
-                        input0[0][1][j][i] = input0[0][8][j][i]
-                        input0[0][2][j][i] = input0[0][9][j][i]
-                else:
-                    input0[0, 4, :num_points[i], i] = input0[0, 0, :num_points[i], i] - x_avg
-                    input0[0, 5, :num_points[i], i] = input0[0, 1, :num_points[i], i] - y_avg
-                    input0[0, 6, :num_points[i], i] = input0[0, 2, :num_points[i], i] - z_avg
-                    input0[0, 7, :num_points[i], i] = input0[0, 0, :num_points[i], i] - voxel_center_x * self.scale_fact
-                    input0[0, 8, :num_points[i], i] = input0[0, 1, :num_points[i], i] - voxel_center_y * self.scale_fact
-                    input0[0, 9, :num_points[i], i] = input0[0, 2, :num_points[i], i] - voxel_center_z * self.scale_fact
-
-                    input0[0, 0, :num_points[i], i] = input0[0, 7, :num_points[i], i]
-                    input0[0, 1, :num_points[i], i] = input0[0, 8, :num_points[i], i]
-                    input0[0, 2, :num_points[i], i] = input0[0, 9, :num_points[i], i]
-
-
-            input2[0][0][num_non_empty_voxels] = -1 # TIDL doesnt know valid number of voxels, hence this act as marker field.
-            input2[0][1:64] = input2[0][0] # replicating the firsh channel indices to all channels. As scatter is same for all channels.
-            input0 = input0.astype("int32")
-            input0 = input0.astype("float32")
-            #input2 = input2.astype("float32")
-            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
-            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
-        else:
-            input0 = np.fromfile(info_dict['data_path'] + "_input0_f32.bin", dtype='float32')
-            input2 = np.fromfile(info_dict['data_path'] + "_input2_f32.bin", dtype='float32')
-
-            #np.savetxt('input2.txt', input2.flatten(), fmt='%6.2e')
-            #np.savetxt('input0.txt', input0.flatten(), fmt='%6.2e')
+    def set_buffer_arena(self, buffer_arena):
+        self._buffer_arena = buffer_arena
 
-            input0 = input0.astype("int32")
-            input0 = input0.astype("float32")
+    def _get_buffer(self, name, shape, dtype):
+        # a zeroed array - reused from the arena if it is set
+        if self._buffer_arena is None:
+            return np.zeros(shape, dtype=dtype)
+        #
+        buffer = self._buffer_arena.get((id(self), name), shape, dtype)
+        buffer.fill(0)
+        return buffer
 
-            input0 = input0.reshape(1, 9, 32, 10000)
-            input2 = input2.reshape(1, 64, 10000).astype('int32')
+    def __getstate__(self):
+        # the arena is local to the process that runs the pipeline and input1 is created again when needed
+        state = self.__dict__.copy()
+        state['_buffer_arena'] = None
+        state['_input1'] = None
+        return state
 
-        return (input0,input2,input1), info_dict
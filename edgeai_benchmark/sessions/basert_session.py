@@ -39,6 +39,8 @@ from colorama import Fore
 import numpy as np
 import tarfile
 import gc
+import time
+import threading
 
 from .. import utils
 from .. import constants
@@ -56,7 +58,12 @@ class BaseRTSession(utils.ParamsBase):
         self.is_imported = False
         self.is_start_infer_done = False
         self.input_normalizer = None
+        # optional utils.BufferArena for the per frame arrays (eg. the output of input_normalizer) - see set_buffer_arena()
+        self.buffer_arena = None
         self.force_gc = force_gc
+        # stats that do not change after import (perfsim, num_subgraphs) - parsed once and memoised
+        self.static_stats = None
+        self.tidl_subgraph_ids = None
 
         self.kwargs['target_machine'] = self.kwargs.get('target_machine', 'pc')
         self.kwargs['target_device'] = self.kwargs.get('target_device', None)
@@ -142,7 +149,9 @@ class BaseRTSession(utils.ParamsBase):
         os.makedirs(self.kwargs['run_dir'], exist_ok=True)
         os.makedirs(self.kwargs['model_folder'], exist_ok=True)
         # download or copy the model and add any optimizations required
-        self.get_model()
+        with utils.trace_span('get_model', 'import'):
+            self.get_model()
+        #
 
         # _set_default_options requires to know the artifacts_folder
         # that's why this is not done in the constructor
@@ -161,6 +170,9 @@ class BaseRTSession(utils.ParamsBase):
         os.makedirs(self.kwargs['artifacts_folder'], exist_ok=True)
 
         self.clear()
+        # the artifacts are being re-generated - the memoised stats are no longer valid
+        self.static_stats = None
+        self.tidl_subgraph_ids = None
         self.is_imported = True
 
     def start_infer(self):
@@ -197,6 +209,98 @@ class BaseRTSession(utils.ParamsBase):
         #
         return outputs, info_dict
 
+    def supports_batch_inference(self, batch_size=None):
+        '''
+        returns True if infer_batch() can run several frames in one call to the interpreter.
+        batch_size: if given, the number of frames that will be stacked - a model that has been compiled for exactly
+        that batch size can run them as well (eg. 2 for the image and its flipped copy in flip_test)
+        '''
+        return False
+
+    def infer_batch(self, inputs, info_dicts):
+        '''
+        runs inference on a list of frames and returns the list of outputs and the list of info_dicts - one for each frame.
+        this default implementation runs the frames one by one.
+        '''
+        outputs = []
+        for frame_idx, input in enumerate(inputs):
+            output, info_dicts[frame_idx] = self.infer_frame(input, info_dicts[frame_idx])
+            outputs.append(output)
+        #
+        return outputs, info_dicts
+
+    def set_buffer_arena(self, buffer_arena):
+        '''
+        the input normalization (and the stacking of frames in infer_batch) write into the buffers of buffer_arena,
+        instead of new arrays for each frame. these are used only within the call to the interpreter. None disables this.
+        '''
+        self.buffer_arena = buffer_arena
+        if self.input_normalizer is not None:
+            self.input_normalizer.set_buffer_arena(buffer_arena)
+        #
+
+    def create_infer_worker(self):
+        '''
+        returns a function worker(input) that runs inference on one frame using an interpreter of its own
+        (not self.interpreter), so that several workers can be run concurrently from threads.
+        returns None if the runtime does not support this.
+        '''
+        return None
+
+    def infer_throughput(self, inputs, num_threads):
+        '''
+        throughput mode: each of the num_threads threads runs all the (preprocessed) inputs on its own interpreter.
+        onnxruntime and tflite_runtime release the GIL during inference - so the threads run concurrently.
+        the same workers are first run from a single thread, so that the scaling efficiency can be computed.
+        returns the aggregate fps and the latency percentiles observed under load - or None if not supported.
+        '''
+        workers = []
+        for thread_idx in range(num_threads):
+            worker = self.create_infer_worker()
+            if worker is None:
+                return None
+            #
+            # warmup - the first call to an interpreter can be much slower
+            worker(inputs[0])
+            workers.append(worker)
+        #
+        single_fps, _ = self._run_infer_workers(workers[:1], inputs)
+        throughput_fps, latencies = self._run_infer_workers(workers, inputs)
+        latencies_ms = np.array(latencies) * constants.MILLI_CONST
+        stats_dict = {
+            'throughput_threads': num_threads,
+            'throughput_fps': throughput_fps,
+            'throughput_scaling': (throughput_fps / (single_fps * num_threads)) if single_fps > 0 else 0.0,
+            'throughput_latency_p50_ms': float(np.percentile(latencies_ms, 50)),
+            'throughput_latency_p99_ms': float(np.percentile(latencies_ms, 99))
+        }
+        return stats_dict
+
+    def _run_infer_workers(self, workers, inputs):
+        latencies = [[] for _ in workers]
+        start_barrier = threading.Barrier(len(workers)+1)
+        def _run_worker(worker_idx):
+            start_barrier.wait()
+            for input in inputs:
+                start_time = time.time()
+                workers[worker_idx](input)
+                latencies[worker_idx].append(time.time() - start_time)
+            #
+        #
+        threads = [threading.Thread(target=_run_worker, args=(worker_idx,)) for worker_idx in range(len(workers))]
+        for t in threads:
+            t.start()
+        #
+        start_barrier.wait()
+        start_time = time.time()
+        for t in threads:
+            t.join()
+        #
+        total_time = time.time() - start_time
+        latencies = list(itertools.chain(*latencies))
+        fps = (len(latencies) / total_time) if total_time > 0 else 0.0
+        return fps, latencies
+
     def run(self, calib_data, inputs, info_dict=None):
         # import / compile the model
         info_dict = self.import_model(calib_data, info_dict)
@@ -222,21 +326,54 @@ class BaseRTSession(utils.ParamsBase):
         #
 
     def infer_stats(self):
+        # per frame stats of the last inferred frame, combined with the static stats of the model
+        stats_dict = self.infer_frame_stats()
+        stats_dict.update(self.infer_static_stats())
+        return stats_dict
+
+    def infer_frame_stats(self):
+        '''
+        stats of the last inferred frame - these are obtained from the benchmark timestamps of the interpreter,
+        without any file access, so this is cheap enough to be called after every frame
+        '''
         if hasattr(self.interpreter, 'get_TI_benchmark_data'):
             stats_dict = self._tidl_infer_stats()
         else:
             stats_dict = dict()
-            stats_dict['num_subgraphs'] = 0
             stats_dict['core_time'] = 0.0
             stats_dict['subgraph_time'] = 0.0
             stats_dict['read_total'] = 0.0
             stats_dict['write_total'] = 0.0
-            stats_dict['perfsim_macs'] = 0.0
-            stats_dict['perfsim_time'] = 0.0
-            stats_dict['perfsim_ddr_transfer'] = 0.0
         #
         return stats_dict
 
+    def infer_static_stats(self):
+        '''
+        stats that do not change after the model is imported (num_subgraphs, perfsim macs/time/ddr transfer)
+        the perfsim files in the artifacts_folder are parsed only once and the result is memoised
+        '''
+        if self.static_stats is not None:
+            return dict(self.static_stats)
+        #
+        static_stats = dict()
+        static_stats['num_subgraphs'] = 0
+        static_stats['perfsim_macs'] = 0.0
+        static_stats['perfsim_time'] = 0.0
+        static_stats['perfsim_ddr_transfer'] = 0.0
+        if hasattr(self.interpreter, 'get_TI_benchmark_data'):
+            subgraph_ids = self._tidl_subgraph_ids()
+            static_stats['num_subgraphs'] = len(subgraph_ids)
+            try:
+                perfsim_stats = self._infer_perfsim_stats()
+                static_stats.update(perfsim_stats)
+            except:
+                pass
+            #
+            # memoise only after the interpreter is available
+            self.static_stats = static_stats
+        #
+        return dict(static_stats)
+
     def get_session_name(self):
         session_name = self.kwargs['session_name']
         return session_name
@@ -335,11 +472,12 @@ class BaseRTSession(utils.ParamsBase):
         #
         self.kwargs['output_details'] = output_details
 
-    def _tidl_infer_stats(self):
-        assert self.is_imported is True, 'the given model must be an imported one.'
-        benchmark_dict = self.interpreter.get_TI_benchmark_data()
-        subgraph_time = copy_time = 0
-        cp_in_time = cp_out_time = 0
+    def _tidl_subgraph_ids(self, benchmark_dict=None):
+        # the subgraphs in the benchmark data do not change from frame to frame - find them only once
+        if self.tidl_subgraph_ids is not None:
+            return self.tidl_subgraph_ids
+        #
+        benchmark_dict = benchmark_dict if benchmark_dict is not None else self.interpreter.get_TI_benchmark_data()
         subgraphIds = []
         for stat in benchmark_dict.keys():
             if 'proc_start' in stat:
@@ -352,6 +490,15 @@ class BaseRTSession(utils.ParamsBase):
                 #
             #
         #
+        self.tidl_subgraph_ids = subgraphIds
+        return subgraphIds
+
+    def _tidl_infer_stats(self):
+        assert self.is_imported is True, 'the given model must be an imported one.'
+        benchmark_dict = self.interpreter.get_TI_benchmark_data()
+        subgraph_time = copy_time = 0
+        cp_in_time = cp_out_time = 0
+        subgraphIds = self._tidl_subgraph_ids(benchmark_dict)
         for i in range(len(subgraphIds)):
             subgraph_time += benchmark_dict['ts:subgraph_'+str(subgraphIds[i])+'_proc_end'] - benchmark_dict['ts:subgraph_'+str(subgraphIds[i])+'_proc_start']
             cp_in_time += benchmark_dict['ts:subgraph_'+str(subgraphIds[i])+'_copy_in_end'] - benchmark_dict['ts:subgraph_'+str(subgraphIds[i])+'_copy_in_start']
@@ -370,18 +517,11 @@ class BaseRTSession(utils.ParamsBase):
         read_total = read_total
         # core time excluding the copy overhead
         core_time = total_time - copy_time
+        # the static stats such as num_subgraphs and perfsim stats are provided by infer_static_stats()
         stats = {
-            'num_subgraphs': len(subgraphIds),
             'total_time': total_time, 'core_time': core_time, 'subgraph_time': subgraph_time,
-            'write_total': write_total, 'read_total': read_total,
-            'perfsim_macs': 0.0, 'perfsim_time': 0.0, 'perfsim_ddr_transfer': 0.0
+            'write_total': write_total, 'read_total': read_total
         }
-        try:
-            perfsim_stats = self._infer_perfsim_stats()
-            stats.update(perfsim_stats)
-        except:
-            pass
-        #
         return stats
 
     def _infer_perfsim_stats(self):
@@ -521,7 +661,8 @@ class BaseRTSession(utils.ParamsBase):
         # for example, the input of the model can be converted to 8bit and mean/scale can be moved inside the model
         # for prequantized models, it may also be required to run onnx-simplifier (this will be run if it is set for the model)
         # also does shape_inference for onnx models
-        apply_input_optimization = self._optimize_model(model_file,
+        with utils.trace_span('optimize_model', 'import'):
+            apply_input_optimization = self._optimize_model(model_file,
                                                  is_new_file=(not model_file_exists),
                                                  input_optimization=self.kwargs['input_optimization'],
                                                  tensor_bits=self.kwargs['tensor_bits'],
@@ -529,6 +670,7 @@ class BaseRTSession(utils.ParamsBase):
                                                  input_scale=self.kwargs['input_scale'],
                                                  with_onnxsim=self.kwargs['with_onnxsim'],
                                                  shape_inference=self.kwargs['shape_inference'])
+        #
         if apply_input_optimization:
             # set the mean and scale in kwargs to None as they have been absorbed inside.
             self.kwargs['input_mean'] = None
@@ -539,6 +681,7 @@ class BaseRTSession(utils.ParamsBase):
             self.input_normalizer = ImageNormMeanScale(
                 self.kwargs['input_mean'], self.kwargs['input_scale'],
                 self.kwargs['input_data_layout'])
+            self.input_normalizer.set_buffer_arena(self.buffer_arena)
         #
         # meta_file
         meta_path = self.kwargs['runtime_options'].get(constants.OBJECT_DETECTION_META_FILE_KEY, None)
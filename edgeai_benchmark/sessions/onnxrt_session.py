@@ -108,6 +108,91 @@ class ONNXRTSession(BaseRTSession):
         self._update_output_details(outputs)
         return outputs, info_dict
 
+    def supports_batch_inference(self, batch_size=None):
+        if self.kwargs['extra_inputs'] is not None or self.interpreter is None:
+            return False
+        #
+        input_batch_dims = [d_info.shape[0] for d_info in self.interpreter.get_inputs()]
+        # a model that has been compiled with a fixed batch dimension of batch_size runs exactly that many frames
+        # in one call - this works with TIDL offload too
+        if batch_size is not None and all([d == batch_size for d in input_batch_dims]):
+            return True
+        #
+        # otherwise TIDL offload runs one frame at a time - batching is possible only with cpu execution
+        # and only if the batch dimension of all the inputs of the model is dynamic
+        if self.kwargs['tidl_offload']:
+            return False
+        #
+        return all([not isinstance(d, int) for d in input_batch_dims])
+
+    def infer_batch(self, inputs, info_dicts):
+        for info_dict in info_dicts:
+            BaseRTSession.infer_frame(self, None, info_dict)
+        #
+        batch_size = len(inputs)
+        in_data_list = []
+        for input in inputs:
+            in_data = input if isinstance(input, (list,tuple)) else utils.as_tuple(input)
+            if self.input_normalizer is not None:
+                in_data, _ = self.input_normalizer(in_data, {})
+            #
+            in_data_list.append(in_data)
+        #
+        # frames of different shapes (eg. resize without crop) cannot be stacked
+        in_shapes = [tuple(d.shape for d in in_data) for in_data in in_data_list]
+        if batch_size == 1 or not all(shape == in_shapes[0] for shape in in_shapes):
+            return super().infer_batch(inputs, info_dicts)
+        #
+        # stack the frames along the batch dimension
+        batch_data = []
+        for input_idx, d in enumerate(zip(*in_data_list)):
+            batch_shape = (sum([t.shape[0] for t in d]),) + d[0].shape[1:]
+            out = self.buffer_arena.get(('infer_batch', input_idx), batch_shape, np.result_type(*d)) \
+                if self.buffer_arena is not None else None
+            batch_data.append(np.concatenate(d, axis=0, out=out))
+        #
+        input_dict = {getattr(d_info, 'name'):d for d_info, d in zip(self.interpreter.get_inputs(),batch_data)}
+        output_keys = [getattr(d_info, 'name') for d_info in self.interpreter.get_outputs()] \
+            if self.kwargs['output_details'] is not None else None
+        # run the actual inference
+        start_time = time.time()
+        batch_outputs = self.interpreter.run(output_keys, input_dict)
+        batch_invoke_time = (time.time() - start_time)
+        # each frame had a batch size of 1 - so all the outputs are expected to have the batch dimension
+        if not all([o.shape[0] == batch_size * in_data_list[0][0].shape[0] for o in batch_outputs]):
+            warnings.warn('the outputs of the model cannot be split into frames - running the frames one by one')
+            return super().infer_batch(inputs, info_dicts)
+        #
+        frame_batch = in_data_list[0][0].shape[0]
+        outputs = [[o[i*frame_batch:(i+1)*frame_batch] for o in batch_outputs] for i in range(batch_size)]
+        for info_dict in info_dicts:
+            # the invoke time is shared by all the frames in the batch
+            info_dict['session_invoke_time'] = batch_invoke_time / batch_size
+            info_dict['session_batch_invoke_time'] = batch_invoke_time
+        #
+        self._update_output_details(outputs[0])
+        return outputs, info_dicts
+
+    def create_infer_worker(self):
+        # an additional interpreter for the throughput mode
+        interpreter = self._create_interpreter(is_import=False)
+        os.chdir(self.cwd)
+        input_names = [getattr(d_info, 'name') for d_info in interpreter.get_inputs()]
+        output_keys = [getattr(d_info, 'name') for d_info in interpreter.get_outputs()] \
+            if self.kwargs['output_details'] is not None else None
+        def _infer_worker(input):
+            in_data = input if isinstance(input, list) else utils.as_tuple(input)
+            if self.input_normalizer is not None:
+                in_data, _ = self.input_normalizer(in_data, {})
+            #
+            input_dict = {name:d for name, d in zip(input_names, in_data)}
+            if self.kwargs['extra_inputs'] is not None:
+                input_dict.update(self.kwargs['extra_inputs'])
+            #
+            return interpreter.run(output_keys, input_dict)
+        #
+        return _infer_worker
+
     def set_runtime_option(self, option, value):
         self.kwargs["runtime_options"][option] = value
 
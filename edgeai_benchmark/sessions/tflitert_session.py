@@ -93,6 +93,25 @@ class TFLiteRTSession(BaseRTSession):
         self._update_output_details(outputs)
         return outputs, info_dict
 
+    def create_infer_worker(self):
+        # an additional interpreter for the throughput mode
+        interpreter = self._create_interpreter(is_import=False)
+        os.chdir(self.cwd)
+        input_details = interpreter.get_input_details()
+        output_details = interpreter.get_output_details()
+        def _infer_worker(input):
+            in_data = utils.as_tuple(input)
+            if self.input_normalizer is not None:
+                in_data, _ = self.input_normalizer(in_data, {})
+            #
+            for (input_detail, c_data_entry) in zip(input_details, in_data):
+                self._set_tensor(input_detail, c_data_entry, interpreter=interpreter)
+            #
+            interpreter.invoke()
+            return [self._get_tensor(output_detail, interpreter=interpreter) for output_detail in output_details]
+        #
+        return _infer_worker
+
     def set_runtime_option(self, option, value):
         self.kwargs["runtime_options"][option] = value
 
@@ -133,7 +152,8 @@ class TFLiteRTSession(BaseRTSession):
         default_options.update(runtime_options)
         self.kwargs["runtime_options"] = default_options
 
-    def _set_tensor(self, model_input, tensor):
+    def _set_tensor(self, model_input, tensor, interpreter=None):
+        interpreter = interpreter or self.interpreter
         if model_input['dtype'] == np.int8:
             # scale, zero_point = model_input['quantization']
             # tensor = np.clip(np.round(tensor/scale + zero_point), -128, 127)
@@ -143,10 +163,11 @@ class TFLiteRTSession(BaseRTSession):
             # tensor = np.clip(np.round(tensor/scale + zero_point), 0, 255)
             tensor = np.array(tensor, dtype=np.uint8)
         #
-        self.interpreter.set_tensor(model_input['index'], tensor)
+        interpreter.set_tensor(model_input['index'], tensor)
 
-    def _get_tensor(self, model_output):
-        tensor = self.interpreter.get_tensor(model_output['index'])
+    def _get_tensor(self, model_output, interpreter=None):
+        interpreter = interpreter or self.interpreter
+        tensor = interpreter.get_tensor(model_output['index'])
         if model_output['dtype'] == np.int8 or model_output['dtype']  == np.uint8:
             scale, zero_point = model_output['quantization']
             tensor = np.array(tensor, dtype=np.float32)
@@ -43,4 +43,7 @@ from .onnx_utils import *
 from .model_utils import *
 from .import_utils import *
 from .image_utils import *
+from .tensor_cache import *
+from .buffer_utils import *
+from .trace_utils import *
 from .artifacts_id_to_model_name import *
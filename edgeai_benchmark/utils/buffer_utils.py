@@ -0,0 +1,65 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import numpy as np
+
+
+class BufferArena:
+    '''
+    preallocated output arrays for the transforms of a pipeline, so that the steady state does not allocate per frame.
+    get(key, shape, dtype) returns one of num_slots buffers for the key, in round robin order - a buffer is reused after
+    num_slots more calls, so num_slots must cover the number of outputs that are in use at the same time
+    (eg. the frames in the prefetch queue). the buffers are separate for each thread, so that the prefetch threads and
+    the throughput workers do not overwrite the outputs of each other. a buffer is reallocated if the shape changes.
+    '''
+    def __init__(self, num_slots=1):
+        self.num_slots = max(num_slots, 1)
+        self.num_allocations = 0
+        self.thread_local = threading.local()
+        self.lock = threading.Lock()
+
+    def get(self, key, shape, dtype=np.float32):
+        buffers = getattr(self.thread_local, 'buffers', None)
+        if buffers is None:
+            buffers = self.thread_local.buffers = {}
+        #
+        slots, slot_idx = buffers.get(key, ([None]*self.num_slots, 0))
+        buffer = slots[slot_idx]
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = slots[slot_idx] = np.empty(shape, dtype=dtype)
+            with self.lock:
+                self.num_allocations += 1
+            #
+        #
+        buffers[key] = (slots, (slot_idx + 1) % self.num_slots)
+        return buffer
+
+    def clear(self):
+        # only the buffers of the current thread can be released - the others go with their threads
+        self.thread_local.buffers = {}
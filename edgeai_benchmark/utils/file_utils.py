@@ -196,3 +196,17 @@ def list_dir(d, only_files=False, basename=False):
 def list_files(d, basename=False):
     return list_dir(d, only_files=True, basename=basename)
 
+
+
+class FileBuffer:
+    '''
+    the contents of a file (eg. a zero copy memoryview of an entry of datasets.DatasetShard) and the path of that file.
+    the buffer is what is decoded, the name is what identifies the file (eg. info_dict['data_path'] and the names of
+    the outputs that are saved) - as if it had been read from the path.
+    '''
+    def __init__(self, buffer, name):
+        self.buffer = buffer
+        self.name = name
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(name={self.name}, size={len(self.buffer)})'
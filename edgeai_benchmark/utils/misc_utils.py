@@ -142,7 +142,8 @@ def pretty_object(d, depth=10, precision=6):
         d_out = pretty_object(p, depth)
     elif hasattr(d, '__dict__'):
         # other unrecognized objects - just grab the attributes as a dict
-        attrs = d.__dict__.copy()
+        # the private attributes (eg. the buffers and caches of a transform) are not part of its params
+        attrs = {k: v for k, v in d.__dict__.items() if not k.startswith('_')}
         if 'name' not in attrs:
             attrs.update({'name':d.__class__.__name__})
         #
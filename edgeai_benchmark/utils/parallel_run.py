@@ -30,46 +30,313 @@ import os
 import sys
 import multiprocessing
 from multiprocessing import pool
+import multiprocessing.connection
 import collections
+import heapq
 import time
 import traceback
 import queue
 import copy
+import pickle
 
 from .progress_step import *
 from .logger_utils import *
 
 
+def get_available_memory():
+    '''
+    available memory in bytes as reported in /proc/meminfo - returns None if it cannot be read
+    '''
+    try:
+        with open('/proc/meminfo') as fp:
+            for line in fp:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+                #
+            #
+        #
+    except (OSError, ValueError):
+        pass
+    #
+    return None
+
+
+def get_process_tree_rss(pid):
+    '''
+    resident memory in bytes of the given process and all its descendants, read from /proc
+    '''
+    rss = 0
+    try:
+        with open(f'/proc/{pid}/status') as fp:
+            for line in fp:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                    break
+                #
+            #
+        #
+        for tid in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{tid}/children') as fp:
+                for child_pid in fp.read().split():
+                    rss += get_process_tree_rss(int(child_pid))
+                #
+            #
+        #
+    except (OSError, ValueError):
+        pass
+    #
+    return rss
+
+
+def _pool_worker(task_reader, result_writer, parallel_device):
+    '''
+    main function of a persistent worker process - runs the tasks received in task_reader one after another.
+    each result is sent as (result, exception, task_loaded) - task_loaded is False if the task could not be unpickled here.
+    '''
+    if parallel_device is not None:
+        os.environ['CUDA_VISIBLE_DEVICES'] = str(parallel_device)
+        print(log_color('\nINFO', 'starting worker on parallel_device', parallel_device))
+    #
+    while True:
+        try:
+            task_bytes = task_reader.recv_bytes()
+        except EOFError:
+            break
+        #
+        if len(task_bytes) == 0:
+            # an empty message asks the worker to exit
+            break
+        #
+        try:
+            task, cwd = pickle.loads(task_bytes)
+        except Exception as e:
+            print(f"Exception occurred while loading the task in worker process: {e}")
+            result_writer.send(({}, None, False))
+            continue
+        #
+        result = {}
+        exception_e = None
+        try:
+            os.chdir(cwd)
+            result = task()
+        except Exception as e:
+            print(f"Exception occurred in worker process: {e}")
+            traceback.print_exc()
+            exception_e = e
+        #
+        try:
+            result_writer.send((result,exception_e,True))
+        except Exception as e:
+            # the result or exception could not be pickled
+            print(f"Exception occurred while sending the result: {e}")
+            result_writer.send(({}, None, True))
+        #
+    #
+    result_writer.close()
+
+
 class ParallelRun:
-    def __init__(self, parallel_processes, parallel_devices=None, desc='tasks', blocking=True, verbose=True, maxinterval=60):
+    def __init__(self, parallel_processes, parallel_devices=None, desc='tasks', blocking=True, verbose=True, maxinterval=60,
+                 schedule='longest_first', stage_limits=None, memory_watermark=None, memory_max_skips=4, worker_pool=False,
+                 preload_modules=None):
         self.desc = desc
         self.parallel_processes = parallel_processes
         self.parallel_devices = parallel_devices
+        # each entry is a dict with the task and its scheduling info
         self.queued_tasks = collections.deque()
         self.maxinterval = maxinterval
         self.blocking = blocking
         self.verbose = verbose
+        # 'longest_first' starts the tasks with the highest estimated cost first, if the cost of all the tasks are given.
+        # this avoids a long tail at the end where only a few slow tasks are running. None keeps the queue order.
+        self.schedule = schedule
+        # max number of tasks of a stage that can run at the same time, eg. {'import': 2, 'infer': 8}
+        # parallel_processes is the limit for the total number of tasks running at the same time
+        self.stage_limits = stage_limits or {}
+        # new tasks are held back if the available memory would go below memory_watermark (in bytes)
+        # considering the estimated peak memory of the new task and the expected growth of the running tasks.
+        # at least one task is always allowed to run. None disables it.
+        self.memory_watermark = memory_watermark if (memory_watermark and get_available_memory() is not None) else None
+        # a task that is held back for memory can be passed over by smaller tasks - after memory_max_skips times,
+        # no more tasks are started past it, so that it starts once the running tasks free enough memory
+        self.memory_max_skips = memory_max_skips
+        # peak resident memory (in bytes) observed for each task id - sampled while the tasks are running
+        self.peak_memory_dict = dict()
+        # if worker_pool is True, the tasks are run in long lived worker processes started with forkserver,
+        # instead of forking a new process from this (possibly large) process for each task.
+        # preload_modules are imported once in the forkserver, so the workers need not import them again.
+        # the tasks are pickled to be sent to the workers - the ones that cannot be pickled are run in a forked process.
+        self.worker_pool = worker_pool
+        self.preload_modules = preload_modules
+        self.worker_dict = dict()
+        self.idle_workers = []
+        self.num_started_workers = 0
+        # worker id used by each running task - for the tasks running in the worker pool
+        self.task_worker_dict = dict()
+        self.num_enqueued_tasks = 0
         self.num_total_tasks = 0
         self.num_started_tasks = 0
         self.result_queues_dict = dict()
         self.process_dict = dict()
+        self.running_dict = dict()
         self.result_list = []
+        # results indexed by the task id returned by enqueue()
+        self.result_dict = dict()
+        self.predicted_makespan = None
+        self.actual_makespan = None
         if self.verbose:
-            print(log_color('\nINFO', "parallel_run", f"parallel_processes:{self.parallel_processes} parallel_devices={self.parallel_devices}"))
+            print(log_color('\nINFO', "parallel_run", f"parallel_processes:{self.parallel_processes} parallel_devices={self.parallel_devices} "
+                  f"stage_limits={self.stage_limits} memory_watermark={self.memory_watermark}"))
             sys.stdout.flush()
         #
 
-    def enqueue(self, task):
-        self.queued_tasks.append(task)
+    def enqueue(self, task, cost=None, stage=None, depends_on=None, memory=None):
+        '''
+        cost: estimated run time of the task in seconds - it is used for scheduling and can be None if not known
+        memory: estimated peak memory of the task in bytes - it is used for admission control and can be None if not known
+        stage: the stage that the task belongs to - the number of running tasks of a stage is limited by stage_limits
+        depends_on: list of task ids that must complete before this task can start.
+            if any of them does not return a result, this task is skipped with an empty result.
+        returns the task id
+        '''
+        task_id = self.num_enqueued_tasks
+        depends_on = list(depends_on) if isinstance(depends_on, (list,tuple)) else \
+            ([] if depends_on is None else [depends_on])
+        self.queued_tasks.append(dict(task_id=task_id, task=task, cost=cost, stage=stage, depends_on=depends_on, memory=memory))
+        self.num_enqueued_tasks += 1
+        return task_id
 
     def run(self):
         assert len(self.queued_tasks) > 0, f'at least one task must be queued, got {len(self.queued_tasks)}'
+        self._schedule_tasks()
         return self._run_parallel()
 
+    def _schedule_tasks(self):
+        # the queue is ordered so that the first eligible task in it is started next
+        task_entries = list(self.queued_tasks)
+        if self.schedule == 'longest_first' and all(entry['cost'] is not None for entry in task_entries):
+            task_ranks = self._get_task_ranks(task_entries)
+            self.queued_tasks = collections.deque(sorted(task_entries, key=lambda e: task_ranks[e['task_id']], reverse=True))
+            self.predicted_makespan = self._predict_makespan()
+        elif self.schedule is not None:
+            assert self.schedule == 'longest_first', f'unknown schedule: {self.schedule}'
+        else:
+            # the last queued task is started first
+            self.queued_tasks = collections.deque(reversed(task_entries))
+        #
+
+    def _get_task_ranks(self, task_entries):
+        # rank of a task is its cost plus the cost of the longest chain of tasks that depend on it
+        dependents = collections.defaultdict(list)
+        for entry in task_entries:
+            for dep_id in entry['depends_on']:
+                dependents[dep_id].append(entry)
+            #
+        #
+        task_ranks = dict()
+        def _get_rank(entry):
+            if entry['task_id'] not in task_ranks:
+                dependent_ranks = [_get_rank(d) for d in dependents[entry['task_id']]]
+                task_ranks[entry['task_id']] = entry['cost'] + max(dependent_ranks, default=0.0)
+            #
+            return task_ranks[entry['task_id']]
+        #
+        for entry in task_entries:
+            _get_rank(entry)
+        #
+        return task_ranks
+
+    def _select_task(self, queued_tasks, completed_ids, running_entries, check_memory=False):
+        # first task in the queue whose dependencies are complete and whose stage has a free slot
+        if len(running_entries) >= self.parallel_processes:
+            return None
+        #
+        # the memory is not checked if nothing is running - the task is started even if it does not fit
+        free_memory = self._get_free_memory() if (check_memory and len(running_entries) > 0) else None
+        stage_counts = collections.Counter([entry['stage'] for entry in running_entries])
+        memory_skipped = []
+        for entry in queued_tasks:
+            if not all(dep_id in completed_ids for dep_id in entry['depends_on']):
+                continue
+            #
+            stage_limit = self.stage_limits.get(entry['stage'], None)
+            if stage_limit is not None and stage_counts[entry['stage']] >= stage_limit:
+                continue
+            #
+            if free_memory is not None and (entry['memory'] or 0) > free_memory:
+                if entry.get('memory_skips', 0) >= self.memory_max_skips:
+                    # it has waited long enough - smaller tasks are not started past it anymore
+                    return None
+                #
+                memory_skipped.append(entry)
+                continue
+            #
+            for skipped_entry in memory_skipped:
+                skipped_entry['memory_skips'] = skipped_entry.get('memory_skips', 0) + 1
+            #
+            return entry
+        #
+        return None
+
+    def _predict_makespan(self):
+        # simulate the execution of the queued tasks with their estimated costs
+        queued_tasks = list(self.queued_tasks)
+        completed_ids = set()
+        running_heap = []
+        cur_time = 0.0
+        while len(queued_tasks) > 0 or len(running_heap) > 0:
+            entry = self._select_task(queued_tasks, completed_ids, [r[2] for r in running_heap])
+            while entry is not None:
+                queued_tasks.remove(entry)
+                heapq.heappush(running_heap, (cur_time + entry['cost'], entry['task_id'], entry))
+                entry = self._select_task(queued_tasks, completed_ids, [r[2] for r in running_heap])
+            #
+            if len(running_heap) == 0:
+                break
+            #
+            cur_time, task_id, entry = heapq.heappop(running_heap)
+            completed_ids.add(task_id)
+        #
+        return cur_time
+
+    def _get_free_memory(self):
+        # memory that can be used by a new task - available memory above the watermark,
+        # minus the memory that the running tasks are expected to take in addition to what they are using now
+        available_memory = get_available_memory()
+        if self.memory_watermark is None or available_memory is None:
+            return None
+        #
+        expected_growth = 0
+        for r_key, entry in self.running_dict.items():
+            if entry['memory']:
+                expected_growth += max(entry['memory'] - self.peak_memory_dict.get(entry['task_id'], 0), 0)
+            #
+        #
+        return available_memory - self.memory_watermark - expected_growth
+
+    def _update_peak_memory(self):
+        for r_key, proc in self.process_dict.items():
+            task_id = self.running_dict[r_key]['task_id']
+            rss = get_process_tree_rss(proc.pid)
+            self.peak_memory_dict[task_id] = max(self.peak_memory_dict.get(task_id, 0), rss)
+        #
+
+    def _skip_failed_dependents(self, pbar_tasks):
+        for entry in list(self.queued_tasks):
+            dep_results = [self.result_dict[dep_id] for dep_id in entry['depends_on'] if dep_id in self.result_dict]
+            if any(not dep_result for dep_result in dep_results):
+                self.queued_tasks.remove(entry)
+                self.result_dict[entry['task_id']] = {}
+                self.result_list.append({})
+                pbar_tasks.update(1)
+            #
+        #
+
     def _run_sequential(self):
         self.result_list = []
-        for task_id, task in progress_step(self.queued_tasks, desc='tasks'):
-            result = task()
+        for entry in progress_step(list(self.queued_tasks), desc='tasks'):
+            result = entry['task']()
+            self.result_dict[entry['task_id']] = result
             self.result_list.append(result)
         #
         return self.result_list
@@ -80,6 +347,10 @@ class ParallelRun:
         self.num_started_tasks = 0
         self.result_queues_dict = dict()
         self.process_dict = dict()
+        self.running_dict = dict()
+        self.result_dict = dict()
+        self.task_worker_dict = dict()
+        start_time = time.time()
         pbar_tasks = progress_step(iterable=range(self.num_total_tasks), desc=self.desc, position=1)
         while len(self.result_list) < self.num_total_tasks:
             try:
@@ -93,6 +364,12 @@ class ParallelRun:
             #
         #
         pbar_tasks.close()
+        self._stop_workers()
+        self.actual_makespan = time.time() - start_time
+        if self.verbose and self.predicted_makespan is not None:
+            print(log_color('\nINFO', "parallel_run", f"predicted makespan: {self.predicted_makespan:.0f} sec, "
+                  f"actual makespan: {self.actual_makespan:.0f} sec"))
+        #
         print('\n')
         return self.result_list
 
@@ -110,14 +387,55 @@ class ParallelRun:
             #
 
             # start the processes
-            if len(self.process_dict) < self.parallel_processes and len(self.queued_tasks) > 0:
-                task = self.queued_tasks.pop()
-                result_queue = mp_context.SimpleQueue()
-                proc = mp_context.Process(target=self._worker, args=(task,self.num_started_tasks,result_queue))
-                proc.start()
-                self.result_queues_dict[self.num_started_tasks] = result_queue
-                self.process_dict[self.num_started_tasks] = proc
+            self._skip_failed_dependents(pbar_tasks)
+            check_memory = (self.memory_watermark is not None)
+            entry = self._select_task(self.queued_tasks, self.result_dict, list(self.running_dict.values()), check_memory)
+            while entry is not None:
+                self.queued_tasks.remove(entry)
+                task_bytes = self._get_task_bytes(entry) if self.worker_pool else None
+                if task_bytes is not None:
+                    worker_id = self._get_idle_worker()
+                    worker = self.worker_dict[worker_id]
+                    try:
+                        worker['task_writer'].send_bytes(task_bytes)
+                    except OSError:
+                        # the worker has died while it was idle - reap it and requeue the task, which is then sent to
+                        # another worker. if that keeps failing, the task is run in a forked process instead
+                        self._reap_worker(worker_id)
+                        entry['send_failures'] = entry.get('send_failures', 0) + 1
+                        entry['use_fork'] = entry['send_failures'] >= 2
+                        self.queued_tasks.appendleft(entry)
+                        entry = self._select_task(self.queued_tasks, self.result_dict, list(self.running_dict.values()), check_memory)
+                        continue
+                    #
+                    self.result_queues_dict[self.num_started_tasks] = worker['result_reader']
+                    self.process_dict[self.num_started_tasks] = worker['proc']
+                    self.task_worker_dict[self.num_started_tasks] = worker_id
+                else:
+                    result_reader, result_writer = mp_context.Pipe(duplex=False)
+                    proc = mp_context.Process(target=self._worker, args=(entry['task'],self.num_started_tasks,result_writer))
+                    proc.start()
+                    # the write end is used only by the child process
+                    result_writer.close()
+                    self.result_queues_dict[self.num_started_tasks] = result_reader
+                    self.process_dict[self.num_started_tasks] = proc
+                #
+                self.running_dict[self.num_started_tasks] = entry
                 self.num_started_tasks += 1
+                entry = self._select_task(self.queued_tasks, self.result_dict, list(self.running_dict.values()), check_memory)
+            #
+            if len(self.process_dict) == 0:
+                assert len(self.queued_tasks) == 0, f'none of the {len(self.queued_tasks)} remaining tasks can be started - check depends_on'
+                continue
+            #
+
+            # wait until a result is available or a process exits - instead of polling
+            # with memory control, wake up periodically to sample the memory usage of the running tasks
+            wait_list = list(self.result_queues_dict.values()) + [proc.sentinel for proc in self.process_dict.values()]
+            wait_timeout = min(self.maxinterval, 1.0) if self.memory_watermark is not None else self.maxinterval
+            multiprocessing.connection.wait(wait_list, timeout=wait_timeout)
+            if self.memory_watermark is not None:
+                self._update_peak_memory()
             #
 
             # collect the available the results
@@ -125,27 +443,137 @@ class ParallelRun:
             for r_key, r_queue in result_queues_dict_shallow_copy.items():
                 result = {}
                 exception_e = None
-                if not r_queue.empty():
-                    (result, exception_e) = r_queue.get()
-                    self.result_list.append(result)
+                task_loaded = True
+                worker_exited = False
+                in_worker_pool = (r_key in self.task_worker_dict)
+                if r_queue.poll():
+                    try:
+                        if in_worker_pool:
+                            (result, exception_e, task_loaded) = r_queue.recv()
+                        else:
+                            (result, exception_e) = r_queue.recv()
+                        #
+                    except EOFError:
+                        # the process exited without sending the result
+                        worker_exited = True
+                    #
+                    entry = self.running_dict.pop(r_key)
                     self.result_queues_dict.pop(r_key)
                     proc = self.process_dict.pop(r_key)
-                    proc.join()
+                    if in_worker_pool and not worker_exited:
+                        # the worker is kept alive for the next task
+                        self.idle_workers.append(self.task_worker_dict.pop(r_key))
+                    elif in_worker_pool:
+                        # only this worker is lost - a new one will be started when required
+                        proc.join()
+                        worker = self.worker_dict.pop(self.task_worker_dict.pop(r_key))
+                        worker['task_writer'].close()
+                        worker['result_reader'].close()
+                    else:
+                        r_queue.close()
+                        proc.join()
+                    #
+                    if not task_loaded:
+                        # the task could not be unpickled in the worker - run it in a forked process instead
+                        entry['use_fork'] = True
+                        self.queued_tasks.appendleft(entry)
+                        continue
+                    #
+                    self.result_list.append(result)
+                    self.result_dict[entry['task_id']] = result
                     pbar_tasks.update(1)
                 elif not self.process_dict[r_key].is_alive():
+                    task_id = self.running_dict.pop(r_key)['task_id']
                     self.result_list.append(result)
-                    self.result_queues_dict.pop(r_key)
+                    self.result_dict[task_id] = result
+                    self.result_queues_dict.pop(r_key).close()
                     proc = self.process_dict.pop(r_key)
+                    if proc.exitcode is not None and proc.exitcode < 0:
+                        peak_memory = self.peak_memory_dict.get(task_id, 0) / (1024**3)
+                        print(log_color('\nWARNING', "parallel_run", f"process exited with signal {-proc.exitcode} "
+                              f"(SIGKILL usually means out of memory) - peak memory: {peak_memory:.1f} GB"))
+                    #
                     proc.terminate() # something has happened with the process, terminate it.
                     proc.join()
+                    if in_worker_pool:
+                        # only this worker is lost - a new one will be started when required
+                        worker_id = self.task_worker_dict.pop(r_key)
+                        self.worker_dict.pop(worker_id)['task_writer'].close()
+                    #
                     pbar_tasks.update(1)
                 #
             #
-
-            time.sleep(0.1)
         #
         return self.result_list
 
+    def _get_task_bytes(self, entry):
+        # returns the pickled task to be sent to a worker, or None if it has to be run in a forked process
+        if entry.get('use_fork', False):
+            return None
+        #
+        try:
+            return pickle.dumps((entry['task'], os.getcwd()))
+        except Exception:
+            entry['use_fork'] = True
+            return None
+        #
+
+    def _get_idle_worker(self):
+        # the number of running tasks is limited by parallel_processes, so at most that many workers are needed
+        while len(self.idle_workers) > 0:
+            worker_id = self.idle_workers.pop()
+            if self.worker_dict[worker_id]['proc'].is_alive():
+                return worker_id
+            #
+            self._reap_worker(worker_id)
+        #
+        mp_context = multiprocessing.get_context(method="forkserver")
+        if self.preload_modules is not None:
+            # this takes effect only if the forkserver has not been started yet
+            mp_context.set_forkserver_preload(self.preload_modules)
+        #
+        worker_id = self.num_started_workers
+        parallel_device = self.parallel_devices[worker_id % len(self.parallel_devices)] \
+            if self.parallel_devices is not None else None
+        task_reader, task_writer = mp_context.Pipe(duplex=False)
+        result_reader, result_writer = mp_context.Pipe(duplex=False)
+        proc = mp_context.Process(target=_pool_worker, args=(task_reader, result_writer, parallel_device), daemon=True)
+        proc.start()
+        # these ends are used only by the worker process
+        task_reader.close()
+        result_writer.close()
+        self.worker_dict[worker_id] = dict(proc=proc, task_writer=task_writer, result_reader=result_reader)
+        self.num_started_workers += 1
+        return worker_id
+
+    def _reap_worker(self, worker_id):
+        # remove a worker that has exited - a new one is started when required
+        worker = self.worker_dict.pop(worker_id)
+        worker['task_writer'].close()
+        worker['result_reader'].close()
+        worker['proc'].join(timeout=1)
+        if worker['proc'].is_alive():
+            worker['proc'].terminate()
+            worker['proc'].join()
+        #
+
+    def _stop_workers(self):
+        for worker_id, worker in self.worker_dict.items():
+            try:
+                worker['task_writer'].send_bytes(b'')
+                worker['task_writer'].close()
+            except OSError:
+                pass
+            #
+            worker['proc'].join(timeout=self.maxinterval)
+            if worker['proc'].is_alive():
+                worker['proc'].terminate()
+            #
+            worker['result_reader'].close()
+        #
+        self.worker_dict = dict()
+        self.idle_workers = []
+
     def _worker(self, task, task_index, result_queue):
         result = {}
         exception_e = None
@@ -162,6 +590,13 @@ class ParallelRun:
             traceback.print_exc()
             exception_e = e
         #
-        result_queue.put((result,exception_e))
+        try:
+            result_queue.send((result,exception_e))
+        except Exception as e:
+            # the result or exception could not be pickled
+            print(f"Exception occurred while sending the result: {e}")
+            result_queue.send(({}, None))
+        #
+        result_queue.close()
 
 
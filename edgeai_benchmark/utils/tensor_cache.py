@@ -0,0 +1,397 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import hashlib
+import pickle
+import threading
+import yaml
+import numpy as np
+
+from .misc_utils import pretty_object
+
+
+def get_cache_key(*args):
+    '''
+    content address for the cache - sha1 of the yaml dump of the given (pretty printed) objects
+    '''
+    description = yaml.safe_dump([pretty_object(a) for a in args], sort_keys=True)
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+
+class TensorCache:
+    '''
+    a persistent, content addressed cache of lists of numpy tensors, stored as .npy files on disk.
+    the entries are loaded as read-only memory mapped arrays, so they are not copied into memory until used.
+    the cache can be shared by several processes - each entry is written into a temporary folder and then renamed.
+    the least recently used entries are evicted first, when the total size exceeds max_size (in bytes).
+    the size of each entry is kept in a ledger file in it, so that the eviction does not need to walk the whole cache.
+    '''
+    size_file = 'size.txt'
+
+    def __init__(self, cache_path, max_size=None):
+        self.cache_path = os.path.abspath(cache_path)
+        self.max_size = max_size
+        self.num_hits = 0
+        self.num_misses = 0
+        # size of the entries written by this object - writing stops once this exceeds max_size
+        self.written_size = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    def get_entry_path(self, key):
+        return os.path.join(self.cache_path, key)
+
+    def get_stats(self):
+        num_lookups = self.num_hits + self.num_misses
+        hit_rate = (self.num_hits * 100.0 / num_lookups) if num_lookups > 0 else 0.0
+        return {'cache_hits': self.num_hits, 'cache_misses': self.num_misses, 'cache_hit_rate%': hit_rate}
+
+    def _update_stats(self, is_hit):
+        with self.lock:
+            if is_hit:
+                self.num_hits += 1
+            else:
+                self.num_misses += 1
+            #
+        #
+
+    def load(self, key):
+        '''
+        returns the list of tensors stored for the given key, or None if it is not in the cache
+        '''
+        entry_path = self.get_entry_path(key)
+        if not os.path.isdir(entry_path):
+            self._update_stats(False)
+            return None
+        #
+        try:
+            num_tensors = len([f for f in os.listdir(entry_path) if f.endswith('.npy')])
+            tensors = [np.load(os.path.join(entry_path, f'{idx}.npy'), mmap_mode='r') for idx in range(num_tensors)]
+            # update the modification time, it is used as the last used time for LRU eviction
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            # the entry is being evicted by another process
+            self._update_stats(False)
+            return None
+        #
+        self._update_stats(True)
+        return tensors
+
+    def load_info(self, key):
+        '''
+        returns the info that was stored along with the tensors, or None
+        '''
+        info_file = os.path.join(self.get_entry_path(key), 'info.pkl')
+        try:
+            with open(info_file, 'rb') as fp:
+                return pickle.load(fp)
+            #
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        #
+
+    def save(self, key, tensors, info=None, evict=True):
+        '''
+        stores the list of tensors (and optionally a picklable info object) for the given key.
+        tensors that are not numpy arrays cannot be cached. returns True if the entry is in the cache.
+        if evict is False, the caller is expected to call evict() later on.
+        '''
+        if not all(isinstance(t, np.ndarray) for t in tensors):
+            return False
+        #
+        if self.max_size and self.written_size > self.max_size:
+            return False
+        #
+        entry_path = self.get_entry_path(key)
+        if os.path.isdir(entry_path):
+            return True
+        #
+        temp_path = f'{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(temp_path, exist_ok=True)
+            for idx, t in enumerate(tensors):
+                np.save(os.path.join(temp_path, f'{idx}.npy'), t)
+            #
+            if info is not None:
+                with open(os.path.join(temp_path, 'info.pkl'), 'wb') as fp:
+                    pickle.dump(info, fp)
+                #
+            #
+            entry_size = self.get_size(temp_path)
+            self._add_size(temp_path, entry_size)
+            os.rename(temp_path, entry_path)
+        except OSError:
+            # another process has written the same entry in the meanwhile or it is being evicted
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return os.path.isdir(entry_path)
+        #
+        with self.lock:
+            self.written_size += entry_size
+        #
+        if evict:
+            self.evict()
+        #
+        return True
+
+    def get_size(self, entry_path):
+        size = 0
+        for root, dirs, files in os.walk(entry_path):
+            for f in files:
+                size += os.path.getsize(os.path.join(root, f))
+            #
+        #
+        return size
+
+    def _add_size(self, entry_path, entry_size):
+        with open(os.path.join(entry_path, self.size_file), 'a') as fp:
+            fp.write(f'{entry_size}\n')
+        #
+
+    def _get_recorded_size(self, entry_path):
+        # the size of an entry from its ledger - walk it only if there is no ledger (written by an older version)
+        size_file = os.path.join(entry_path, self.size_file)
+        if not os.path.exists(size_file):
+            return self.get_size(entry_path)
+        #
+        with open(size_file) as fp:
+            return sum(int(line) for line in fp if line.strip())
+        #
+
+    def evict(self):
+        '''
+        remove the least recently used entries until the cache fits in max_size
+        '''
+        if not self.max_size:
+            return
+        #
+        entries = []
+        for key in os.listdir(self.cache_path):
+            entry_path = self.get_entry_path(key)
+            if key.endswith('.tmp') or not os.path.isdir(entry_path):
+                continue
+            #
+            try:
+                entries.append((os.path.getmtime(entry_path), self._get_recorded_size(entry_path), entry_path))
+            except (OSError, ValueError):
+                pass
+            #
+        #
+        total_size = sum(e[1] for e in entries)
+        for last_used, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            #
+            # memory mapped arrays that are in use remain valid even after the files are removed
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
+        #
+
+
+class FrameTensorCache:
+    '''
+    a persistent cache of the per frame tensors of one signature (eg. the preprocessed inputs of a dataset).
+    each tensor of a frame is a row of a preallocated array of shape (num_frames, ...) that is memory mapped,
+    and the small per frame info is kept in one metadata file - so a cache hit is only a row lookup.
+    the first user of a signature fills it in a temporary folder that is renamed in close(), after that it is read-only.
+    all the frames must have tensors of the same shapes and dtypes - otherwise the signature is not cached.
+    the least recently used signatures are evicted first, when the total size exceeds max_size (in bytes).
+    '''
+    info_file = 'info.pkl'
+
+    def __init__(self, cache_path, signature, num_frames, max_size=None):
+        self.cache_path = os.path.abspath(cache_path)
+        self.entry_path = os.path.join(self.cache_path, signature)
+        self.num_frames = num_frames
+        self.max_size = max_size
+        self.num_hits = 0
+        self.num_misses = 0
+        self.lock = threading.Lock()
+        # the rows of tensors and the info of the frames - either read from the cache or being written
+        self.tensors = None
+        self.frame_info = {}
+        self.temp_path = None
+        self.writable = True
+        os.makedirs(self.cache_path, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        try:
+            with open(os.path.join(self.entry_path, self.info_file), 'rb') as fp:
+                info = pickle.load(fp)
+            #
+            self.tensors = [np.load(os.path.join(self.entry_path, f'{idx}.npy'), mmap_mode='r')
+                            for idx in range(info['num_tensors'])]
+            self.frame_info = info['frame_info']
+            # update the modification time, it is used as the last used time for LRU eviction
+            os.utime(self.entry_path)
+        except (OSError, EOFError, ValueError, KeyError, pickle.UnpicklingError):
+            self.tensors = None
+            self.frame_info = {}
+            return
+        #
+        self.writable = False
+
+    def get_stats(self):
+        num_lookups = self.num_hits + self.num_misses
+        hit_rate = (self.num_hits * 100.0 / num_lookups) if num_lookups > 0 else 0.0
+        return {'cache_hits': self.num_hits, 'cache_misses': self.num_misses, 'cache_hit_rate%': hit_rate}
+
+    def load(self, frame_index):
+        '''
+        returns (tensors, info) stored for the given frame, or None if it is not in the cache.
+        the tensors are read-only memory mapped rows.
+        '''
+        info = self.frame_info.get(frame_index, None) if not self.writable else None
+        with self.lock:
+            if info is None:
+                self.num_misses += 1
+                return None
+            #
+            self.num_hits += 1
+        #
+        return [t[frame_index] for t in self.tensors], info
+
+    def save(self, frame_index, tensors, info=None):
+        '''
+        stores the list of tensors and a small picklable info object for the given frame.
+        returns True if the frame is written.
+        '''
+        with self.lock:
+            if not self.writable or frame_index >= self.num_frames:
+                return False
+            #
+            if not all(isinstance(t, np.ndarray) for t in tensors):
+                self._abandon()
+                return False
+            #
+            if self.tensors is None:
+                self._allocate(tensors)
+            elif len(tensors) != len(self.tensors) or \
+                    any(t.shape != r.shape[1:] or t.dtype != r.dtype for t, r in zip(tensors, self.tensors)):
+                self._abandon()
+            #
+            if not self.writable:
+                return False
+            #
+            rows = self.tensors
+        #
+        # different frames are different rows - so those can be written without the lock
+        for t, r in zip(tensors, rows):
+            r[frame_index] = t
+        #
+        with self.lock:
+            if not self.writable:
+                return False
+            #
+            self.frame_info[frame_index] = info
+        #
+        return True
+
+    def _allocate(self, tensors):
+        entry_size = self.num_frames * sum(t.nbytes for t in tensors)
+        if (self.max_size and entry_size > self.max_size) or os.path.isdir(self.entry_path):
+            self.writable = False
+            return
+        #
+        self.temp_path = f'{self.entry_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.temp_path, exist_ok=True)
+            self.tensors = [np.lib.format.open_memmap(os.path.join(self.temp_path, f'{idx}.npy'), mode='w+',
+                                                      dtype=t.dtype, shape=(self.num_frames,)+t.shape)
+                            for idx, t in enumerate(tensors)]
+        except OSError:
+            self._abandon()
+        #
+
+    def _abandon(self):
+        self.writable = False
+        self.tensors = None
+        self.frame_info = {}
+        if self.temp_path is not None:
+            shutil.rmtree(self.temp_path, ignore_errors=True)
+            self.temp_path = None
+        #
+
+    def close(self):
+        '''
+        completes the signature that is being written, so that it can be read by the later users, and evicts.
+        '''
+        with self.lock:
+            if self.temp_path is not None:
+                try:
+                    for r in self.tensors:
+                        r.flush()
+                    #
+                    with open(os.path.join(self.temp_path, self.info_file), 'wb') as fp:
+                        pickle.dump({'num_tensors': len(self.tensors), 'frame_info': self.frame_info}, fp)
+                    #
+                    os.rename(self.temp_path, self.entry_path)
+                except OSError:
+                    # another process has written the same signature in the meanwhile
+                    shutil.rmtree(self.temp_path, ignore_errors=True)
+                #
+            #
+            self.temp_path = None
+            self.tensors = None
+            self.frame_info = {}
+            self.writable = False
+        #
+        self.evict()
+
+    def evict(self):
+        '''
+        remove the least recently used signatures until the cache fits in max_size
+        '''
+        if not self.max_size:
+            return
+        #
+        entries = []
+        for key in os.listdir(self.cache_path):
+            entry_path = os.path.join(self.cache_path, key)
+            if key.endswith('.tmp') or not os.path.isdir(entry_path):
+                continue
+            #
+            try:
+                # only a few files in each signature - so this is not a walk over the frames
+                entry_size = sum(os.path.getsize(os.path.join(entry_path, f)) for f in os.listdir(entry_path))
+                entries.append((os.path.getmtime(entry_path), entry_size, entry_path))
+            except OSError:
+                pass
+            #
+        #
+        total_size = sum(e[1] for e in entries)
+        for last_used, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            #
+            # memory mapped arrays that are in use remain valid even after the files are removed
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
+        #
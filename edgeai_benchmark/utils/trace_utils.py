@@ -0,0 +1,129 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import time
+import json
+import threading
+import contextlib
+
+
+# the tracer of the pipeline that is being run in this process - None if tracing is disabled
+_active_tracer = None
+# returned by trace_span() when tracing is disabled - so that the overhead is only a global lookup
+_null_span = contextlib.nullcontext()
+
+
+class Tracer:
+    '''
+    collects the start and end time of named spans (eg. dataset read, preprocess, invoke) from all the threads.
+    the spans can be written as a chrome trace event file (open it in chrome://tracing or https://ui.perfetto.dev)
+    and as a csv with the count, total, mean and max time of each span.
+    '''
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def span(self, name, category=''):
+        return _TraceSpan(self, name, category)
+
+    def add_span(self, name, category, start_time, end_time):
+        with self.lock:
+            self.events.append((name, category, threading.get_ident(), start_time, end_time))
+        #
+
+    def write_chrome_trace(self, filename):
+        # chrome trace events use micro seconds
+        trace_events = [{'name': name, 'cat': category, 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                         'ts': (start_time - self.start_time) * 1e6, 'dur': (end_time - start_time) * 1e6}
+                        for name, category, tid, start_time, end_time in self.events]
+        with open(filename, 'w') as fp:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, fp)
+        #
+
+    def get_summary(self):
+        summary = {}
+        for name, category, tid, start_time, end_time in self.events:
+            count, total_time, max_time = summary.get((category, name), (0, 0.0, 0.0))
+            duration = end_time - start_time
+            summary[(category, name)] = (count + 1, total_time + duration, max(max_time, duration))
+        #
+        return summary
+
+    def write_summary_csv(self, filename):
+        with open(filename, 'w') as fp:
+            fp.write('category,name,count,total_ms,mean_ms,max_ms\n')
+            for (category, name), (count, total_time, max_time) in self.get_summary().items():
+                fp.write(f'{category},{name},{count},{total_time*1000:.3f},{total_time*1000/count:.3f},{max_time*1000:.3f}\n')
+            #
+        #
+
+
+class _TraceSpan:
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.tracer.add_span(self.name, self.category, self.start_time, time.perf_counter())
+
+
+def start_trace():
+    '''
+    starts collecting the spans of this process and returns the tracer
+    '''
+    global _active_tracer
+    _active_tracer = Tracer()
+    return _active_tracer
+
+
+def stop_trace():
+    '''
+    stops collecting the spans and returns the tracer (None if tracing was not started)
+    '''
+    global _active_tracer
+    tracer = _active_tracer
+    _active_tracer = None
+    return tracer
+
+
+def trace_span(name, category=''):
+    '''
+    usage: with utils.trace_span('invoke', 'infer'): ...
+    this is a no-op if tracing has not been started.
+    '''
+    if _active_tracer is None:
+        return _null_span
+    #
+    return _active_tracer.span(name, category)
@@ -27,9 +27,13 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from .params_base import *
+from .trace_utils import trace_span
 
 
 class TransformsCompose(ParamsBase):
+    # category of the trace spans of the transforms
+    trace_category = 'transform'
+
     def __init__(self, transforms, **kwargs):
         self.transforms = transforms
         self.kwargs = kwargs
@@ -38,7 +42,9 @@ class TransformsCompose(ParamsBase):
 
     def __call__(self, tensor, info_dict):
         for t in self.transforms:
-            tensor, info_dict = t(tensor, info_dict)
+            with trace_span(t.__class__.__name__, self.trace_category):
+                tensor, info_dict = t(tensor, info_dict)
+            #
         #
         return tensor, info_dict
 
@@ -0,0 +1,121 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+
+from edgeai_benchmark import *
+
+
+def check_image_decoder(image_files, decoder_name, backend, max_mean_diff=0.5, max_diff=8):
+    # compare the pixels of the decoder with those of the decoder of the backend - at full and at reduced scale
+    decoder = preprocess.get_image_decoder(decoder_name)
+    decoder_ref = preprocess.get_image_decoder(backend)
+    mean_diffs, worst_diff = [], 0
+    for image_file in image_files:
+        image_format = preprocess.get_image_format(image_file)
+        if not decoder.supports(image_format):
+            continue
+        #
+        reductions = (1, 2, 4, 8) if image_format == 'jpeg' else (1,)
+        for reduction in reductions:
+            img_data_ref = decoder_ref.decode(image_file, reduction=reduction)
+            img_data = decoder.decode(image_file, reduction=reduction)
+            match, mean_diff, image_max_diff = preprocess.check_image_decoder_parity(img_data, img_data_ref,
+                max_mean_diff=max_mean_diff, max_diff=max_diff)
+            assert mean_diff is not None, \
+                f'{decoder_name} shape mismatch for {image_file} at reduction {reduction}: {img_data.shape} vs {img_data_ref.shape}'
+            assert match, f'{decoder_name} differs from {backend} by {mean_diff:.3f} on average (max {image_max_diff}) ' \
+                f'for {image_file} at reduction {reduction} - tolerance is {max_mean_diff} on average (max {max_diff})'
+            mean_diffs.append(mean_diff)
+            worst_diff = max(worst_diff, image_max_diff)
+        #
+    #
+    return (float(np.mean(mean_diffs)) if mean_diffs else None), worst_diff
+
+
+def check_image_read(image_files, decoder_name, backend, **transform_kwargs):
+    # the output contract of ImageRead (and of the fused preprocess) must not depend on the decoder
+    transforms = preprocess.PreProcessTransforms(None).get_transform_onnx(backend=backend, **transform_kwargs)
+    transforms_ref = preprocess.PreProcessTransforms(None).get_transform_onnx(backend=backend, **transform_kwargs)
+    transforms.set_image_decoder(decoder_name)
+    for image_file in image_files:
+        for enable_fused in (False, True):
+            transforms.enable_fused = transforms_ref.enable_fused = enable_fused
+            tensor_ref, info_dict_ref = transforms_ref(image_file, {})
+            tensor, info_dict = transforms(image_file, {})
+            assert tensor.shape == tensor_ref.shape and tensor.dtype == tensor_ref.dtype, \
+                f'{decoder_name} shape/dtype mismatch for {image_file}: {tensor.shape} {tensor.dtype} vs {tensor_ref.shape} {tensor_ref.dtype}'
+            assert tuple(info_dict['data_shape']) == tuple(info_dict_ref['data_shape']), \
+                f'{decoder_name} data_shape mismatch for {image_file}: {info_dict["data_shape"]} vs {info_dict_ref["data_shape"]}'
+        #
+    #
+
+
+if __name__ == '__main__':
+    # the cwd must be the root of the repository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_folder', type=str)
+    parser.add_argument('--num_images', type=int, default=100)
+    parser.add_argument('--max_mean_diff', type=float, default=0.5)
+    parser.add_argument('--max_diff', type=int, default=8)
+    parser.add_argument('--num_benchmark_images', type=int, default=10)
+    cmds = parser.parse_args()
+
+    image_files = sorted(glob.glob(os.path.join(cmds.image_folder, '**', '*.*'), recursive=True))
+    image_files = [f for f in image_files if os.path.splitext(f)[-1].lower() in ('.jpg', '.jpeg', '.png', '.bmp')]
+    image_files = image_files[:cmds.num_images]
+    assert len(image_files) > 0, f'no images found in {cmds.image_folder}'
+
+    decoder_names = preprocess.get_available_image_decoders()
+    print(f'available image decoders: {decoder_names}')
+    for backend in ('pil', 'cv2'):
+        for decoder_name in decoder_names:
+            mean_diff, worst_diff = check_image_decoder(image_files, decoder_name, backend,
+                max_mean_diff=cmds.max_mean_diff, max_diff=cmds.max_diff)
+            if mean_diff is None:
+                continue
+            #
+            check_image_read(image_files, decoder_name, backend, resize=256, crop=224)
+            check_image_read(image_files, decoder_name, backend, resize=256, crop=224, data_layout=constants.NHWC)
+            print(f'{decoder_name} vs {backend}: mean absolute difference {mean_diff:.3f} (max difference {worst_diff})')
+        #
+        # the selection of ImageRead(decoder='auto') is made for each reduction - and so is the benchmark here
+        benchmark_files = [f for f in image_files if preprocess.get_image_format(f) == 'jpeg'][:cmds.num_benchmark_images]
+        for reduction in ((1, 2, 4, 8) if benchmark_files else ()):
+            decode_times = preprocess.benchmark_image_decoders(benchmark_files, backend, reduction=reduction)
+            decode_times_ms = {name: round(t * 1000, 3) for name, (t, _) in decode_times.items()}
+            print(f'decode time (ms) for the {backend} backend at reduction {reduction} on {len(benchmark_files)} images: {decode_times_ms}')
+        #
+    #
@@ -0,0 +1,155 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sys
+import shutil
+import tempfile
+import argparse
+import numpy as np
+
+from edgeai_benchmark import *
+
+
+class CheckSession:
+    # a session that returns its input - and fails at the given frame, like an interrupted run
+    def __init__(self, run_dir, fail_frame=None):
+        self.run_dir = run_dir
+        self.fail_frame = fail_frame
+
+    def start_infer(self):
+        return True
+
+    def get_param(self, param_name):
+        return self.run_dir
+
+    def supports_batch_inference(self, batch_size=None):
+        return False
+
+    def infer_frame(self, data, info_dict):
+        if data == self.fail_frame:
+            raise RuntimeError(f'infer failed at frame {data}')
+        #
+        info_dict['session_invoke_time'] = 0.0
+        return data, info_dict
+
+    def infer_frame_stats(self):
+        return dict(core_time=0.0, subgraph_time=0.0, write_total=-1, read_total=-1)
+
+    def infer_static_stats(self):
+        return dict(num_subgraphs=0)
+
+    def close_interpreter(self):
+        pass
+
+
+class CheckDataset(datasets.DatasetBase):
+    # the frames are their index and the metric is the sum of the outputs - evaluated from the raw outputs
+    def __init__(self, num_frames=20, **kwargs):
+        super().__init__(num_frames=num_frames, **kwargs)
+        self.num_frames = num_frames
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, idx):
+        return idx
+
+    def __call__(self, predictions, **kwargs):
+        return self.evaluate(predictions, **kwargs)
+
+    def evaluate(self, predictions, **kwargs):
+        return {'sum': float(np.sum(predictions))}
+
+
+class CheckIncrementalDataset(CheckDataset):
+    # the same metric, accumulated by update() - only its metric_state is checkpointed
+    def update(self, frame_idx, output, **kwargs):
+        self.metric_state = (self.metric_state or 0) + output
+
+    def finalize(self, **kwargs):
+        metric_state = self.metric_state or 0
+        self.metric_state = None
+        return {'sum': float(metric_state)}
+
+
+def run_pipeline(dataset, run_dir, checkpoint_interval, fail_frame=None):
+    settings = config_dict.ConfigDict()
+    settings.infer_checkpoint_interval = checkpoint_interval
+    pipeline = pipelines.AccuracyPipeline.__new__(pipelines.AccuracyPipeline)
+    pipeline.settings = settings
+    pipeline.run_dir = run_dir
+    pipeline.logger = None
+    pipeline.dataset_info = None
+    pipeline.decode_reduce = False
+    pipeline.image_decoder = None
+    pipeline.pipeline_config = dict(session=CheckSession(run_dir, fail_frame), input_dataset=dataset,
+                                    preprocess=lambda data, info_dict: (data, info_dict),
+                                    postprocess=lambda output, info_dict: (output, info_dict))
+    try:
+        output_list = pipeline._infer_frames()
+    except RuntimeError:
+        return None
+    #
+    return pipeline._evaluate(output_list)['sum']
+
+
+def check_checkpoint(dataset_type, checkpoint_interval, num_frames):
+    expected_sum = float(np.sum(np.arange(num_frames)))
+    run_dir = tempfile.mkdtemp()
+    try:
+        checkpoint_folder = os.path.join(run_dir, 'infer_checkpoint')
+        result = run_pipeline(dataset_type(num_frames=num_frames), run_dir, checkpoint_interval, fail_frame=num_frames//2+1)
+        assert result is None, 'the interrupted run must not complete'
+        has_checkpoint = os.path.exists(os.path.join(checkpoint_folder, 'checkpoint.pkl'))
+        result = run_pipeline(dataset_type(num_frames=num_frames), run_dir, checkpoint_interval)
+        assert result == expected_sum, f'resumed run gave {result} - expected {expected_sum}'
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    #
+    return has_checkpoint
+
+
+if __name__ == '__main__':
+    # the cwd must be the root of the repository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+    parser = argparse.ArgumentParser(description='check that an interrupted inference resumes from its checkpoint '
+        'with the same metric - and that only the incrementally accumulated metric states are checkpointed')
+    parser.add_argument('--num_frames', type=int, default=20)
+    parser.add_argument('--checkpoint_interval', type=int, default=4)
+    cmds = parser.parse_args()
+
+    # a dataset without its own update() is evaluated on the raw outputs - those must not be checkpointed
+    has_checkpoint = check_checkpoint(CheckDataset, cmds.checkpoint_interval, cmds.num_frames)
+    assert not has_checkpoint, 'a dataset without its own update() must not write a checkpoint'
+    print('no update(): no checkpoint written, metric is correct')
+    has_checkpoint = check_checkpoint(CheckIncrementalDataset, cmds.checkpoint_interval, cmds.num_frames)
+    assert has_checkpoint, 'a dataset with its own update() must write a checkpoint'
+    print('incremental update(): checkpoint written and resumed, metric is correct')
@@ -0,0 +1,122 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import sys
+import glob
+import time
+import argparse
+import numpy as np
+import cv2
+
+from edgeai_benchmark import *
+
+
+def check_fused_preprocess(image_files, max_diff=0, normalizer=None, **transform_kwargs):
+    # compare the fused preprocess (ImageReadResizeCropToTensor) with the unfused chain of transforms
+    # with a normalizer, max_diff is in the units of the image (before the normalization)
+    transforms = preprocess.PreProcessTransforms(None).get_transform_onnx(**transform_kwargs)
+    if normalizer is not None:
+        assert transforms.set_input_normalizer(normalizer), f'the normalizer is not taken with {transform_kwargs}'
+    #
+    diff_scale = float(np.max(normalizer.scale)) if normalizer is not None else 1.0
+    worst_diff = 0
+    time_ref = time_fused = 0.0
+    for image_file in image_files:
+        transforms.enable_fused = False
+        start_time = time.time()
+        tensor_ref, info_dict_ref = transforms(image_file, {})
+        time_ref += time.time() - start_time
+        transforms.enable_fused = True
+        start_time = time.time()
+        tensor, info_dict = transforms(image_file, {})
+        time_fused += time.time() - start_time
+        assert tensor.shape == tensor_ref.shape and tensor.dtype == tensor_ref.dtype, \
+            f'shape/dtype mismatch for {image_file}: {tensor.shape} {tensor.dtype} vs {tensor_ref.shape} {tensor_ref.dtype}'
+        diff = float(np.abs(tensor.astype(np.float64) - tensor_ref.astype(np.float64)).max()) / diff_scale
+        # a small margin for the rounding of the normalization
+        assert diff <= max_diff + 1e-3, f'fused preprocess differs by {diff} (> {max_diff}) for {image_file} with {transform_kwargs}'
+        worst_diff = max(worst_diff, diff)
+    #
+    return worst_diff, time_ref / len(image_files), time_fused / len(image_files)
+
+
+def check_decode_reduce(image_files, **transform_kwargs):
+    # the reduced scale jpeg decode is not exact - this reports how much it changes the preprocessed tensors
+    transforms = preprocess.PreProcessTransforms(None).get_transform_onnx(**transform_kwargs)
+    tensors_ref = [transforms(image_file, {})[0] for image_file in image_files]
+    transforms.set_decode_reduce(True)
+    mean_diffs = []
+    for image_file, tensor_ref in zip(image_files, tensors_ref):
+        tensor, info_dict = transforms(image_file, {})
+        assert tensor.shape == tensor_ref.shape, f'shape mismatch for {image_file}: {tensor.shape} vs {tensor_ref.shape}'
+        mean_diffs.append(np.abs(tensor.astype(np.float32) - tensor_ref.astype(np.float32)).mean())
+    #
+    return float(np.mean(mean_diffs)), float(np.max(mean_diffs))
+
+
+if __name__ == '__main__':
+    # the cwd must be the root of the repository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+    parser = argparse.ArgumentParser()
+    parser.add_argument('image_folder', type=str)
+    parser.add_argument('--num_images', type=int, default=100)
+    cmds = parser.parse_args()
+
+    image_files = sorted(glob.glob(os.path.join(cmds.image_folder, '**', '*.*'), recursive=True))
+    image_files = [f for f in image_files if os.path.splitext(f)[-1].lower() in ('.jpg', '.jpeg', '.png', '.bmp')]
+    image_files = image_files[:cmds.num_images]
+    assert len(image_files) > 0, f'no images found in {cmds.image_folder}'
+
+    # only the region of the image that survives the crop is resized with pil - the rounding of that can differ by 1
+    # from the full resize. cv2 resizes the full image and is bit exact. the normalization in the same pass is bit exact.
+    mean_scale = preprocess.ImageNormMeanScale(mean=(123.675, 116.28, 103.53), scale=(0.017125, 0.017507, 0.017429))
+    mean_scale_nhwc = preprocess.ImageNormMeanScale(mean=(123.675, 116.28, 103.53), scale=(0.017125, 0.017507, 0.017429),
+                                                    data_layout=constants.NHWC)
+    check_configs = [
+        (1, None, dict(resize=256, crop=224, backend='pil')),
+        (1, None, dict(resize=256, crop=224, backend='pil', data_layout=constants.NHWC, reverse_channels=True)),
+        (1, None, dict(resize=(224,224), crop=224, backend='pil')),
+        (0, None, dict(resize=256, crop=224, backend='cv2', interpolation=cv2.INTER_AREA)),
+        (0, None, dict(resize=256, crop=224, backend='cv2', data_layout=constants.NHWC, reverse_channels=True)),
+        (0, None, dict(resize=None, crop=224, backend='cv2')),
+        (1, mean_scale, dict(resize=256, crop=224, backend='pil')),
+        (0, mean_scale, dict(resize=256, crop=224, backend='cv2')),
+        (0, mean_scale_nhwc, dict(resize=256, crop=224, backend='cv2', data_layout=constants.NHWC)),
+    ]
+    for max_diff, normalizer, transform_kwargs in check_configs:
+        worst_diff, time_ref, time_fused = check_fused_preprocess(image_files, max_diff=max_diff, normalizer=normalizer,
+                                                                  **transform_kwargs)
+        print(f'fused preprocess {transform_kwargs} normalizer={normalizer}: max difference {worst_diff:.3f}, '
+              f'{time_ref*1000:.2f} ms unfused, {time_fused*1000:.2f} ms fused per frame')
+    #
+    for backend in ('pil', 'cv2'):
+        mean_diff, max_mean_diff = check_decode_reduce(image_files, resize=256, crop=224, backend=backend)
+        print(f'decode_reduce {backend}: mean absolute difference {mean_diff:.3f} (worst image {max_mean_diff:.3f})')
+    #
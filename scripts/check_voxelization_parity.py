@@ -0,0 +1,195 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import sys
+import glob
+import time
+import argparse
+import numpy as np
+
+from edgeai_benchmark import *
+
+
+def voxelization_reference(self, lidar_data):
+    # the per voxel implementation of preprocess.Voxelization - the vectorized one must give the same output,
+    # within the tolerance below
+    input1 = np.zeros((1, self.num_channel, (int)(self.num_voxel_x*self.num_voxel_y)),dtype='float32')
+    input0 = np.zeros((1, self.num_feat_per_voxel, self.max_points_per_voxel, self.nw_max_num_voxels),dtype='float32')
+    input2 = np.zeros((1, self.num_channel, self.nw_max_num_voxels),dtype='int32')
+
+    x = lidar_data[:, 0]
+    y = lidar_data[:, 1]
+    z = lidar_data[:, 2]
+    x_id = ((((x - self.min_x) / self.voxel_size_x))).astype(int)
+    y_id =  ((((y - self.min_y) / self.voxel_size_y))).astype(int)
+    valid_idx = y_id * self.num_voxel_x + x_id
+    not_valid_idx = np.ones(len(lidar_data))*-1 # -1  is the invalid index
+    valid_pts = (x > self.min_x)*(x < self.max_x)*(y > self.min_y)*\
+                (y < self.max_y)*(z > self.min_z)*(z < self.max_z)
+    scratch_1 = np.where(valid_pts,valid_idx,not_valid_idx)
+
+    num_points = np.zeros(self.nw_max_num_voxels,dtype=int)
+    lidar_data = lidar_data[np.where(scratch_1 != -1)]
+    scratch_1 = scratch_1[np.where(scratch_1 != -1)]
+    unq_rtn = np.unique(scratch_1, return_inverse = True, return_counts = True)
+    num_non_empty_voxels = (int)(unq_rtn[2].shape[0])
+    scratch_2 = unq_rtn[1]
+    input2[0, 0, :num_non_empty_voxels] = unq_rtn[0][:num_non_empty_voxels]
+
+    for i in range(len(lidar_data)):
+        j = scratch_2[i] #voxel index
+        if(num_points[j] < self.max_points_per_voxel):
+            input0[0, 0:4, num_points[j], j] = lidar_data[i, 0:4] * self.scale_fact
+            num_points[j] = num_points[j] + 1
+        #
+    #
+    x_offset = self.voxel_size_x / 2 + self.min_x
+    y_offset = self.voxel_size_y / 2 + self.min_y
+    z_offset = self.voxel_size_z / 2 + self.min_z
+    for i in range(num_non_empty_voxels):
+        x = input0[0, 0, :num_points[i], i].sum()
+        y = input0[0, 1, :num_points[i], i].sum()
+        z = input0[0, 2, :num_points[i], i].sum()
+        x_avg = x / num_points[i]
+        y_avg = y / num_points[i]
+        z_avg = z / num_points[i]
+
+        voxel_center_y = (int)(input2[0][0][i] / self.num_voxel_x)
+        voxel_center_x = (int)(input2[0][0][i] - ((int)(voxel_center_y)) * self.num_voxel_x)
+        voxel_center_x *= self.voxel_size_x
+        voxel_center_x += x_offset
+        voxel_center_y *= self.voxel_size_y
+        voxel_center_y += y_offset
+        voxel_center_z = 0
+        voxel_center_z *= self.voxel_size_z
+        voxel_center_z += z_offset
+
+        input0[0, 4, :num_points[i], i] = input0[0, 0, :num_points[i], i] - x_avg
+        input0[0, 5, :num_points[i], i] = input0[0, 1, :num_points[i], i] - y_avg
+        input0[0, 6, :num_points[i], i] = input0[0, 2, :num_points[i], i] - z_avg
+        input0[0, 7, :num_points[i], i] = input0[0, 0, :num_points[i], i] - voxel_center_x * self.scale_fact
+        input0[0, 8, :num_points[i], i] = input0[0, 1, :num_points[i], i] - voxel_center_y * self.scale_fact
+        input0[0, 9, :num_points[i], i] = input0[0, 2, :num_points[i], i] - voxel_center_z * self.scale_fact
+        input0[0, 0, :num_points[i], i] = input0[0, 7, :num_points[i], i]
+        input0[0, 1, :num_points[i], i] = input0[0, 8, :num_points[i], i]
+        input0[0, 2, :num_points[i], i] = input0[0, 9, :num_points[i], i]
+    #
+    input2[0][0][num_non_empty_voxels] = -1
+    input2[0][1:64] = input2[0][0]
+    input0 = input0.astype("int32")
+    input0 = input0.astype("float32")
+    return (input0,input2,input1)
+
+
+def get_random_point_cloud(rng, num_points=12000):
+    # roughly like a velodyne scan in the camera field of view (velodyne_reduced of kitti) - with a few dense clusters,
+    # so that some voxels have more than max_points_per_voxel points
+    distance = rng.exponential(8.0, num_points) + 2.0
+    angle = rng.uniform(-np.pi/4, np.pi/4, num_points)
+    x = distance * np.cos(angle)
+    y = distance * np.sin(angle)
+    z = rng.normal(-1.2, 0.8, num_points)
+    cluster_centers = rng.uniform((5.0, -10.0, -2.0), (30.0, 10.0, 0.0), (4, 3))
+    cluster_points = cluster_centers[rng.integers(0, 4, 1000)] + rng.normal(0.0, 0.1, (1000, 3))
+    xyz = np.concatenate([np.stack([x, y, z], axis=1), cluster_points], axis=0)
+    intensity = rng.uniform(0.0, 1.0, (len(xyz), 1))
+    return rng.permutation(np.concatenate([xyz, intensity], axis=1)).astype(np.float32)
+
+
+# the vectorized voxelization sums the points of a voxel in float64 (np.bincount) and the per voxel implementation
+# in float32 - so the voxel means differ by about a float32 rounding (relative 1e-7). the features are truncated to int:
+# the features relative to the mean (4,5,6) can differ by 1 where they are that close to an integer - this is the
+# tolerance. the other features and outputs must be identical.
+mean_feature_channels = (4, 5, 6)
+mean_feature_max_diff = 1
+mean_feature_max_diff_fraction = 1e-4
+
+
+def check_voxelization(point_clouds, use_arena=False):
+    voxelization = preprocess.Voxelization()
+    voxelization.set_buffer_arena(utils.BufferArena(num_slots=2) if use_arena else None)
+    time_ref = time_vec = 0.0
+    num_diffs_total = num_values_total = 0
+    for name, lidar_data in point_clouds:
+        start_time = time.time()
+        outputs_ref = voxelization_reference(voxelization, lidar_data)
+        time_ref += time.time() - start_time
+        start_time = time.time()
+        outputs, info_dict = voxelization(lidar_data, {})
+        time_vec += time.time() - start_time
+        for output_idx, (output, output_ref) in enumerate(zip(outputs, outputs_ref)):
+            assert output.shape == output_ref.shape and output.dtype == output_ref.dtype, \
+                f'shape/dtype mismatch for input{output_idx} of {name}'
+            if output_idx == 0:
+                other_channels = [c for c in range(output.shape[1]) if c not in mean_feature_channels]
+                num_diffs = int((output[:, other_channels] != output_ref[:, other_channels]).sum())
+                assert num_diffs == 0, f'input0 differs at {num_diffs} positions (not relative to the mean) for {name}'
+                output, output_ref = output[:, mean_feature_channels], output_ref[:, mean_feature_channels]
+                max_diff = float(np.abs(output - output_ref).max()) if output.size > 0 else 0.0
+                assert max_diff <= mean_feature_max_diff, f'input0 differs by {max_diff} for {name}'
+                num_diffs_total += int((output != output_ref).sum())
+                num_values_total += int((output_ref != 0).sum())
+            else:
+                num_diffs = int((output != output_ref).sum())
+                assert num_diffs == 0, f'input{output_idx} differs at {num_diffs} positions for {name}'
+            #
+        #
+    #
+    diff_fraction = num_diffs_total / max(num_values_total, 1)
+    assert diff_fraction <= mean_feature_max_diff_fraction, \
+        f'the features relative to the mean differ at {num_diffs_total} of {num_values_total} values'
+    return time_ref / len(point_clouds), time_vec / len(point_clouds), num_diffs_total, num_values_total
+
+
+if __name__ == '__main__':
+    # the cwd must be the root of the repository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+    parser = argparse.ArgumentParser(description='compare the vectorized preprocess.Voxelization with the per voxel '
+        'implementation. uses the .bin point clouds in lidar_folder (eg. kitti velodyne) or random ones')
+    parser.add_argument('lidar_folder', type=str, nargs='?', default=None)
+    parser.add_argument('--num_frames', type=int, default=20)
+    cmds = parser.parse_args()
+
+    if cmds.lidar_folder is not None:
+        lidar_files = sorted(glob.glob(os.path.join(cmds.lidar_folder, '**', '*.bin'), recursive=True))[:cmds.num_frames]
+        assert len(lidar_files) > 0, f'no .bin files found in {cmds.lidar_folder}'
+        point_clouds = [(f, preprocess.PointCloudRead()(f, {})[0]) for f in lidar_files]
+    else:
+        rng = np.random.default_rng(0)
+        point_clouds = [(f'random_{idx}', get_random_point_cloud(rng)) for idx in range(cmds.num_frames)]
+        # corner cases: no points in range and a single point
+        point_clouds += [('empty', np.zeros((0,4), dtype=np.float32)),
+                         ('single', np.array([[10.0, 1.0, -1.0, 0.5]], dtype=np.float32))]
+    #
+    for use_arena in (False, True):
+        time_ref, time_vec, num_diffs, num_values = check_voxelization(point_clouds, use_arena=use_arena)
+        print(f'voxelization (buffer_arena={use_arena}): within tolerance - {num_diffs} of {num_values} features '
+              f'relative to the mean differ by 1. per voxel {time_ref*1000:.1f} ms, vectorized {time_vec*1000:.1f} ms per frame')
+    #
@@ -45,6 +45,7 @@ if __name__ == '__main__':
     parser.add_argument('--target_device', type=utils.str_or_none)
     parser.add_argument('--modelartifacts_path', type=str)
     parser.add_argument('--report_perfsim', type=utils.str_to_bool)
+    parser.add_argument('--report_latency_percentiles', type=int, nargs='*')
     parser.add_argument('--skip_pattern', type=str, default='_package')
     cmds = parser.parse_args()
 
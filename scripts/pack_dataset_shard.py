@@ -0,0 +1,65 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import sys
+import argparse
+
+from edgeai_benchmark import *
+
+
+if __name__ == '__main__':
+    # the cwd must be the root of the repository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+    parser = argparse.ArgumentParser(description='pack the images of a dataset split into one shard file. '
+        'example: python3 scripts/pack_dataset_shard.py ./dependencies/datasets/imagenet/val '
+        '--list_file ./dependencies/datasets/imagenet/val.txt')
+    parser.add_argument('image_dir', type=str, help='folder of the images - the names in the shard are relative to this')
+    parser.add_argument('--list_file', type=str, default=None,
+        help='optional list of the images to pack, one per line: <relative path> [label]. default: all the images in image_dir')
+    parser.add_argument('--shard_file', type=str, default=None, help='default: <image_dir>.shard')
+    cmds = parser.parse_args()
+
+    image_dir = os.path.normpath(cmds.image_dir)
+    shard_file = cmds.shard_file or (image_dir + '.shard')
+    labels = None
+    if cmds.list_file is not None:
+        with open(cmds.list_file) as list_fp:
+            entries = [line.split() for line in list_fp if line.strip()]
+        #
+        file_names = [words[0] for words in entries]
+        labels = [int(words[1]) if len(words) > 1 else -1 for words in entries]
+    else:
+        image_files = [os.path.join(root, f) for root, dirs, files in os.walk(image_dir) for f in files]
+        image_files = [f for f in image_files if os.path.splitext(f)[-1].lower() in ('.png', '.jpg', '.jpeg', '.bmp')]
+        file_names = sorted([os.path.relpath(f, image_dir) for f in image_files])
+    #
+    print(utils.log_color('\nINFO', 'packing', f'{len(file_names)} files from {image_dir} into {shard_file}'))
+    datasets.write_dataset_shard(shard_file, file_names, root=image_dir, labels=labels)
+    print(utils.log_color('\nSUCCESS', 'shard written', shard_file))
@@ -0,0 +1,72 @@
+# Copyright (c) 2018-2021, Texas Instruments
+# All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import os
+import sys
+import argparse
+
+from edgeai_benchmark import *
+
+
+if __name__ == '__main__':
+    # the cwd must be the root of the repository
+    if os.path.split(os.getcwd())[-1] == 'scripts':
+        os.chdir('../')
+    #
+    parser = argparse.ArgumentParser(description='decode the images of a dataset at the input resolution of a model '
+        'and write them to settings.decoded_store_path (or --store_path). the store is used only by the models that have '
+        'exactly the same dataset and read/resize/crop preprocess. '
+        'example: python3 scripts/pack_decoded_store.py settings_import_on_pc.yaml --resize 256 --crop 224')
+    parser.add_argument('settings_file', type=str, default=None)
+    parser.add_argument('--dataset_category', type=str, default=datasets.DATASET_CATEGORY_IMAGENET)
+    parser.add_argument('--split', type=str, default='input_dataset', choices=('input_dataset', 'calibration_dataset'))
+    parser.add_argument('--resize', type=int, nargs='*', default=[256])
+    parser.add_argument('--crop', type=int, nargs='*', default=[224])
+    parser.add_argument('--backend', type=str, default='pil', choices=('pil', 'cv2'))
+    parser.add_argument('--interpolation', type=int, default=None)
+    parser.add_argument('--num_frames', type=int, default=None)
+    parser.add_argument('--store_path', type=str, default=None)
+    cmds = parser.parse_args()
+
+    settings = config_settings.ConfigSettings(cmds.settings_file)
+    store_path = cmds.store_path or settings.decoded_store_path
+    assert store_path, 'give --store_path or set decoded_store_path in the settings'
+    resize = cmds.resize[0] if len(cmds.resize) == 1 else tuple(cmds.resize)
+    crop = cmds.crop[0] if len(cmds.crop) == 1 else tuple(cmds.crop)
+
+    dataset = datasets.get_datasets(settings, dataset_list=[cmds.dataset_category])[cmds.dataset_category][cmds.split]
+    assert dataset is not None, f'could not load the dataset {cmds.dataset_category} - please check settings.dataset_loading'
+    # the preprocess must be configured the same way as in the pipeline - see AccuracyPipeline.__init__
+    preprocess_transforms = preprocess.PreProcessTransforms(settings).get_transform_onnx(resize=resize, crop=crop,
+        backend=cmds.backend, interpolation=cmds.interpolation)
+    preprocess_transforms.enable_fused = settings.preprocess_fused
+    preprocess_transforms.set_decode_reduce(settings.preprocess_decode_reduce)
+
+    num_frames = cmds.num_frames or settings.num_frames
+    print(utils.log_color('\nINFO', 'decoding', f'{cmds.dataset_category} {cmds.split} with {preprocess_transforms.transforms}'))
+    store_folder = datasets.write_decoded_store(store_path, dataset, preprocess_transforms, num_frames=num_frames)
+    print(utils.log_color('\nSUCCESS', 'decoded store written', store_folder))